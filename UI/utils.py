@@ -10,11 +10,22 @@ def show_logo():
 		logo = file.read()
 	print(logo)
       
+# Spinner currently displayed, if any
+_active_spinner = None
+
+def set_spinner_progress(text):
+	"""
+	Display a progress text (e.g. the number of tokens received) next to the active spinner.
+	"""
+	if _active_spinner is not None:
+		_active_spinner.progress = text
+
 class Spinner(threading.Thread):
 	def __init__(self, description="Doing some work ...  "):
 		super().__init__()
 		self.spinner_active = False
 		self.description = description
+		self.progress = ""
 
 	def run(self):
 		# ANSI escape codes for colors
@@ -35,13 +46,13 @@ class Spinner(threading.Thread):
 			for i in range(len(spin_chars)):
 				color = random.choice(colors)
 				chars = " ".join([spin_chars[(i+j+2)%len(spin_chars)] for j in range(offset)])
-				sys.stdout.write('\r'+ robot + self.description+ color + chars + reset_color)
+				sys.stdout.write('\r'+ robot + self.description+ color + chars + reset_color + " " + self.progress)
 				sys.stdout.flush()
 				time.sleep(0.03)
 
 			if not self.spinner_active:
 				# Clear the previous spinner line completely
-				line_length = len(robot + self.description + " " + chars)
+				line_length = len(robot + self.description + " " + chars + " " + self.progress)
 				sys.stdout.write('\r' + ' ' * line_length)  # overwrite with spaces and return
 				sys.stdout.flush()
 				sys.stdout.write('\r' + robot + self.description + " Done !\n")  # print final message
@@ -56,12 +67,16 @@ class SpinnerManager(object):
 		self.active = active
 
 	def __enter__(self):
+		global _active_spinner
 		if self.active:
 			self.spinner = Spinner(self.text_desc)
 			self.spinner.start()
 			self.spinner.spinner_active = True
+			_active_spinner = self.spinner
 
 	def __exit__(self, type, value, traceback):
+		global _active_spinner
 		if self.active:
+			_active_spinner = None
 			self.spinner.spinner_active = False
 			self.spinner.join()
\ No newline at end of file
@@ -0,0 +1,443 @@
+import argparse
+import budget_utils
+import cache_utils
+import candidate_utils
+import client_utils
+import code_utils
+import diff_utils
+import json
+import numpy as np
+import os
+import prompt_utils
+import requests
+import retrieval_utils
+import routing_utils
+import shutil
+import subprocess
+import sys
+import telemetry_utils
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BATCH_DIR = "batches"
+DATASET_DIR = "datasets"
+
+# Stages of a dataset problem, in order. Dataset problems have no input file : no refinement nor data extraction
+BATCH_STAGES = ("summary", "variables", "objective", "constraints", "printing")
+
+SUMMARY_PROMPT = os.path.join(prompt_utils.PROMPT_DIR, "system_prompt_problem_summary.txt")
+CODE_PROMPT = os.path.join(prompt_utils.PROMPT_DIR, "system_prompt_code_.txt")
+PRINT_PROMPT = os.path.join(prompt_utils.PROMPT_DIR, "system_prompt_sol_print.txt")
+
+def load_dataset(name, dataset_dir=DATASET_DIR):
+	"""
+	Load the problems of an evaluation dataset.
+
+	LPWP problems are directories holding a description.txt and a sample.json whose input data is appended to the
+	description and whose output is the expected objective value. IndustryOR problems are the lines of IndustryOR.json.
+
+	Returns
+	-------
+	dict
+		Mapping from problem id to {"description", "expected"}.
+	"""
+	path = os.path.join(dataset_dir, name)
+	problems = {}
+	if name == "IndustryOR":
+		with open(os.path.join(path, "IndustryOR.json"), "r", encoding="utf-8") as f:
+			for line in f:
+				if line.strip():
+					item = json.loads(line)
+					problems[f"industryor_{item['id']}"] = {"description": item["en_question"], "expected": item.get("en_answer")}
+	elif name == "LPWP":
+		for problem in sorted(os.listdir(path), key=lambda p: int(p.split("_")[-1]) if p.split("_")[-1].isdigit() else -1):
+			description_path = os.path.join(path, problem, "description.txt")
+			if not os.path.exists(description_path):
+				continue
+			with open(description_path, "r", encoding="utf-8") as f:
+				description = f.read()
+			expected = None
+			sample_path = os.path.join(path, problem, "sample.json")
+			if os.path.exists(sample_path):
+				with open(sample_path, "r", encoding="utf-8") as f:
+					sample = json.load(f)[0]
+				description += "\n\n# DATA\n\n" + json.dumps(sample["input"], indent=1)
+				expected = sample["output"][0] if sample.get("output") else None
+			problems[problem] = {"description": description, "expected": expected}
+	else:
+		raise ValueError(f"Unknown dataset {name} ! Available datasets are LPWP and IndustryOR.")
+	return problems
+
+class LocalBatchBackend(object):
+	"""
+	File-based stand-in of a batch service : every request of the input JSONL file is answered by the responder and the
+	answers are written to the output JSONL file, in the format of the OpenAI Batch API.
+
+	Parameters
+	----------
+	responder : callable, optional
+		Function returning the chat completion response of a request body. By default, the bodies are sent to the shared
+		LLM client.
+	max_concurrency : int
+		Number of requests answered concurrently.
+	"""
+
+	def __init__(self, responder=None, max_concurrency=16):
+		self.responder = responder if responder is not None else self._post
+		self.max_concurrency = max_concurrency
+
+	def _post(self, body):
+		body = dict(body)
+		model = body.pop("model")
+		return client_utils.get_client().post(model, body)
+
+	def _answer(self, line):
+		try:
+			response = self.responder(line["body"])
+			return {"custom_id": line["custom_id"], "response": {"status_code": 200, "body": response}, "error": None}
+		except Exception as e:
+			return {"custom_id": line["custom_id"], "response": None, "error": {"message": str(e)}}
+
+	def run(self, input_path, output_path):
+		with open(input_path, "r", encoding="utf-8") as f:
+			lines = [json.loads(line) for line in f if line.strip()]
+		with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+			answers = list(executor.map(self._answer, lines))
+		with open(output_path, "w", encoding="utf-8") as f:
+			for answer in answers:
+				f.write(json.dumps(answer, ensure_ascii=False) + "\n")
+
+class OpenAIBatchBackend(object):
+	"""
+	Batch API of the endpoint : the input file is uploaded, a batch job is created and polled, then its output is downloaded.
+
+	Parameters
+	----------
+	base_url : str
+		Endpoint of the API, holding the files and batches routes.
+	api_key : str, optional
+		API key. Read by client_utils.load_api_key by default.
+	poll_interval : float
+		Seconds between two status requests.
+	completion_window : str
+		Completion window of the batch jobs.
+	"""
+
+	def __init__(self, base_url=client_utils.API_BASE, api_key=None, poll_interval=30.0, completion_window="24h"):
+		self.base_url = base_url.rstrip("/")
+		self.poll_interval = poll_interval
+		self.completion_window = completion_window
+		self.session = requests.Session()
+		self.session.headers.update({"api-key": api_key if api_key is not None else client_utils.load_api_key()})
+
+	def _url(self, route):
+		return f"{self.base_url}/{route}?api-version={client_utils.API_VERSION}"
+
+	def _check(self, response):
+		if response.status_code != 200:
+			raise client_utils.LLMRequestError(
+				f"Batch API request failed with status {response.status_code} : {response.text[:500]}",
+				status=response.status_code, body=response.text
+			)
+		return response
+
+	def run(self, input_path, output_path):
+		# Batch requests address deployments, not models
+		with open(input_path, "r", encoding="utf-8") as f:
+			lines = [json.loads(line) for line in f if line.strip()]
+		for line in lines:
+			line["body"]["model"] = client_utils.deployment_name(line["body"]["model"])
+		content = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+
+		upload = self._check(self.session.post(
+			self._url("files"), data={"purpose": "batch"},
+			files={"file": (os.path.basename(input_path), content.encode("utf-8"))}
+		)).json()
+		batch = self._check(self.session.post(self._url("batches"), json={
+			"input_file_id": upload["id"], "endpoint": "/chat/completions", "completion_window": self.completion_window
+		})).json()
+		while batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+			time.sleep(self.poll_interval)
+			batch = self._check(self.session.get(self._url(f"batches/{batch['id']}"))).json()
+
+		with open(output_path, "w", encoding="utf-8") as f:
+			# Output and error files hold the answered and failed requests respectively
+			for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+				if file_id:
+					f.write(self._check(self.session.get(self._url(f"files/{file_id}/content"))).text)
+		if batch["status"] != "completed":
+			print(f"Batch {batch['id']} ended with status {batch['status']}, unanswered requests will be resubmitted.")
+
+class BatchRunner(object):
+	"""
+	Run the pipeline on all the problems of a dataset in rounds of batch requests : every round writes the requests of
+	the current stage of every unfinished problem to one JSONL file, has it answered by the batch backend, then ingests
+	the answers to advance each problem to its next stage.
+
+	The state of the problems is saved to {batch_dir}/state.json after every round, so an interrupted run resumes.
+
+	Parameters
+	----------
+	batch_dir : str
+		Directory of the batch files, the state and the solutions.
+	problems : dict
+		Problems to solve (see load_dataset).
+	backend : object
+		Batch backend (LocalBatchBackend or OpenAIBatchBackend).
+	max_attempts : int
+		Number of failed answers after which a problem is abandoned.
+	few_shot : int
+		Number of similar solved formulations added to the variables and constraints requests (see retrieval_utils).
+	"""
+
+	def __init__(self, batch_dir, problems, backend, max_attempts=3, few_shot=0):
+		self.batch_dir = batch_dir
+		self.backend = backend
+		self.max_attempts = max_attempts
+		self.few_shot = few_shot
+		self.timeout = 300
+		self.state_path = os.path.join(batch_dir, "state.json")
+		os.makedirs(batch_dir, exist_ok=True)
+		if os.path.exists(self.state_path):
+			with open(self.state_path, "r", encoding="utf-8") as f:
+				self.state = json.load(f)
+		else:
+			self.state = {"round": 0, "problems": {}}
+		for problem_id, problem in problems.items():
+			self.state["problems"].setdefault(problem_id, {
+				"description": problem["description"], "expected": problem.get("expected"),
+				"stage": BATCH_STAGES[0], "status": "pending", "attempts": 0, "error": None,
+				"complete_description": None, "code": code_utils.define_imports(with_data=False) + "\n\nsolver = define_solver(\"SCIP\")"
+			})
+
+	def save(self):
+		tmp_path = self.state_path + ".tmp"
+		with open(tmp_path, "w", encoding="utf-8") as f:
+			json.dump(self.state, f, ensure_ascii=False, indent=1)
+		os.replace(tmp_path, self.state_path)
+
+	def pending(self):
+		return [problem_id for problem_id, problem in self.state["problems"].items() if problem["status"] == "pending"]
+
+	def messages(self, problem):
+		"""
+		Messages of the current stage of a problem, built as in llm_utils.
+		"""
+		registry = prompt_utils.get_registry()
+		stage = problem["stage"]
+		if stage == "summary":
+			return [
+				{"role": "system", "content": registry.prompt(SUMMARY_PROMPT)},
+				{"role": "user", "content": problem["description"]},
+			]
+		if stage == "printing":
+			code = problem["code"] + code_utils.add_print_summary()
+			return registry.code_messages(PRINT_PROMPT, stage, problem["complete_description"], code, "")
+		examples = ""
+		if self.few_shot > 0 and stage in ("variables", "constraints"):
+			examples = retrieval_utils.get_index().examples(problem["complete_description"], k=self.few_shot, exclude=problem["description"])
+		return registry.code_messages(CODE_PROMPT, stage, problem["complete_description"], problem["code"], "", examples)
+
+	def build_requests(self, path):
+		"""
+		Write the requests of the current stage of every pending problem to a JSONL batch file. Return their number.
+		"""
+		router = routing_utils.get_router()
+		budgets = budget_utils.get_budgets()
+		count = 0
+		with open(path, "w", encoding="utf-8") as f:
+			for problem_id in self.pending():
+				problem = self.state["problems"][problem_id]
+				route = router.route(problem["stage"])
+				body = {
+					"model": route["model"],
+					# Truncated answers are resubmitted with a larger budget
+					"max_tokens": budgets.escalate(problem["max_tokens"]) if problem.get("max_tokens") else budgets.max_tokens(problem["stage"]),
+					"messages": self.messages(problem),
+				}
+				if route.get("reasoning_effort"):
+					body["reasoning_effort"] = route["reasoning_effort"]
+				line = {"custom_id": f"{problem_id}|{problem['stage']}", "method": "POST", "url": "/chat/completions", "body": body}
+				f.write(json.dumps(line, ensure_ascii=False) + "\n")
+				count += 1
+		return count
+
+	def _first_attempt(self, problem, stage, failed):
+		# Outcome of the first answer of each stage, to compare runs with and without retrieved examples
+		problem.setdefault("first_attempts", {}).setdefault(stage, not failed)
+
+	def _fail(self, problem, error):
+		problem["attempts"] += 1
+		problem["retries"] = problem.get("retries", 0) + 1
+		problem["error"] = error
+		if problem["attempts"] >= self.max_attempts:
+			problem["status"] = "failed"
+
+	def ingest(self, requests_path, results_path):
+		"""
+		Advance every problem answered in the results file to its next stage. Unanswered or failed requests are retried
+		in the next round, up to max_attempts times.
+		"""
+		with open(requests_path, "r", encoding="utf-8") as f:
+			sent = {line["custom_id"]: line["body"] for line in map(json.loads, f) if line}
+		answers = {}
+		with open(results_path, "r", encoding="utf-8") as f:
+			for line in f:
+				if line.strip():
+					answer = json.loads(line)
+					answers[answer["custom_id"]] = answer
+
+		cache = cache_utils.get_cache()
+		for custom_id, body in sent.items():
+			problem_id, stage = custom_id.split("|")
+			problem = self.state["problems"][problem_id]
+			answer = answers.get(custom_id)
+			if answer is None or answer.get("error") or (answer.get("response") or {}).get("status_code") != 200:
+				self._first_attempt(problem, stage, True)
+				self._fail(problem, (answer or {}).get("error") or "No answer")
+				continue
+			response = answer["response"]["body"]
+			telemetry_utils.record_call(stage, body["model"], response, 0.0, "batch")
+			if budget_utils.truncated(response):
+				self._first_attempt(problem, stage, True)
+				problem["max_tokens"] = body["max_tokens"]
+				problem["truncated_retries"] = problem.get("truncated_retries", 0) + 1
+				problem["error"] = f"Truncated {stage} answer with max_tokens={body['max_tokens']}"
+				# Resubmitted with a larger budget, without counting as a failed attempt until the largest budget is reached
+				if body["max_tokens"] >= budget_utils.MAX_TOKENS_LIMIT:
+					self._fail(problem, problem["error"])
+				continue
+			problem["max_tokens"] = None
+			budget_utils.get_budgets().record(stage, (response.get("usage") or {}).get("completion_tokens"))
+			# Later interactive runs of the same requests are served from the cache
+			cache.put(cache_utils.request_key(body["model"], body["messages"]), response)
+			content = response["choices"][0]["message"]["content"]
+			try:
+				if stage == "summary":
+					problem["complete_description"] = content
+				elif stage == "printing":
+					problem["code"] += code_utils.add_print_summary() + "\n\n" + code_utils.parse_code_response(content)
+				else:
+					problem["code"] += code_utils.parse_code_response(content)
+			except ValueError as error:
+				self._first_attempt(problem, stage, True)
+				self._fail(problem, f"Unparsable {stage} answer : {error}")
+				continue
+			self._first_attempt(problem, stage, False)
+			problem["attempts"] = 0
+			problem["error"] = None
+			if stage == BATCH_STAGES[-1]:
+				problem["status"] = "generated"
+			else:
+				problem["stage"] = BATCH_STAGES[BATCH_STAGES.index(stage) + 1]
+
+	def run(self):
+		"""
+		Run rounds until every problem is generated or failed.
+		"""
+		while self.pending():
+			self.state["round"] += 1
+			requests_path = os.path.join(self.batch_dir, f"round_{self.state['round']}.jsonl")
+			results_path = os.path.join(self.batch_dir, f"round_{self.state['round']}_results.jsonl")
+			count = self.build_requests(requests_path)
+			start = time.perf_counter()
+			self.backend.run(requests_path, results_path)
+			self.ingest(requests_path, results_path)
+			self.save()
+			budget_utils.get_budgets().save()
+			stages = {}
+			for problem in self.state["problems"].values():
+				key = problem["stage"] if problem["status"] == "pending" else problem["status"]
+				stages[key] = stages.get(key, 0) + 1
+			print(f"Round {self.state['round']} : {count} requests answered in {time.perf_counter() - start:.1f}s, problems per stage : {stages}")
+
+	def _execute(self, problem_id):
+		problem = self.state["problems"][problem_id]
+		workspace = os.path.join(self.batch_dir, "solutions", problem_id)
+		os.makedirs(workspace, exist_ok=True)
+		for fname in candidate_utils.LIBRARY_FILES:
+			shutil.copy(fname, os.path.join(workspace, fname))
+		with open(os.path.join(workspace, "solution.py"), "w", encoding="utf-8") as f:
+			f.write(problem["code"])
+		try:
+			result = subprocess.run(
+				[sys.executable, "solution.py"], cwd=workspace, capture_output=True, text=True, timeout=self.timeout
+			)
+		except subprocess.TimeoutExpired:
+			return problem_id, {"status": None, "objective": None, "error": f"Timed out after {self.timeout}s"}
+		solution_path = os.path.join(workspace, diff_utils.SOLUTION_FILE)
+		if result.returncode != 0 or not os.path.exists(solution_path):
+			return problem_id, {"status": None, "objective": None, "error": result.stderr.strip().split("\n")[-1] if result.stderr.strip() else None}
+		with np.load(solution_path) as solution:
+			status = int(solution["status"]) if "status" in solution.files else None
+			return problem_id, {"status": status, "objective": float(solution["objective"]), "error": None}
+
+	def execute(self, timeout=300, max_workers=8, rtol=1e-4):
+		"""
+		Run the generated solutions concurrently and compare their objective value to the expected one.
+
+		Returns
+		-------
+		dict
+			Counts of generated, solved (optimal or feasible) and correct problems, of failed answers requested again and
+			of truncated answers resubmitted with a larger budget, the number of first answers of each stage and how many
+			failed (no answer, truncated or unparsable), tagged with the number of retrieved examples (few_shot), and the
+			outcome of each problem.
+		"""
+		self.timeout = timeout
+		generated = [p for p, problem in self.state["problems"].items() if problem["status"] == "generated"]
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			outcomes = dict(executor.map(self._execute, generated))
+		for problem_id, outcome in outcomes.items():
+			expected = self.state["problems"][problem_id]["expected"]
+			try:
+				expected = float(expected)
+			except (TypeError, ValueError):
+				expected = None
+			outcome["correct"] = (
+				expected is not None and outcome["objective"] is not None
+				and outcome["status"] in candidate_utils.VALID_STATUSES
+				and bool(np.isclose(outcome["objective"], expected, rtol=rtol, atol=rtol))
+			)
+		first_attempts = {}
+		for problem in self.state["problems"].values():
+			for stage, succeeded in problem.get("first_attempts", {}).items():
+				counts = first_attempts.setdefault(stage, {"answers": 0, "failed": 0})
+				counts["answers"] += 1
+				counts["failed"] += not succeeded
+		report = {
+			"few_shot": self.few_shot,
+			"problems": len(self.state["problems"]),
+			"generated": len(generated),
+			"solved": sum(o["status"] in candidate_utils.VALID_STATUSES for o in outcomes.values()),
+			"correct": sum(o["correct"] for o in outcomes.values()),
+			"retries": sum(problem.get("retries", 0) for problem in self.state["problems"].values()),
+			"truncated_retries": sum(problem.get("truncated_retries", 0) for problem in self.state["problems"].values()),
+			"first_attempts": {stage: first_attempts[stage] for stage in BATCH_STAGES if stage in first_attempts},
+			"outcomes": outcomes,
+		}
+		with open(os.path.join(self.batch_dir, "results.json"), "w", encoding="utf-8") as f:
+			json.dump(report, f, indent=1)
+		return report
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description="Run the pipeline on an evaluation dataset with batch requests.")
+	parser.add_argument("dataset", type=str, choices=["LPWP", "IndustryOR"], help="Evaluation dataset.")
+	parser.add_argument("--backend", type=str, default="local", choices=["local", "openai"], help="Batch service : local stand-in answering with the LLM client (local), or the Batch API of the endpoint (openai).")
+	parser.add_argument("--dir", type=str, default=None, help="Directory of the batch files and state (default batches/<dataset>).")
+	parser.add_argument("--limit", type=int, default=None, help="Only run the first problems of the dataset.")
+	parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between two status requests of the Batch API.")
+	parser.add_argument("--timeout", type=float, default=300.0, help="Maximum duration of a solution run, in seconds.")
+	parser.add_argument("--few-shot", type=int, default=0, help="Number of similar solved formulations added to the variables and constraints requests.")
+	args = parser.parse_args()
+
+	problems = load_dataset(args.dataset)
+	if args.limit is not None:
+		problems = dict(list(problems.items())[:args.limit])
+	backend = LocalBatchBackend() if args.backend == "local" else OpenAIBatchBackend(poll_interval=args.poll_interval)
+	runner = BatchRunner(args.dir or os.path.join(BATCH_DIR, args.dataset), problems, backend, few_shot=args.few_shot)
+	runner.run()
+	report = runner.execute(timeout=args.timeout)
+	print(f"{report['generated']}/{report['problems']} problems generated, {report['solved']} solved, {report['correct']} with the expected objective value, {report['retries']} answers requested again")
+	print(telemetry_utils.format_table(telemetry_utils.stage_summary()))
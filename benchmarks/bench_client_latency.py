@@ -0,0 +1,72 @@
+"""
+Latency benchmark of the shared LLM client (client_utils.LLMClient) against the former per-call requests.post,
+using the local stub of the chat completions endpoint (stub_server.py).
+
+The stub is plain HTTP on localhost, so the measured gain only covers TCP connection setup and credential loading :
+against the real HTTPS endpoint, the TLS handshake saved by the connection pool adds to it.
+
+Run from the root of the repository : python3 benchmarks/bench_client_latency.py
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+import client_utils
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stub_server import StubServer
+
+def _former_call(url, key_path, data):
+	# Former openai_ask_requests : key read from disk and new connection on every call
+	headers = {
+		"Content-Type": "application/json",
+		"Cache-Control": "no-cache",
+		"api-key": open(key_path, "r").read().strip()
+	}
+	return requests.post(url, headers=headers, json=data).json()
+
+def _report(name, latencies):
+	latencies = sorted(latencies)
+	p50 = statistics.median(latencies)
+	p95 = latencies[int(0.95 * (len(latencies) - 1))]
+	print(f"{name:<20} mean {1000*statistics.mean(latencies):7.3f} ms   p50 {1000*p50:7.3f} ms   p95 {1000*p95:7.3f} ms")
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description="Benchmark the latency of the LLM client against a local stub.")
+	parser.add_argument("-n", "--num-requests", type=int, default=500, help="Number of requests per client.")
+	args = parser.parse_args()
+
+	stub = StubServer().start()
+	base_url = stub.url
+	data = {"max_tokens": 10000, "messages": [{"role": "user", "content": "Hello"}]}
+
+	with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+		f.write("stub-key")
+		key_path = f.name
+
+	client = client_utils.LLMClient(base_url=base_url, api_key="stub-key")
+	url = client.url("gpt-5")
+
+	latencies = {"requests.post": [], "LLMClient": []}
+	for _ in range(args.num_requests):
+		start = time.perf_counter()
+		_former_call(url, key_path, data)
+		latencies["requests.post"].append(time.perf_counter() - start)
+
+		start = time.perf_counter()
+		client.post("gpt-5", data)
+		latencies["LLMClient"].append(time.perf_counter() - start)
+
+	for name, values in latencies.items():
+		_report(name, values)
+
+	client.close()
+	stub.stop()
+	os.remove(key_path)
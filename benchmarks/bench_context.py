@@ -0,0 +1,91 @@
+"""
+Prompt size and latency of the code generation stages, with and without context compaction (main.py --compact-context).
+
+Each dataset problem is materialized as problems/{prefix}{problem}/user_input.md and run twice through main.py, with the
+LLM response cache disabled. The per stage prompt tokens and latencies are read back from the telemetry.json of each run.
+
+Run from the root of the repository, with the API credentials set :
+	python3 benchmarks/bench_context.py --dataset LPWP --limit 5
+	python3 benchmarks/bench_context.py --problems akkodis_research
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBLEM_BASE_DIR = os.path.join(ROOT, "problems")
+DATASET_DIR = os.path.join(ROOT, "datasets")
+STAGES = ("variables", "objective", "constraints", "printing")
+
+def materialize(dataset, problem, prefix):
+	"""
+	Copy the description of a dataset problem to problems/{prefix}{problem}/user_input.md and return the problem name.
+	"""
+	name = f"{prefix}{problem}"
+	path = os.path.join(PROBLEM_BASE_DIR, name)
+	os.makedirs(path, exist_ok=True)
+	shutil.copyfile(os.path.join(DATASET_DIR, dataset, problem, "description.txt"), os.path.join(path, "user_input.md"))
+	return name
+
+def run(problem, compact):
+	"""
+	Run main.py on a problem and return the per stage telemetry summary, or None if the run failed.
+	"""
+	cmd = [sys.executable, "main.py", "-f", problem, "-v", "0", "--cache", "disabled"]
+	if compact:
+		cmd.append("--compact-context")
+	result = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+	telemetry_path = os.path.join(PROBLEM_BASE_DIR, problem, "telemetry.json")
+	if result.returncode != 0 or not os.path.exists(telemetry_path):
+		print(f"{problem} ({'compact' if compact else 'full'}) failed :\n{result.stderr[-2000:]}", file=sys.stderr)
+		return None
+	with open(telemetry_path, "r", encoding="utf-8") as f:
+		return json.load(f)["stages"]
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--dataset", type=str, default="LPWP", help="Dataset whose problems have a description.txt (LPWP, ComplexOR).")
+	parser.add_argument("--limit", type=int, default=5, help="Number of dataset problems to run.")
+	parser.add_argument("--problems", type=str, nargs="*", help="Problems of the problems directory to run instead of the dataset.")
+	parser.add_argument("--prefix", type=str, default="bench_", help="Prefix of the materialized dataset problems.")
+	args = parser.parse_args()
+
+	if args.problems:
+		problems = args.problems
+	else:
+		names = sorted(
+			p for p in os.listdir(os.path.join(DATASET_DIR, args.dataset))
+			if os.path.exists(os.path.join(DATASET_DIR, args.dataset, p, "description.txt"))
+		)
+		problems = [materialize(args.dataset, p, args.prefix) for p in names[:args.limit]]
+
+	totals = {mode: {s: {"prompt_tokens": 0, "latency": 0.0} for s in STAGES} for mode in ("full", "compact")}
+	runs = 0
+	for problem in problems:
+		results = {"full": run(problem, False), "compact": run(problem, True)}
+		if None in results.values():
+			continue
+		runs += 1
+		for mode, stages in results.items():
+			for s in STAGES:
+				totals[mode][s]["prompt_tokens"] += stages.get(s, {}).get("prompt_tokens", 0)
+				totals[mode][s]["latency"] += stages.get(s, {}).get("latency", 0.0)
+
+	if runs == 0:
+		print("No successful run.")
+		return
+	print(f"Mean over {runs} problem(s)")
+	print(f"{'stage':<14}{'prompt tok':>12}{'compact':>10}{'gain':>8}{'latency (s)':>13}{'compact':>10}")
+	for s in STAGES:
+		full, compact = totals["full"][s], totals["compact"][s]
+		gain = 1 - compact["prompt_tokens"] / full["prompt_tokens"] if full["prompt_tokens"] else 0.0
+		print(
+			f"{s:<14}{full['prompt_tokens'] / runs:>12.0f}{compact['prompt_tokens'] / runs:>10.0f}{gain:>8.1%}"
+			f"{full['latency'] / runs:>13.2f}{compact['latency'] / runs:>10.2f}"
+		)
+
+if __name__ == "__main__":
+	main()
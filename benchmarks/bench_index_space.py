@@ -0,0 +1,66 @@
+"""
+Micro-benchmarks of the N-D index iteration engine (utils.index_space) against the former recursive nested_loops,
+for 1-D to 4-D shapes, both for plain index iteration and for define_variables.
+
+Run from the root of the repository : python3 benchmarks/bench_index_space.py
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import utils
+
+SHAPES = [(200000,), (450, 450), (60, 60, 60), (22, 22, 22, 22)]
+
+def _recursive_nested_loops(loops_iterables, depth, indices):
+	# Former implementation of utils.nested_loops, kept as reference
+	if depth == 0:
+		return
+	for i in loops_iterables[0]:
+		yield from _recursive_nested_loops(loops_iterables=loops_iterables[1:], indices=indices+[i], depth=depth-1)
+		if depth-1 == 0:
+			yield tuple(indices + [i])
+
+def _consume(iterator):
+	for _ in iterator:
+		pass
+
+def bench_iteration(shape, repeat):
+	ranges = [range(n) for n in shape]
+	mask = np.random.default_rng(0).random(shape) < 0.2
+	timings = {
+		"recursive": lambda: _consume(_recursive_nested_loops(ranges, len(ranges), [])),
+		"nested_loops": lambda: _consume(utils.nested_loops(ranges)),
+		"index_tuples": lambda: _consume(utils.index_tuples(shape)),
+		"index_space": lambda: utils.index_space(shape),
+		"index_space (20% mask)": lambda: utils.index_space(shape, mask),
+	}
+	return {name: min(timeit.repeat(f, number=1, repeat=repeat)) for name, f in timings.items()}
+
+def bench_define_variables(shape, repeat):
+	from optimization_utils import define_solver, define_variables
+
+	def run():
+		solver = define_solver("SCIP")
+		define_variables(solver, shape, lbs=0, ubs=1, integer=True, suffix="x")
+	return {"define_variables": min(timeit.repeat(run, number=1, repeat=repeat))}
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description="Benchmark the N-D index iteration engine.")
+	parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions, the best time is reported.")
+	parser.add_argument("--no-solver", action="store_true", help="Skip the define_variables benchmark (no or-tools).")
+	args = parser.parse_args()
+
+	for shape in SHAPES:
+		print(f"=== shape {shape} ({int(np.prod(shape))} indices) ===")
+		timings = bench_iteration(shape, args.repeat)
+		if not args.no_solver:
+			timings.update(bench_define_variables(shape, args.repeat))
+		for name, t in timings.items():
+			print(f"{name:<25} {1000*t:10.2f} ms")
+		print()
@@ -0,0 +1,62 @@
+"""
+Failed first answers of each code generation stage, without and with retrieved similar formulations (--few-shot).
+
+The dataset is run twice in batch mode (batch_utils.py), into batches/{dataset}_few_shot_0 and
+batches/{dataset}_few_shot_{k}, and the first_attempts counts of their results.json are compared. Runs already
+complete are resumed from their state and only compared.
+
+Run from the root of the repository, with the API credentials set :
+	python3 benchmarks/bench_retrieval.py LPWP --limit 20
+	python3 benchmarks/bench_retrieval.py IndustryOR --limit 20 --few-shot 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_DIR = os.path.join(ROOT, "batches")
+STAGES = ("summary", "variables", "objective", "constraints", "printing")
+
+def run(dataset, limit, few_shot):
+	"""
+	Run the dataset in batch mode and return its report (results.json), or None if the run failed.
+	"""
+	batch_dir = os.path.join(BATCH_DIR, f"{dataset}_few_shot_{few_shot}")
+	cmd = [sys.executable, "batch_utils.py", dataset, "--dir", batch_dir, "--few-shot", str(few_shot)]
+	if limit is not None:
+		cmd += ["--limit", str(limit)]
+	result = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+	results_path = os.path.join(batch_dir, "results.json")
+	if result.returncode != 0 or not os.path.exists(results_path):
+		print(f"{dataset} (few_shot={few_shot}) failed :\n{result.stderr[-2000:]}", file=sys.stderr)
+		return None
+	with open(results_path, "r", encoding="utf-8") as f:
+		return json.load(f)
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("dataset", type=str, choices=["LPWP", "IndustryOR"], help="Evaluation dataset.")
+	parser.add_argument("--limit", type=int, default=20, help="Number of dataset problems to run.")
+	parser.add_argument("--few-shot", type=int, default=3, help="Number of retrieved formulations of the second run.")
+	args = parser.parse_args()
+
+	reports = {"off": run(args.dataset, args.limit, 0), "on": run(args.dataset, args.limit, args.few_shot)}
+	if None in reports.values():
+		return
+	print(f"Failed first answers per stage, {reports['off']['problems']} problem(s), without and with {args.few_shot} retrieved formulations")
+	print(f"{'stage':<14}{'answers':>9}{'failed':>8}{'rate':>8}{'answers':>9}{'failed':>8}{'rate':>8}")
+	for stage in STAGES:
+		row = f"{stage:<14}"
+		for mode in ("off", "on"):
+			counts = reports[mode].get("first_attempts", {}).get(stage, {"answers": 0, "failed": 0})
+			rate = counts["failed"] / counts["answers"] if counts["answers"] else 0.0
+			row += f"{counts['answers']:>9}{counts['failed']:>8}{rate:>8.1%}"
+		print(row)
+	for mode in ("off", "on"):
+		report = reports[mode]
+		print(f"retrieval {mode} : {report['solved']} solved, {report['correct']} correct, {report['retries']} answers requested again")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,99 @@
+"""
+Load test of the LLM call path of the pipeline (llm_utils.openai_ask_requests : routing, retries, rate limiting,
+streaming, telemetry) against the local stub endpoint of stub_server.py, with the response cache disabled.
+
+Requests are spread over the pipeline stages and sent with the asyncio client, at most --concurrency at a time.
+The latency percentiles of the calls (including retries) and the throughput are reported.
+
+Run from the root of the repository :
+	python3 benchmarks/load_test.py -n 400 --concurrency 16 --latency lognormal:-1.5,0.5 --rate-429 0.05
+	python3 benchmarks/load_test.py --base-url http://127.0.0.1:8400   # against a stub started separately
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cache_utils
+import client_utils
+import llm_utils
+import replay_utils
+import routing_utils
+import telemetry_utils
+from stub_server import StubServer
+
+STAGES = ("summary", "variables", "objective", "constraints", "printing", "csv_descriptor")
+
+def _percentile(values, q):
+	values = sorted(values)
+	return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+async def _drive(n, stream):
+	async def one(i):
+		messages = [
+			{"role": "system", "content": "You are a load test."},
+			{"role": "user", "content": f"Request {i}"},
+		]
+		stage = STAGES[i % len(STAGES)]
+		if stream:
+			# Streamed calls are blocking : run them in the worker threads of the asyncio client
+			return await client_utils.get_async_client().call(
+				llm_utils.openai_ask_requests, messages, stream=True, stop=llm_utils._code_block_closed, stage=stage
+			)
+		return await llm_utils.openai_ask_async(messages, stage=stage)
+	return await asyncio.gather(*(one(i) for i in range(n)), return_exceptions=True)
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("-n", "--num-requests", type=int, default=400, help="Number of requests.")
+	parser.add_argument("--concurrency", type=int, default=16, help="Maximum number of concurrent requests.")
+	parser.add_argument("--stream", action="store_true", help="Stream the completions.")
+	parser.add_argument("--base-url", type=str, default=None, help="Endpoint to load. By default a stub is started in process.")
+	parser.add_argument("--latency", type=str, default="lognormal:-1.5,0.5", help="Latency distribution of the in-process stub.")
+	parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of a 429 answer of the in-process stub.")
+	parser.add_argument("--rate-500", type=float, default=0.0, help="Probability of a 500 answer of the in-process stub.")
+	parser.add_argument("--token-delay", type=float, default=0.0, help="Delay between two streamed chunks of the in-process stub.")
+	parser.add_argument("--max-retries", type=int, default=5, help="Retries of the client.")
+	args = parser.parse_args()
+
+	stub = None
+	base_url = args.base_url
+	if base_url is None:
+		stub = StubServer(
+			latency=args.latency, rate_429=args.rate_429, rate_500=args.rate_500, token_delay=args.token_delay,
+			retry_after=0.05
+		).start()
+		base_url = stub.url
+
+	os.environ["LLOCO_MAX_CONCURRENCY"] = str(args.concurrency)
+	client_utils.configure_client(base_url=base_url, api_key="stub", pool_size=args.concurrency, max_retries=args.max_retries, backoff_base=0.05, backoff_max=1.0)
+	cache_utils.configure_cache(mode="disabled")
+	replay_utils.configure_recorder(mode="off")
+	routing_utils.configure_router()
+	telemetry_utils.reset()
+
+	start = time.perf_counter()
+	results = asyncio.run(_drive(args.num_requests, args.stream))
+	elapsed = time.perf_counter() - start
+
+	errors = [r for r in results if isinstance(r, Exception)]
+	calls = telemetry_utils.get_calls()
+	latencies = [call["latency"] for call in calls]
+	print(f"{len(calls)} successful calls, {len(errors)} failed, in {elapsed:.2f}s : {len(calls) / elapsed:.1f} calls/s")
+	print(
+		f"latency   mean {sum(latencies) / max(1, len(latencies)):.3f}s   p50 {_percentile(latencies, 0.5):.3f}s   "
+		f"p95 {_percentile(latencies, 0.95):.3f}s   max {max(latencies, default=0.0):.3f}s"
+	)
+	print(client_utils.client_summary())
+	if stub is not None:
+		print(f"stub : {stub.stats}")
+		stub.stop()
+	if errors:
+		print(f"first error : {errors[0]}")
+
+if __name__ == "__main__":
+	main()
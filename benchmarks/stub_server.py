@@ -0,0 +1,217 @@
+"""
+Local stub of the chat completions endpoint, to measure the client (pooling, retries, concurrency, streaming) without
+the real endpoint.
+
+Every POST request whose path ends with /chat/completions is answered after a latency drawn from a configurable
+distribution, fails with a 429 or 500 status at configurable rates, and is streamed as server-sent events when the
+request asks for it. Answers are replayed from recorded fixtures (main.py --replay record) when the request matches
+one, and canned otherwise.
+
+Run standalone from the root of the repository, then point the client to it with LLOCO_API_BASE :
+	python3 benchmarks/stub_server.py --port 8400 --latency lognormal:-0.7,0.5 --rate-429 0.05
+	LLOCO_API_BASE=http://127.0.0.1:8400 LLOCO_API_KEY=stub python3 main.py -f problem_name
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_utils
+
+CANNED_CONTENT = "```python\nx = 1\n```"
+
+def parse_latency(spec):
+	"""
+	Latency distribution from its specification, in seconds : "fixed:s", "uniform:low,high", "exp:mean" or
+	"lognormal:mu,sigma" (of the underlying normal distribution).
+	"""
+	kind, _, params = spec.partition(":")
+	values = [float(v) for v in params.split(",")] if params else []
+	if kind == "fixed" and len(values) == 1:
+		return lambda: values[0]
+	if kind == "uniform" and len(values) == 2:
+		return lambda: random.uniform(*values)
+	if kind == "exp" and len(values) == 1:
+		return lambda: random.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+	if kind == "lognormal" and len(values) == 2:
+		return lambda: random.lognormvariate(*values)
+	raise ValueError(f"Unknown latency distribution {spec} ! Use fixed:s, uniform:low,high, exp:mean or lognormal:mu,sigma.")
+
+class StubServer(object):
+	"""
+	Stub of the chat completions endpoint, served from a background thread.
+
+	Parameters
+	----------
+	latency : str
+		Latency distribution of the answers (see parse_latency).
+	rate_429, rate_500 : float
+		Probability of answering with a rate limiting (429, with a Retry-After header) or a server error (500).
+	retry_after : float
+		Retry-After value of the 429 answers, in seconds.
+	token_delay : float
+		Delay between two streamed chunks, in seconds.
+	content : str
+		Content of the canned answers.
+	fixtures_dir : str, optional
+		Directory of recorded fixtures (see replay_utils.Recorder) to replay when a request matches.
+	host, port : str, int
+		Address of the server. Port 0 picks a free port.
+	"""
+
+	def __init__(self, latency="fixed:0", rate_429=0.0, rate_500=0.0, retry_after=0.1, token_delay=0.0,
+			content=CANNED_CONTENT, fixtures_dir=None, host="127.0.0.1", port=0):
+		self.latency = parse_latency(latency)
+		self.rate_429 = rate_429
+		self.rate_500 = rate_500
+		self.retry_after = retry_after
+		self.token_delay = token_delay
+		self.content = content
+		self.fixtures = {}
+		if fixtures_dir is not None:
+			for fname in os.listdir(fixtures_dir):
+				if fname.endswith(".json"):
+					with open(os.path.join(fixtures_dir, fname), "r", encoding="utf-8") as f:
+						self.fixtures[fname[:-len(".json")]] = json.load(f)["response"]
+		self.stats = {"requests": 0, "429": 0, "500": 0, "replayed": 0, "streamed": 0}
+		self._lock = threading.Lock()
+		self.server = ThreadingHTTPServer((host, port), self._handler())
+		self.server.daemon_threads = True
+		self._thread = None
+
+	@property
+	def url(self):
+		host, port = self.server.server_address[:2]
+		return f"http://{host}:{port}"
+
+	def start(self):
+		self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def _count(self, key):
+		with self._lock:
+			self.stats[key] += 1
+
+	def answer(self, path, body):
+		"""
+		Response of a request : the recorded one if any, a canned one otherwise.
+		"""
+		match = re.search(r"models-([^/]+)/chat/completions", path)
+		model = match.group(1) if match else body.get("model")
+		key = cache_utils.request_key(model, body.get("messages"), body.get("response_format"))
+		if key in self.fixtures:
+			self._count("replayed")
+			return self.fixtures[key]
+		prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+		return {
+			"choices": [{"index": 0, "message": {"role": "assistant", "content": self.content}, "finish_reason": "stop"}],
+			"usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(self.content) // 4, "total_tokens": (prompt_chars + len(self.content)) // 4},
+		}
+
+	def _handler(self):
+		stub = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+			disable_nagle_algorithm = True
+
+			def _send_json(self, status, payload, headers=None):
+				data = json.dumps(payload).encode()
+				self.send_response(status)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(data)))
+				for name, value in (headers or {}).items():
+					self.send_header(name, value)
+				self.end_headers()
+				self.wfile.write(data)
+
+			def _stream(self, response):
+				self.send_response(200)
+				self.send_header("Content-Type", "text/event-stream")
+				self.send_header("Transfer-Encoding", "chunked")
+				self.end_headers()
+				content = response["choices"][0]["message"]["content"]
+				pieces = re.findall(r"\S+\s*|\s+", content) or [""]
+				try:
+					for i, piece in enumerate(pieces):
+						chunk = {"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+						if i == len(pieces) - 1:
+							chunk["choices"][0]["finish_reason"] = response["choices"][0].get("finish_reason", "stop")
+							chunk["usage"] = response.get("usage")
+						self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+						if stub.token_delay > 0:
+							time.sleep(stub.token_delay)
+					self._write_chunk("data: [DONE]\n\n")
+					self._write_chunk("")
+				except (BrokenPipeError, ConnectionResetError):
+					# The client stopped reading (e.g. the code block was complete)
+					self.close_connection = True
+
+			def _write_chunk(self, text):
+				data = text.encode()
+				self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+				self.wfile.flush()
+
+			def do_POST(self):
+				body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+				stub._count("requests")
+				if not self.path.split("?")[0].endswith("/chat/completions"):
+					self._send_json(404, {"error": {"message": f"Unknown route {self.path}"}})
+					return
+				time.sleep(max(0.0, stub.latency()))
+				draw = random.random()
+				if draw < stub.rate_429:
+					stub._count("429")
+					self._send_json(429, {"error": {"message": "Rate limit reached"}}, {"Retry-After": str(stub.retry_after)})
+					return
+				if draw < stub.rate_429 + stub.rate_500:
+					stub._count("500")
+					self._send_json(500, {"error": {"message": "Internal server error"}})
+					return
+				response = stub.answer(self.path, body)
+				if body.get("stream"):
+					stub._count("streamed")
+					self._stream(response)
+				else:
+					self._send_json(200, response)
+
+			def log_message(self, format, *args):
+				pass
+
+		return Handler
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--host", type=str, default="127.0.0.1", help="Address of the server.")
+	parser.add_argument("--port", type=int, default=8400, help="Port of the server.")
+	parser.add_argument("--latency", type=str, default="fixed:0", help="Latency distribution : fixed:s, uniform:low,high, exp:mean or lognormal:mu,sigma.")
+	parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of a 429 answer.")
+	parser.add_argument("--rate-500", type=float, default=0.0, help="Probability of a 500 answer.")
+	parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After of the 429 answers, in seconds.")
+	parser.add_argument("--token-delay", type=float, default=0.0, help="Delay between two streamed chunks, in seconds.")
+	parser.add_argument("--content", type=str, default=CANNED_CONTENT, help="Content of the canned answers.")
+	parser.add_argument("--fixtures", type=str, default=None, help="Directory of recorded fixtures to replay (problem_name/fixtures).")
+	args = parser.parse_args()
+
+	stub = StubServer(
+		latency=args.latency, rate_429=args.rate_429, rate_500=args.rate_500, retry_after=args.retry_after,
+		token_delay=args.token_delay, content=args.content, fixtures_dir=args.fixtures, host=args.host, port=args.port
+	)
+	print(f"Stub endpoint listening on {stub.url}")
+	try:
+		stub.server.serve_forever()
+	except KeyboardInterrupt:
+		print(stub.stats)
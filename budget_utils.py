@@ -0,0 +1,127 @@
+import json
+import math
+import os
+import threading
+
+# Output budget of a stage without enough recorded completions, and the largest budget of a truncated completion retry
+DEFAULT_MAX_TOKENS = 10000
+MAX_TOKENS_LIMIT = 32000
+
+BUDGETS_PATH = os.path.join(".lloco_cache", "token_budgets.json")
+
+class TokenBudgets(object):
+	"""
+	Output token budget (max_tokens) of each pipeline stage, learned from the completion tokens of past calls :
+	the quantile of the recorded completions plus a margin, or DEFAULT_MAX_TOKENS until min_samples completions are recorded.
+
+	Recorded completions are saved to a JSON file, so budgets are learned across runs.
+
+	Parameters
+	----------
+	path : str, optional
+		Path of the JSON file of recorded completion tokens. None to keep them in memory.
+	quantile : float
+		Quantile of the recorded completion tokens covered by the budget.
+	margin : float
+		Relative margin added to the quantile.
+	min_samples : int
+		Number of recorded completions from which the budget of a stage is learned.
+	history : int
+		Number of most recent completions kept per stage.
+	adaptive : bool
+		If False, every stage gets DEFAULT_MAX_TOKENS.
+	"""
+
+	def __init__(self, path=BUDGETS_PATH, quantile=0.99, margin=0.25, min_samples=5, history=200, adaptive=True):
+		self.path = path
+		self.quantile = quantile
+		self.margin = margin
+		self.min_samples = min_samples
+		self.history = history
+		self.adaptive = adaptive
+		self._lock = threading.Lock()
+		self._recorded = {}
+		self._new = {}
+		if path is not None and os.path.exists(path):
+			with open(path, "r", encoding="utf-8") as f:
+				self._recorded = json.load(f)
+
+	def record(self, stage, completion_tokens):
+		"""
+		Record the completion tokens of a call that was not truncated.
+		"""
+		if not completion_tokens:
+			return
+		with self._lock:
+			self._recorded.setdefault(stage, []).append(completion_tokens)
+			self._recorded[stage] = self._recorded[stage][-self.history:]
+			self._new.setdefault(stage, []).append(completion_tokens)
+
+	def max_tokens(self, stage):
+		"""
+		Output budget of a stage.
+		"""
+		with self._lock:
+			samples = sorted(self._recorded.get(stage, []))
+		if not self.adaptive or len(samples) < self.min_samples:
+			return DEFAULT_MAX_TOKENS
+		value = samples[min(len(samples) - 1, math.ceil(self.quantile * len(samples)) - 1)]
+		return min(DEFAULT_MAX_TOKENS, math.ceil(value * (1 + self.margin)))
+
+	def escalate(self, max_tokens):
+		"""
+		Budget of the retry of a truncated completion.
+		"""
+		return min(MAX_TOKENS_LIMIT, max(2 * max_tokens, DEFAULT_MAX_TOKENS))
+
+	def save(self):
+		"""
+		Add the completions recorded by this process to the JSON file, keeping those recorded meanwhile by other processes.
+		"""
+		if self.path is None:
+			return
+		with self._lock:
+			recorded = {}
+			if os.path.exists(self.path):
+				with open(self.path, "r", encoding="utf-8") as f:
+					recorded = json.load(f)
+			for stage, values in self._new.items():
+				recorded[stage] = (recorded.get(stage, []) + values)[-self.history:]
+			self._new = {}
+			if os.path.dirname(self.path):
+				os.makedirs(os.path.dirname(self.path), exist_ok=True)
+			tmp_path = f"{self.path}.{os.getpid()}.tmp"
+			with open(tmp_path, "w", encoding="utf-8") as f:
+				json.dump(recorded, f)
+			os.replace(tmp_path, self.path)
+
+def truncated(response):
+	"""
+	Whether a completion was cut by its output budget.
+	"""
+	choices = response.get("choices") or [{}]
+	return choices[0].get("finish_reason") == "length" and not response.get("stopped_early")
+
+_budgets = None
+_budgets_lock = threading.Lock()
+
+def configure_budgets(**kwargs):
+	"""
+	Set the token budgets shared by the LLM calls of the process (see TokenBudgets).
+	"""
+	global _budgets
+	with _budgets_lock:
+		_budgets = TokenBudgets(**kwargs)
+
+def get_budgets():
+	"""
+	Get the token budgets shared by all the LLM calls of the process. Adaptive budgets are disabled with LLOCO_ADAPTIVE_TOKENS=0.
+	"""
+	global _budgets
+	with _budgets_lock:
+		if _budgets is None:
+			_budgets = TokenBudgets(
+				path=os.environ.get("LLOCO_BUDGETS", BUDGETS_PATH),
+				adaptive=os.environ.get("LLOCO_ADAPTIVE_TOKENS", "1") == "1"
+			)
+		return _budgets
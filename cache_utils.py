@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = ".lloco_cache"
+CACHE_MODES = ("readwrite", "readonly", "refresh", "disabled")
+
+def request_key(model, messages, response_format=None, sample=0):
+	"""
+	Content address of a chat request : hash of the model, the messages and the response format.
+	Independent samples of the same request (e.g. candidate models) get distinct keys through the sample index.
+	"""
+	request = {"model": model, "messages": messages, "response_format": response_format}
+	if sample:
+		request["sample"] = sample
+	payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+	return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache(object):
+	"""
+	Disk-backed cache of LLM responses, stored in SQLite and keyed by request_key.
+
+	Parameters
+	----------
+	path : str
+		Path of the SQLite database.
+	mode : str
+		"readwrite" serves and stores responses, "readonly" only serves them, "refresh" only stores them
+		(overwriting previous entries) and "disabled" bypasses the cache.
+	max_bytes : int
+		Maximum total size of the stored responses. Least recently used entries are evicted beyond it.
+	max_age : float
+		Maximum age of an entry in seconds. Older entries are evicted.
+	"""
+
+	def __init__(self, path=os.path.join(CACHE_DIR, "responses.sqlite"), mode="readwrite", max_bytes=256*1024**2, max_age=30*24*3600):
+		if mode not in CACHE_MODES:
+			raise ValueError(f"Unknown cache mode {mode} ! Available modes are {CACHE_MODES}.")
+		self.path = path
+		self.mode = mode
+		self.max_bytes = max_bytes
+		self.max_age = max_age
+		self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+		self._lock = threading.Lock()
+		self._conn = None
+		if mode != "disabled":
+			if os.path.dirname(path):
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+			self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+			self._conn.execute(
+				"CREATE TABLE IF NOT EXISTS responses ("
+				"key TEXT PRIMARY KEY, response TEXT, size INTEGER, created REAL, accessed REAL)"
+			)
+			self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+			self._conn.commit()
+
+	def get(self, key):
+		"""
+		Get the cached response of the request key, or None on a miss (or if the mode does not read the cache).
+		"""
+		if self.mode in ("disabled", "refresh"):
+			return None
+		with self._lock:
+			row = self._conn.execute(
+				"SELECT response, created FROM responses WHERE key = ?", (key,)
+			).fetchone()
+			if row is None or time.time() - row[1] > self.max_age:
+				self.stats["misses"] += 1
+				return None
+			if self.mode == "readwrite":
+				self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+				self._conn.commit()
+			self.stats["hits"] += 1
+		return json.loads(row[0])
+
+	def put(self, key, response):
+		"""
+		Store the response of the request key (if the mode writes to the cache), then evict old and least recently used entries.
+		"""
+		if self.mode in ("disabled", "readonly"):
+			return
+		value = json.dumps(response, ensure_ascii=False)
+		now = time.time()
+		with self._lock:
+			self._conn.execute(
+				"INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+				(key, value, len(value.encode("utf-8")), now, now)
+			)
+			self.stats["stores"] += 1
+			self._evict(now)
+			self._conn.commit()
+
+	def _evict(self, now):
+		evicted = self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,)).rowcount
+		total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+		if total > self.max_bytes:
+			rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall()
+			stale = []
+			for key, size in rows:
+				if total <= self.max_bytes:
+					break
+				stale.append((key,))
+				total -= size
+			self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+			evicted += len(stale)
+		self.stats["evictions"] += evicted
+
+	def summary(self):
+		"""
+		One line summary of the cache statistics.
+		"""
+		lookups = self.stats["hits"] + self.stats["misses"]
+		rate = 100 * self.stats["hits"] / lookups if lookups else 0.0
+		return (
+			f"LLM cache ({self.mode}) : {self.stats['hits']} hits, {self.stats['misses']} misses ({rate:.1f}% hit rate), "
+			f"{self.stats['stores']} stored, {self.stats['evictions']} evicted"
+		)
+
+	def close(self):
+		if self._conn is not None:
+			self._conn.close()
+			self._conn = None
+
+_cache = None
+_cache_config = {}
+_cache_lock = threading.Lock()
+
+def configure_cache(**kwargs):
+	"""
+	Set the parameters of the shared response cache (see ResponseCache). The cache is re-opened on next use.
+	"""
+	global _cache
+	with _cache_lock:
+		_cache_config.update(kwargs)
+		if _cache is not None:
+			_cache.close()
+			_cache = None
+
+def get_cache():
+	"""
+	Get the response cache shared by all the LLM calls of the process, opening it on first use.
+	"""
+	global _cache
+	with _cache_lock:
+		if _cache is None:
+			config = {"mode": os.environ.get("LLOCO_CACHE", "readwrite")}
+			config.update(_cache_config)
+			_cache = ResponseCache(**config)
+		return _cache
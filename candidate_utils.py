@@ -0,0 +1,263 @@
+import code_utils
+import diff_utils
+import json
+import llm_utils
+import numpy as np
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+CANDIDATES_DIR = "candidates"
+SELECTION_MODES = ("first", "majority")
+
+# Modules imported by the generated solution, copied to every workspace
+LIBRARY_FILES = ("optimization_utils.py", "utils.py", "log_utils.py")
+
+# Solver statuses of a valid candidate (pywraplp.Solver.OPTIMAL and FEASIBLE)
+VALID_STATUSES = (0, 1)
+
+def prepare_workspace(problem_path, workspace, data_path="data.py"):
+	"""
+	Create an isolated directory to run a candidate solution, holding the input files of the problem, the data loader
+	and the libraries used by the generated code.
+	"""
+	os.makedirs(workspace, exist_ok=True)
+	for fname in os.listdir(problem_path):
+		path = os.path.join(problem_path, fname)
+		if os.path.isfile(path) and fname.endswith(".csv"):
+			shutil.copy(path, os.path.join(workspace, fname))
+	for fname in LIBRARY_FILES:
+		shutil.copy(fname, os.path.join(workspace, fname))
+	if os.path.exists(data_path):
+		shutil.copy(data_path, os.path.join(workspace, "data.py"))
+
+def _objective_groups(objectives, rtol):
+	"""
+	Group candidate indices whose objective values are equal up to the relative tolerance.
+	"""
+	groups = []
+	for index, value in objectives:
+		for group in groups:
+			if np.isclose(value, group[0], rtol=rtol, atol=rtol):
+				group[1].append(index)
+				break
+		else:
+			groups.append((value, [index]))
+	return groups
+
+class CandidateRunner(object):
+	"""
+	Generate several independent candidate models of a problem concurrently, run each of them in an isolated workspace
+	and select one that reaches an optimal or feasible status.
+
+	Parameters
+	----------
+	problem_path : str
+		Directory of the problem. Workspaces are created under {problem_path}/candidates.
+	n : int
+		Number of candidates.
+	selection : str
+		"first" keeps the first valid candidate. "majority" waits for all candidates and keeps the first valid candidate
+		of the largest group agreeing on the objective value.
+	timeout : float, optional
+		Maximum duration of a candidate solution run, in seconds.
+	rtol : float
+		Relative tolerance under which two objective values agree.
+	"""
+
+	def __init__(self, problem_path, n=3, selection="majority", timeout=None, rtol=1e-6):
+		if selection not in SELECTION_MODES:
+			raise ValueError(f"Unknown selection mode {selection} ! Available modes are {SELECTION_MODES}.")
+		if n < 1:
+			raise ValueError(f"The number of candidates should be at least 1, got {n} !")
+		self.problem_path = problem_path
+		self.n = n
+		self.selection = selection
+		self.timeout = timeout
+		self.rtol = rtol
+		self._cancelled = threading.Event()
+		self._processes = {}
+		self._lock = threading.Lock()
+		self.results = []
+
+	def workspace(self, index):
+		return os.path.join(self.problem_path, CANDIDATES_DIR, f"candidate_{index}")
+
+	def _run_candidate(self, index, generate):
+		"""
+		Generate the code of a candidate with generate(index), then run it in its workspace.
+		"""
+		start = time.perf_counter()
+		result = {"index": index, "valid": False, "status": None, "objective": None, "error": None}
+		try:
+			# After an early selection, the LLM calls of the other candidates are no longer sent
+			with llm_utils.cancellable(self._cancelled):
+				code = generate(index)
+		except llm_utils.LLMCallCancelled:
+			result["error"] = "Cancelled"
+			result["time"] = time.perf_counter() - start
+			return result
+		except Exception as e:
+			result["error"] = f"Generation failed : {e}"
+			result["time"] = time.perf_counter() - start
+			return result
+		result["code"] = code
+		workspace = self.workspace(index)
+		with open(os.path.join(workspace, "solution.py"), "w", encoding="utf-8") as f:
+			f.write(code)
+		if self._cancelled.is_set():
+			result["error"] = "Cancelled"
+			result["time"] = time.perf_counter() - start
+			return result
+
+		process = subprocess.Popen(
+			[sys.executable, "solution.py"], cwd=workspace,
+			stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+		)
+		with self._lock:
+			self._processes[index] = process
+		try:
+			stdout, stderr = process.communicate(timeout=self.timeout)
+		except subprocess.TimeoutExpired:
+			process.kill()
+			stdout, stderr = process.communicate()
+			result["error"] = f"Timed out after {self.timeout}s"
+		result["process"] = subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+		result["time"] = time.perf_counter() - start
+
+		solution_path = os.path.join(workspace, diff_utils.SOLUTION_FILE)
+		if process.returncode == 0 and os.path.exists(solution_path):
+			with np.load(solution_path) as solution:
+				if "status" in solution.files:
+					result["status"] = int(solution["status"])
+				result["objective"] = float(solution["objective"])
+			result["valid"] = result["status"] in VALID_STATUSES
+		elif result["error"] is None:
+			result["error"] = stderr.strip().split("\n")[-1] if stderr.strip() else f"Exit code {process.returncode}"
+		return result
+
+	def run(self, generate):
+		"""
+		Generate and run the candidates concurrently.
+
+		Parameters
+		----------
+		generate : callable
+			Function returning the full solution code of the candidate whose index is given as argument.
+
+		Returns
+		-------
+		tuple
+			The result of the selected candidate (None if no candidate is valid) and the report of the run.
+		"""
+		for index in range(self.n):
+			prepare_workspace(self.problem_path, self.workspace(index))
+		start = time.perf_counter()
+		results = self.results
+		first_valid_time = None
+		executor = ThreadPoolExecutor(max_workers=self.n, thread_name_prefix="candidate")
+		futures = [executor.submit(self._run_candidate, index, generate) for index in range(self.n)]
+		for future in as_completed(futures):
+			result = future.result()
+			results.append(result)
+			if result["valid"] and first_valid_time is None:
+				first_valid_time = time.perf_counter() - start
+				if self.selection == "first":
+					self._cancel()
+					break
+		# Candidates still generating after an early selection are abandoned, and not reported : they stop before their
+		# next LLM call, so at most one call per candidate is still in flight
+		executor.shutdown(wait=self.selection != "first", cancel_futures=True)
+		selected = self._select(results)
+		report = {
+			"candidates": self.n,
+			"finished": len(results),
+			"selection": self.selection,
+			"valid": sum(r["valid"] for r in results),
+			"success_rate": sum(r["valid"] for r in results) / len(results),
+			"time_to_first_valid": first_valid_time,
+			"total_time": time.perf_counter() - start,
+			"selected": selected["index"] if selected is not None else None,
+			"results": [
+				{key: r.get(key) for key in ("index", "valid", "status", "objective", "time", "error")}
+				for r in sorted(results, key=lambda r: r["index"])
+			],
+		}
+		return selected, report
+
+	def _cancel(self):
+		self._cancelled.set()
+		with self._lock:
+			for process in self._processes.values():
+				if process.poll() is None:
+					process.kill()
+
+	def _select(self, results):
+		"""
+		Valid candidate kept : the first one to finish, within the largest group agreeing on the objective value.
+		"""
+		valid = [r for r in results if r["valid"]]
+		if not valid:
+			return None
+		groups = _objective_groups([(r["index"], r["objective"]) for r in valid], self.rtol)
+		# Largest group first, ties broken by the earliest finishing candidate (results are in order of completion)
+		best = max(groups, key=lambda group: len(group[1]))
+		return next(r for r in valid if r["index"] in best[1])
+
+def format_report(report):
+	"""
+	Render the report of a candidate run as text.
+	"""
+	lines = [
+		"=== Candidate models ===",
+		f"{report['valid']}/{report['finished']} valid candidates (success rate {report['success_rate']:.0%}), "
+		f"selection : {report['selection']}",
+	]
+	if report["time_to_first_valid"] is not None:
+		lines.append(f"Time to first valid candidate : {report['time_to_first_valid']:.1f}s (total {report['total_time']:.1f}s)")
+	for r in report["results"]:
+		state = f"objective {r['objective']:.6g}" if r["valid"] else (r["error"] or f"status {r['status']}")
+		mark = " <- selected" if r["index"] == report["selected"] else ""
+		lines.append(f"  candidate {r['index']} ({r['time']:.1f}s) : {state}{mark}")
+	return "\n".join(lines) + "\n"
+
+def generate_and_select(problem_path, n, code_prompt_path, code_context, print_prompt_path, print_context, code_base, api_doc,
+	selection="majority", timeout=None):
+	"""
+	Generate n candidate models of the problem (model, summary and printing code) from independent LLM samples, run them
+	concurrently and copy the selected one to the problem directory as solution.py, with its solution archive.
+
+	Returns
+	-------
+	tuple
+		The completed process of the selected candidate (of the first candidate if none is valid) and the report of the run.
+	"""
+	def generate(index):
+		code = llm_utils.implement_optimization(code_prompt_path, code_context, code_base, api_doc, sample=index)
+		code += code_utils.add_print_summary()
+		code += "\n\n" + llm_utils.print_solution(print_prompt_path, print_context, code, api_doc, sample=index)
+		return code
+
+	runner = CandidateRunner(problem_path, n=n, selection=selection, timeout=timeout)
+	selected, report = runner.run(generate)
+	with open(os.path.join(problem_path, "candidates.json"), "w", encoding="utf-8") as f:
+		json.dump(report, f, indent=1)
+
+	if selected is None:
+		# Keep the outcome of the first generated candidate to report its error
+		selected = min((r for r in runner.results if "process" in r), key=lambda r: r["index"], default=None)
+	if selected is None:
+		raise ValueError(f"None of the {n} candidate models could be generated and run.")
+
+	# Same layout as a single run : the selected solution runs from the problem directory
+	workspace = runner.workspace(selected["index"])
+	for fname in ("solution.py", "data.py", diff_utils.SOLUTION_FILE) + LIBRARY_FILES:
+		if os.path.exists(os.path.join(workspace, fname)):
+			shutil.copy(os.path.join(workspace, fname), os.path.join(problem_path, fname))
+	if os.path.exists("data.py"):
+		os.remove("data.py")
+	return selected["process"], report
@@ -0,0 +1,435 @@
+import asyncio
+import contextvars
+import email.utils
+import functools
+import json
+import os
+import random
+import threading
+import time
+import weakref
+import context_utils
+import rate_utils
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+API_BASE = os.environ.get("LLOCO_API_BASE", "https://cld.akkodis.com/api/openai")
+API_VERSION = "2024-12-01-preview"
+API_KEY_PATH = ".api_key.txt"
+
+# Status codes worth retrying : rate limiting and transient server errors
+RETRY_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+class LLMRequestError(RuntimeError):
+	"""
+	Raised when a chat completions request fails, after the retries if the error is transient.
+	"""
+
+	def __init__(self, message, status=None, body=None):
+		super().__init__(message)
+		self.status = status
+		self.body = body
+
+def _retry_after(headers):
+	"""
+	Delay in seconds requested by the server through the Retry-After (or retry-after-ms) header, or None.
+	"""
+	if headers.get("retry-after-ms"):
+		try:
+			return float(headers["retry-after-ms"]) / 1000
+		except ValueError:
+			pass
+	value = headers.get("retry-after")
+	if not value:
+		return None
+	try:
+		return max(0.0, float(value))
+	except ValueError:
+		date = email.utils.parsedate_to_datetime(value)
+		return max(0.0, date.timestamp() - time.time()) if date is not None else None
+
+def deployment_name(model):
+	return f"models-{model}"
+
+def load_api_key(path=API_KEY_PATH):
+	"""
+	Load the API key from the LLOCO_API_KEY environment variable or, if not set, from the key file in the working directory.
+	"""
+	if os.environ.get("LLOCO_API_KEY"):
+		return os.environ["LLOCO_API_KEY"]
+	with open(os.path.join(os.getcwd(), path), "r") as f:
+		return f.read().strip()
+
+class LLMClient(object):
+	"""
+	Long-lived HTTP client for the chat completions endpoint.
+
+	The credential is loaded once and requests go through a single session with a keep-alive
+	connection pool, so that consecutive calls reuse the same TCP/TLS connections.
+
+	Parameters
+	----------
+	base_url : str
+		Base URL of the endpoint. Requests are sent to {base_url}/deployments/models-{model}/chat/completions.
+	api_key : str, optional
+		API key. If None, loaded with load_api_key.
+	connect_timeout : float
+		Timeout in seconds to establish a connection.
+	read_timeout : float
+		Timeout in seconds to wait for the response (long completions can take minutes).
+	pool_size : int
+		Maximum number of connections kept alive, i.e the number of concurrent requests without connection setup.
+	http2 : bool
+		Use HTTP/2 (requires the optional httpx package with its http2 extra).
+	max_retries : int
+		Maximum number of retries of a request failing with a transient error (429, 5xx, connection error or timeout).
+	backoff_base : float
+		Base delay in seconds of the exponential backoff. Retry k waits a random delay in [0, backoff_base * 2**k], capped by backoff_max,
+		unless the server gives a Retry-After delay.
+	backoff_max : float
+		Maximum backoff delay in seconds.
+	limiter : rate_utils.TokenBucketLimiter, optional
+		Client-side limiter on requests and tokens per minute.
+	"""
+
+	def __init__(self, base_url=API_BASE, api_key=None, connect_timeout=10.0, read_timeout=600.0, pool_size=16, http2=False,
+			max_retries=5, backoff_base=1.0, backoff_max=60.0, limiter=None):
+		self.max_retries = max_retries
+		self.backoff_base = backoff_base
+		self.backoff_max = backoff_max
+		self.limiter = limiter if limiter is not None else rate_utils.TokenBucketLimiter()
+		self.stats = {"requests": 0, "retries": 0, "retry_wait": 0.0, "rate_limit_wait": 0.0}
+		self._stats_lock = threading.Lock()
+		self._local = threading.local()
+		self.base_url = base_url.rstrip("/")
+		self.api_key = api_key if api_key is not None else load_api_key()
+		self.connect_timeout = connect_timeout
+		self.read_timeout = read_timeout
+		self.http2 = http2
+		self.headers = {
+			"Content-Type": "application/json",
+			"Cache-Control": "no-cache",
+			"api-key": self.api_key
+		}
+		if http2:
+			try:
+				import httpx
+			except ImportError:
+				raise ImportError("HTTP/2 requires httpx : pip3 install 'httpx[http2]'")
+			self.session = httpx.Client(
+				http2=True,
+				headers=self.headers,
+				timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+				limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+			)
+		else:
+			self.session = requests.Session()
+			self.session.headers.update(self.headers)
+			adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+			self.session.mount("https://", adapter)
+			self.session.mount("http://", adapter)
+
+	def url(self, model):
+		return f"{self.base_url}/deployments/{deployment_name(model)}/chat/completions?api-version={API_VERSION}"
+
+	def _send(self, model, data, stream=False):
+		if self.http2:
+			request = self.session.build_request("POST", self.url(model), json=data)
+			return self.session.send(request, stream=stream)
+		return self.session.post(self.url(model), json=data, stream=stream, timeout=(self.connect_timeout, self.read_timeout))
+
+	def _request(self, model, data, stream=False):
+		"""
+		Send the request, with rate limiting and retries (see post). Return the HTTP response (status 200)
+		and, for non streamed requests, its decoded body.
+		"""
+		transient = (requests.ConnectionError, requests.Timeout)
+		if self.http2:
+			import httpx
+			transient = (httpx.TransportError,)
+
+		info = {"retries": 0, "retry_wait": 0.0, "rate_limit_wait": 0.0}
+		self._local.info = info
+		tokens = rate_utils.estimate_tokens(data)
+		attempt = 0
+		body = None
+		while True:
+			info["rate_limit_wait"] += self.limiter.acquire(tokens)
+			error = None
+			delay = None
+			try:
+				response = self._send(model, data, stream=stream)
+			except transient as e:
+				error = LLMRequestError(f"Request to {model} failed : {e}")
+			else:
+				if response.status_code == 200:
+					if stream:
+						break
+					try:
+						body = response.json()
+					except ValueError:
+						body = response.text
+					if isinstance(body, dict) and "choices" in body:
+						break
+					error = LLMRequestError(f"Malformed response from {model} : {str(body)[:500]}", status=200, body=body)
+				else:
+					if stream and self.http2:
+						response.read()
+					error = LLMRequestError(
+						f"Request to {model} failed with status {response.status_code} : {response.text[:500]}",
+						status=response.status_code, body=response.text
+					)
+					response.close()
+					if response.status_code not in RETRY_STATUS:
+						self._record(info)
+						raise error
+					delay = _retry_after(response.headers)
+
+			if attempt >= self.max_retries:
+				self._record(info)
+				raise error
+			if delay is None:
+				# Full jitter exponential backoff
+				delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+			time.sleep(delay)
+			attempt += 1
+			info["retries"] += 1
+			info["retry_wait"] += delay
+
+		self._record(info)
+		return response, body
+
+	def post(self, model, data):
+		"""
+		Send a chat completions request and return the decoded JSON response.
+
+		Transient errors are retried with exponential backoff and jitter, honouring the Retry-After header.
+		The retries and waiting times of the call are available through last_call_info.
+
+		Raises
+		------
+		LLMRequestError
+			If the request fails with a non transient error, or still fails after max_retries retries.
+		"""
+		return self._request(model, data)[1]
+
+	def stream(self, model, data, on_delta=None, stop=None):
+		"""
+		Send a streamed chat completions request (server-sent events) and consume the tokens as they arrive.
+
+		Parameters
+		----------
+		model : str
+			Model deployment name.
+		data : dict
+			Request body, as for post.
+		on_delta : callable, optional
+			Called with each new piece of content.
+		stop : callable, optional
+			Called with the content received so far whenever a backtick arrives. If it returns True, the stream is closed
+			and the remaining tokens (e.g. trailing prose after a code block) are abandoned.
+
+		Returns
+		-------
+		dict
+			Response in the same format as post. "stopped_early" is True when stop ended the stream. When the server sent no
+		usage (e.g. a stream stopped early), it is estimated from the prompt and the received content, with
+		"estimated" set to True.
+
+		Raises
+		------
+		LLMRequestError
+			If the request fails (see post) or the stream is interrupted.
+		"""
+		data = dict(data, stream=True, stream_options={"include_usage": True})
+		response, _ = self._request(model, data, stream=True)
+		interrupted = (requests.RequestException, OSError)
+		if self.http2:
+			import httpx
+			interrupted = (httpx.TransportError, OSError)
+		content = []
+		finish_reason = None
+		usage = None
+		stopped = False
+		try:
+			for line in response.iter_lines():
+				if isinstance(line, bytes):
+					line = line.decode("utf-8")
+				if not line.startswith("data:"):
+					continue
+				payload = line[len("data:"):].strip()
+				if payload == "[DONE]":
+					break
+				chunk = json.loads(payload)
+				if chunk.get("usage"):
+					usage = chunk["usage"]
+				for choice in chunk.get("choices", []):
+					delta = (choice.get("delta") or {}).get("content")
+					if choice.get("finish_reason"):
+						finish_reason = choice["finish_reason"]
+					if not delta:
+						continue
+					content.append(delta)
+					if on_delta is not None:
+						on_delta(delta)
+					# Only a backtick can close a code fence
+					if stop is not None and "`" in delta and stop("".join(content)):
+						stopped = True
+				if stopped:
+					finish_reason = "stop"
+					break
+		except interrupted as e:
+			raise LLMRequestError(f"Stream from {model} interrupted : {e}")
+		finally:
+			response.close()
+		if usage is None:
+			prompt_tokens = context_utils.estimate_tokens("".join(str(m.get("content", "")) for m in data.get("messages", [])))
+			completion_tokens = context_utils.estimate_tokens("".join(content))
+			usage = {
+				"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+				"total_tokens": prompt_tokens + completion_tokens, "estimated": True
+			}
+		return {
+			"choices": [{
+				"index": 0,
+				"message": {"role": "assistant", "content": "".join(content)},
+				"finish_reason": finish_reason
+			}],
+			"usage": usage,
+			"stopped_early": stopped
+		}
+
+	def _record(self, info):
+		with self._stats_lock:
+			self.stats["requests"] += 1
+			self.stats["retries"] += info["retries"]
+			self.stats["retry_wait"] += info["retry_wait"]
+			self.stats["rate_limit_wait"] += info["rate_limit_wait"]
+
+	def last_call_info(self):
+		"""
+		Retries and waiting times (in seconds) of the last call of the current thread.
+		"""
+		return dict(getattr(self._local, "info", {"retries": 0, "retry_wait": 0.0, "rate_limit_wait": 0.0}))
+
+	def summary(self):
+		"""
+		One line summary of the requests statistics.
+		"""
+		return (
+			f"LLM requests : {self.stats['requests']} requests, {self.stats['retries']} retries "
+			f"({self.stats['retry_wait']:.1f}s of backoff), {self.stats['rate_limit_wait']:.1f}s waiting for the rate limiter"
+		)
+
+	def close(self):
+		self.session.close()
+
+class AsyncLLMClient(object):
+	"""
+	Asyncio variant of the client. Blocking calls run in worker threads over the shared pooled client,
+	with at most max_concurrency of them in flight at any time.
+
+	Parameters
+	----------
+	max_concurrency : int
+		Maximum number of concurrent requests. Should not exceed the pool size of the shared client.
+	"""
+
+	def __init__(self, max_concurrency=16):
+		self.max_concurrency = max_concurrency
+		self._semaphore = asyncio.Semaphore(max_concurrency)
+		# Dedicated threads : the default executor can be smaller than the concurrency bound
+		self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+
+	async def call(self, func, *args, **kwargs):
+		"""
+		Run the blocking function func(*args, **kwargs) in a worker thread, once a concurrency slot is free. The function
+		runs in a copy of the current context, as with asyncio.to_thread.
+		"""
+		async with self._semaphore:
+			loop = asyncio.get_running_loop()
+			context = contextvars.copy_context()
+			return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+
+	async def post(self, model, data):
+		"""
+		Asynchronous version of LLMClient.post on the shared client.
+		"""
+		return await self.call(get_client().post, model, data)
+
+_client = None
+# One asyncio client per event loop : candidate pipelines run their own loops in concurrent threads
+_async_clients = weakref.WeakKeyDictionary()
+_client_config = {}
+_client_lock = threading.Lock()
+
+def configure_client(**kwargs):
+	"""
+	Set the parameters of the shared client (see LLMClient). The client is re-created on next use.
+	"""
+	global _client
+	with _client_lock:
+		_client_config.update(kwargs)
+		if _client is not None:
+			_client.close()
+			_client = None
+
+def get_async_client():
+	"""
+	Get the asyncio client of the running event loop, creating it on first use.
+	The concurrency bound is read from the LLOCO_MAX_CONCURRENCY environment variable (default 16).
+	"""
+	loop = asyncio.get_running_loop()
+	with _client_lock:
+		if loop not in _async_clients:
+			max_concurrency = int(os.environ.get("LLOCO_MAX_CONCURRENCY", 16))
+			_async_clients[loop] = AsyncLLMClient(max_concurrency)
+		return _async_clients[loop]
+
+def run_sync(coro):
+	"""
+	Run a coroutine to completion from synchronous code, as asyncio.run. When the calling thread already runs an event
+	loop (e.g. an asyncio caller or a notebook), the coroutine runs in its own loop in a separate thread, in a copy of the
+	current context.
+	"""
+	try:
+		asyncio.get_running_loop()
+	except RuntimeError:
+		return asyncio.run(coro)
+	context = contextvars.copy_context()
+	with ThreadPoolExecutor(max_workers=1, thread_name_prefix="run_sync") as executor:
+		return executor.submit(context.run, asyncio.run, coro).result()
+
+def client_summary():
+	"""
+	Summary of the requests sent by the shared client, or None if it was never used.
+	"""
+	with _client_lock:
+		return _client.summary() if _client is not None else None
+
+def get_client():
+	"""
+	Get the client shared by all the LLM calls of the process, creating it on first use.
+	"""
+	global _client
+	with _client_lock:
+		if _client is None:
+			config = {
+				"connect_timeout": float(os.environ.get("LLOCO_CONNECT_TIMEOUT", 10.0)),
+				"read_timeout": float(os.environ.get("LLOCO_READ_TIMEOUT", 600.0)),
+				"http2": os.environ.get("LLOCO_HTTP2", "0") == "1",
+				"max_retries": int(os.environ.get("LLOCO_MAX_RETRIES", 5)),
+			}
+			rpm = os.environ.get("LLOCO_RPM")
+			tpm = os.environ.get("LLOCO_TPM")
+			if rpm or tpm:
+				# Limits are shared with the other processes using the same state file
+				config["limiter"] = rate_utils.TokenBucketLimiter(
+					requests_per_minute=float(rpm) if rpm else None,
+					tokens_per_minute=float(tpm) if tpm else None,
+					state_path=os.environ.get("LLOCO_RATE_STATE", os.path.join(".lloco_cache", "rate_limit.json"))
+				)
+			config.update(_client_config)
+			_client = LLMClient(**config)
+		return _client
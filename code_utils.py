@@ -1,5 +1,40 @@
 import ast
+import json
 import os
+import utils
+
+# Structured answers of the code generation stages : the code of the step, the imports it needs, and remarks kept out
+# of the code
+response_format_code = {
+	"type": "json_schema",
+	"json_schema": {
+		"name": "code_step",
+		"schema": {
+			"type": "object",
+			"properties": {
+				"code": {"type": "string", "description": "Python code of this step only, without markdown fences nor the code already written."},
+				"imports": {
+					"type": "array",
+					"items": {"type": "string"},
+					"description": "Import statements needed by the code and not already in the code written so far."
+				},
+				"notes": {"type": "string", "description": "Short remarks on the modeling choices, empty if none."},
+			},
+			"required": ["code", "imports", "notes"],
+			"additionalProperties": False
+		},
+		"strict": True
+	}
+}
+
+STRUCTURED_CODE_INSTRUCTIONS = """
+
+Answer with a JSON object : the python code of this step in "code" (without markdown fences), the import statements \
+it needs in "imports", and your remarks in "notes" instead of comments outside the code.
+"""
+
+REPAIR_TEMPLATE = """Your previous answer could not be parsed : {error}.
+Answer again with the complete code of this step only, {expected}."""
 
 def get_function_code(target_file, function_names):
 	with open(target_file, "r") as file:
@@ -27,26 +62,33 @@ def load_csv(directory):
 	return source_code
 
 
-def define_imports():
+def define_imports(with_data=True):
 	source_code = """import sys
 import os
 from optimization_utils import (
 	define_linear_expr,
 	add_objective,
 	define_variables,
+	define_labeled_variables,
+	define_sparse_variables,
 	define_solver,
-	add_constraint
+	add_constraint,
+	add_grouped_constraints
 )
 from log_utils import (
 	print_objective_solution_value, 
 	interpret_status,
-	get_solution_values
+	get_solution_values,
+	save_solution
 )
 from data import DataLoader
 import pandas as pd
 import operator
 from ortools.linear_solver import pywraplp
 import numpy as np"""
+	if not with_data:
+		# Problems without input file have no DataLoader
+		source_code = source_code.replace("from data import DataLoader\n", "")
 	return source_code
 
 def add_print_summary():
@@ -55,10 +97,124 @@ status = solver.Solve()
 # == Print summary ==
 interpret_status(status)
 print_objective_solution_value(solver)
+save_solution(solver, "solution.npz", status=status)
 """
 	return source_code
 
+def complete_code_block(contents):
+	"""
+	Return the code of the first python code block of contents once its closing fence has arrived and the code
+	is syntactically valid, otherwise None. Used to stop streamed completions as soon as the code ends.
+	"""
+	parts = contents.split('```python', 1)
+	if len(parts) < 2:
+		return None
+	body = parts[1]
+	end = body.find("\n```")
+	while end != -1:
+		code = body[:end + 1]
+		try:
+			ast.parse(code)
+			return code
+		except SyntaxError:
+			# The fence is part of the code (e.g. inside a string)
+			end = body.find("\n```", end + 1)
+	return None
+
 def outer_code_parse(contents):
 	code = contents.split('```python')[1]
 	code = "'''".join(code.split('```')[:-1])
 	return code
+
+def _fenced_code(contents):
+	if "```python" not in contents:
+		raise ValueError("the answer has no ```python code block")
+	if "```" not in contents.split("```python", 1)[1]:
+		raise ValueError("the ```python code block is not closed")
+	code = outer_code_parse(contents)
+	if not code.strip():
+		raise ValueError("the ```python code block is empty")
+	return code
+
+def parse_code_response(contents):
+	"""
+	Code of an LLM answer : a structured answer (see response_format_code), preceded by its imports, or the first python
+	code block of a plain answer. Raise a ValueError if the answer has neither.
+	"""
+	try:
+		answer = json.loads(contents)
+	except json.JSONDecodeError:
+		answer = None
+	if isinstance(answer, dict):
+		if not isinstance(answer.get("code"), str) or not answer["code"].strip():
+			raise ValueError("the JSON answer has no code field")
+		code = answer["code"]
+		if "```python" in code:
+			code = _fenced_code(code)
+		imports = "\n".join(line.strip() for line in answer.get("imports") or [] if line.strip())
+		return "\n" + (imports + "\n\n" if imports else "") + code.strip("\n") + "\n"
+	return _fenced_code(contents)
+
+def assigned_names(code):
+	"""
+	Names bound at module level by code : assignments, imports, function and class definitions, including those nested
+	in if/try/with blocks. Loop targets are left out, they are rebound before every use. Returns an empty set if the code
+	does not parse.
+	"""
+	try:
+		tree = ast.parse(code)
+	except SyntaxError:
+		return set()
+	names = set()
+
+	def visit(statements):
+		for stmt in statements:
+			if isinstance(stmt, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+				targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+				for target in targets:
+					for node in ast.walk(target):
+						if isinstance(node, ast.Name):
+							names.add(node.id)
+			elif isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+				names.add(stmt.name)
+			elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+				for alias in stmt.names:
+					names.add((alias.asname or alias.name).split(".")[0])
+			elif isinstance(stmt, (ast.For, ast.AsyncFor, ast.While, ast.If, ast.With, ast.AsyncWith)):
+				visit(stmt.body)
+				visit(getattr(stmt, "orelse", []))
+			elif isinstance(stmt, ast.Try):
+				visit(stmt.body)
+				visit(stmt.orelse)
+				visit(stmt.finalbody)
+				for handler in stmt.handlers:
+					visit(handler.body)
+
+	visit(tree.body)
+	return names
+
+def merge_model_code(code_base, objective_code, constraints_code):
+	"""
+	Merge the objective and constraints code generated independently from the same code base, in this order.
+
+	Names bound by both snippets (and not by the code base) would silently overwrite each other : they are renamed in the
+	constraints code with a "_cons" suffix.
+
+	Returns
+	-------
+	tuple
+		The merged code and the mapping of the renamed names.
+	"""
+	base_names = assigned_names(code_base)
+	clashes = (assigned_names(objective_code) & assigned_names(constraints_code)) - base_names
+	taken = base_names | assigned_names(objective_code) | assigned_names(constraints_code)
+	mapping = {}
+	for name in sorted(clashes):
+		new_name = f"{name}_cons"
+		while new_name in taken:
+			new_name += "_"
+		taken.add(new_name)
+		mapping[name] = new_name
+	if mapping:
+		constraints_code = utils.rename_names(constraints_code, mapping)
+	return code_base + objective_code + constraints_code, mapping
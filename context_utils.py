@@ -0,0 +1,220 @@
+import ast
+import re
+
+# Rough number of characters per token, to estimate prompt sizes without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Token budget of the code and API documentation sent to each code generation stage
+STAGE_BUDGETS = {
+	"variables": 4000,
+	"objective": 4000,
+	"constraints": 5000,
+	"printing": 4000,
+}
+
+# Calls whose statements are always kept verbatim : they define the names and shapes used by the next stages
+KEPT_CALLS = ("define_variables", "define_labeled_variables", "define_sparse_variables", "define_solver", "DataLoader")
+
+# Number of called functions listed in the comment replacing collapsed statements
+MAX_LISTED_CALLS = 5
+
+def estimate_tokens(text):
+	return len(text) // CHARS_PER_TOKEN
+
+def split_api_doc(api_doc):
+	"""
+	Split the DataLoader API documentation (see main.build_api_doc) into its header and one (name, signature, block) per member.
+	"""
+	parts = re.split(r"(?m)^(?=def )", api_doc)
+	header = parts[0]
+	members = []
+	for block in parts[1:]:
+		signature = block.split("\n", 1)[0]
+		name = re.match(r"def (\w+)", signature).group(1)
+		members.append((name, signature, block))
+	return header, members
+
+def compact_api_doc(api_doc, code, signatures_only=False):
+	"""
+	Keep the full documentation of the API members referenced in code, and only the signature of the other members
+	(or only signatures for all members if signatures_only is set).
+	"""
+	header, members = split_api_doc(api_doc)
+	result = header
+	for name, signature, block in members:
+		referenced = re.search(rf"\.{name}\b", code) is not None
+		if referenced and not signatures_only:
+			result += block
+		else:
+			result += signature + "\n\n"
+	return result
+
+def _called_names(node):
+	names = []
+	for sub in ast.walk(node):
+		if isinstance(sub, ast.Call):
+			func = sub.func
+			if isinstance(func, ast.Name):
+				names.append(func.id)
+			elif isinstance(func, ast.Attribute):
+				names.append(func.attr)
+	return names
+
+def summarize_code(code):
+	"""
+	Summarize code for the next stages : imports, variable definitions and short assignments are kept, function bodies are
+	reduced to their signature and the other statements (loops, constraint and objective definitions, ...) are collapsed
+	into a comment listing the functions they call. Code that does not parse is returned unchanged.
+	"""
+	try:
+		tree = ast.parse(code)
+	except SyntaxError:
+		return code
+	lines = code.split("\n")
+	result = []
+	collapsed = []
+
+	def flush():
+		if collapsed:
+			calls = {}
+			for stmt in collapsed:
+				for name in _called_names(stmt):
+					calls[name] = calls.get(name, 0) + 1
+			# Most frequent calls first, a long tail would defeat the summary
+			top = sorted(calls.items(), key=lambda item: -item[1])[:MAX_LISTED_CALLS]
+			desc = ", ".join(f"{n} x{c}" if c > 1 else n for n, c in top)
+			if len(calls) > MAX_LISTED_CALLS:
+				desc += ", ..."
+			result.append(f"# ... {len(collapsed)} statement(s) omitted" + (f" (calls : {desc})" if desc else ""))
+			collapsed.clear()
+
+	for stmt in tree.body:
+		source = "\n".join(lines[stmt.lineno - 1:stmt.end_lineno])
+		if isinstance(stmt, (ast.Import, ast.ImportFrom)):
+			flush()
+			result.append(source)
+		elif isinstance(stmt, (ast.Assign, ast.AnnAssign)):
+			flush()
+			if any(name in KEPT_CALLS for name in _called_names(stmt)) or (stmt.lineno == stmt.end_lineno and len(source) <= 160):
+				result.append(source)
+			else:
+				targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+				result.append(" = ".join(ast.unparse(t) for t in targets) + " = ...  # long expression omitted")
+		elif isinstance(stmt, (ast.FunctionDef, ast.ClassDef)):
+			flush()
+			result.append(lines[stmt.lineno - 1] + "\n    ...")
+		else:
+			collapsed.append(stmt)
+	flush()
+	return "\n".join(result)
+
+def build_context(stage, code, api_doc, budget=None):
+	"""
+	Build the code and API documentation sent to a code generation stage, compacting them step by step until
+	they fit the token budget of the stage :
+		1. full code, full API documentation
+		2. full code, API documentation of the referenced members only (signatures for the others)
+		3. summarized code, same API documentation
+		4. summarized code, signatures only
+
+	Returns
+	-------
+	tuple of str
+		The code and the API documentation to send. The most compact version is returned if none fits the budget.
+	"""
+	if budget is None:
+		budget = STAGE_BUDGETS.get(stage, 4000)
+	summary = summarize_code(code)
+	candidates = [
+		(code, api_doc),
+		(code, compact_api_doc(api_doc, code)),
+		(summary, compact_api_doc(api_doc, code)),
+		(summary, compact_api_doc(api_doc, code, signatures_only=True)),
+	]
+	for candidate in candidates:
+		if estimate_tokens(candidate[0] + candidate[1]) <= budget:
+			return candidate
+	return candidates[-1]
+
+# Token size of the solution summary above which the report is written by map-reduce, and size of its chunks
+REPORT_SINGLE_CALL_TOKENS = 12000
+REPORT_CHUNK_TOKENS = 6000
+
+_SECTION_HEADER = re.compile(r"^(===.*===|#+ .*|Optimization Results:)\s*$")
+
+def _block_key(line):
+	# Lines of a variable block start with the same name, up to its indices (e.g. "Variable x_3_2 : value 1.0" -> "x")
+	match = re.match(r"\s*(?:[Vv]ariable\s+|[Cc]onstraint\s+)?([A-Za-z]+)", line)
+	return match.group(1) if match else ""
+
+def _pack(blocks, budget, header=(), lead=()):
+	# Pack consecutive blocks of lines into chunks of at most budget tokens once joined with newlines, each starting with
+	# the header lines and the first one with the lead lines, splitting the blocks that do not fit. A line larger than the
+	# budget gets a chunk of its own.
+	chunks, current = [], list(lead) + list(header)
+	start = len(current)
+
+	def fits(lines):
+		return estimate_tokens("\n".join(current + lines)) <= budget
+
+	for block in blocks:
+		if len(current) > start and not fits(block):
+			chunks.append(current)
+			current, start = list(header), len(header)
+		if fits(block):
+			current += block
+			continue
+		for line in block:
+			if len(current) > start and not fits([line]):
+				chunks.append(current)
+				current, start = list(header), len(header)
+			current.append(line)
+	if len(current) > start:
+		chunks.append(current)
+	return chunks
+
+def split_summary(summary, budget=REPORT_CHUNK_TOKENS):
+	"""
+	Split a solution summary (output of solution.py) into chunks of at most budget tokens, along its sections (lines
+	starting with === or #). Consecutive small sections share a chunk, also with the first or last part of a section
+	larger than the budget, which is split by blocks of lines of the same variable or constraint, each part starting
+	with the section header.
+	"""
+	sections = []
+	for line in summary.split("\n"):
+		if _SECTION_HEADER.match(line) or not sections:
+			sections.append([])
+		sections[-1].append(line)
+
+	# carry : the small sections (or last part of a split section) not yet in a chunk
+	chunks, carry = [], []
+	for section in sections:
+		text = "\n".join(section).strip()
+		if not text:
+			continue
+		if estimate_tokens(text) <= budget:
+			if carry and estimate_tokens("\n\n".join(carry + [text])) > budget:
+				chunks.append("\n\n".join(carry))
+				carry = []
+			carry.append(text)
+			continue
+		header, lines = ([section[0]], section[1:]) if _SECTION_HEADER.match(section[0]) else ([], section)
+		blocks = []
+		for line in lines:
+			if not line.strip():
+				continue
+			if blocks and _block_key(line) == _block_key(blocks[-1][-1]):
+				blocks[-1].append(line)
+			else:
+				blocks.append([line])
+		# The carried sections open the first part if they leave room for at least its first line
+		lead = ["\n\n".join(carry), ""] if carry else []
+		if lead and estimate_tokens("\n".join(lead + header + blocks[0][:1])) > budget:
+			chunks.append("\n\n".join(carry))
+			lead = []
+		parts = ["\n".join(chunk) for chunk in _pack(blocks, budget, header, lead)]
+		chunks += parts[:-1]
+		carry = parts[-1:]
+	if carry:
+		chunks.append("\n\n".join(carry))
+	return chunks
@@ -0,0 +1,224 @@
+import argparse
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+
+RUNS_DIR = "runs"
+SOLUTION_FILE = "solution.npz"
+
+def load_solution(path):
+	"""
+	Load a solution persisted by `log_utils.save_solution`.
+
+	Parameters
+	----------
+	path : str
+		Path to a solution archive, or to a run directory containing one.
+
+	Returns
+	-------
+	dict
+		Dictionary with keys "objective" (float or None), "status" (int or None), "blocks"
+		(mapping from variable block name to a numpy array of solution values) and "labels"
+		(mapping from labeled block name to the list of label arrays of each axis).
+	"""
+	if os.path.isdir(path):
+		path = os.path.join(path, SOLUTION_FILE)
+	solution = {"objective": None, "status": None, "blocks": {}, "labels": {}}
+	with np.load(path, allow_pickle=False) as archive:
+		for key in archive.files:
+			if key.startswith("var__"):
+				solution["blocks"][key[len("var__"):]] = archive[key]
+			elif key.startswith("dims__"):
+				name = key[len("dims__"):]
+				ndim = len(archive[key])
+				solution["labels"][name] = [archive[f"coords__{name}__{k}"] for k in range(ndim)]
+			elif key == "objective":
+				solution["objective"] = float(archive[key])
+			elif key == "status":
+				solution["status"] = int(archive[key])
+	return solution
+
+def _to_long(values, tol, labels=None):
+	"""
+	Flatten the non-zero entries of an array of solution values into a long DataFrame with one column per axis.
+	The columns hold positions, or labels when the labels of each axis are provided.
+	"""
+	idx = np.nonzero(np.abs(values) > tol)
+	if labels is None:
+		data = {f"i{k}": idx[k] for k in range(values.ndim)}
+	else:
+		data = {f"i{k}": labels[k][idx[k]] for k in range(values.ndim)}
+	data["value"] = values[idx]
+	return pd.DataFrame(data)
+
+def _diff_block(name, old, new, tol, old_labels=None, new_labels=None):
+	"""
+	Join the non-zero entries of two versions of a variable block on their indices and keep the entries that changed.
+	Labeled blocks are joined on their labels, so that rows and columns added or removed between runs are matched correctly.
+	"""
+	if old_labels is None or new_labels is None:
+		old_labels = new_labels = None
+	keys = [f"i{k}" for k in range(new.ndim)]
+	merged = pd.merge(
+		_to_long(old, tol, old_labels), _to_long(new, tol, new_labels),
+		on=keys, how="outer", suffixes=("_old", "_new")
+	)
+	merged = merged.rename(columns={"value_old": "old", "value_new": "new"})
+	merged[["old", "new"]] = merged[["old", "new"]].fillna(0.0)
+	merged["delta"] = merged["new"] - merged["old"]
+	changes = merged[np.abs(merged["delta"].to_numpy()) > tol].copy()
+
+	old_zero = np.abs(changes["old"].to_numpy()) <= tol
+	new_zero = np.abs(changes["new"].to_numpy()) <= tol
+	changes["kind"] = np.where(old_zero, "added", np.where(new_zero, "removed", "modified"))
+	changes.insert(0, "variable", name)
+	changes["index"] = list(zip(*(changes[k].to_numpy().tolist() for k in keys))) if keys else []
+	changes = changes.drop(columns=keys)
+
+	stats = {
+		"changed": len(changes),
+		"added": int(old_zero.sum()),
+		"removed": int(new_zero.sum()),
+		"modified": int((~old_zero & ~new_zero).sum()),
+		"abs_delta": float(np.abs(changes["delta"].to_numpy()).sum()),
+		"moved": [],
+	}
+	# A row (e.g. an employee) moved when it lost an entry and gained another one
+	if new.ndim >= 2 and len(changes) > 0:
+		rows = np.array([i[0] for i in changes["index"]], dtype=object)
+		kinds = changes["kind"].to_numpy()
+		moved = np.intersect1d(rows[kinds == "removed"], rows[kinds == "added"])
+		stats["moved"] = moved.tolist()
+	return changes, stats
+
+def diff_solutions(old, new, tol=1e-6):
+	"""
+	Compare two persisted solutions, matching decision variables by block name and index.
+
+	Parameters
+	----------
+	old : dict
+		Previous solution, as returned by `load_solution`.
+	new : dict
+		Current solution, as returned by `load_solution`.
+	tol : float, optional
+		Absolute tolerance under which values are considered equal (and under which values are considered zero).
+
+	Returns
+	-------
+	changes : pd.DataFrame
+		One row per changed entry with columns variable, index, old, new, delta and kind
+		("added", "removed" or "modified").
+	stats : dict
+		Aggregate statistics: objective values and delta, and per block counts of changes and moved rows.
+	"""
+	columns = ["variable", "index", "old", "new", "delta", "kind"]
+	frames = []
+	stats = {"objective": {}, "blocks": {}}
+
+	obj_old, obj_new = old["objective"], new["objective"]
+	stats["objective"] = {"old": obj_old, "new": obj_new, "delta": None, "relative": None}
+	if obj_old is not None and obj_new is not None:
+		stats["objective"]["delta"] = obj_new - obj_old
+		if obj_old != 0:
+			stats["objective"]["relative"] = (obj_new - obj_old) / abs(obj_old)
+
+	names = list(new["blocks"]) + [n for n in old["blocks"] if n not in new["blocks"]]
+	for name in names:
+		old_values = old["blocks"].get(name)
+		new_values = new["blocks"].get(name)
+		if old_values is None or new_values is None or old_values.ndim != new_values.ndim:
+			# The block appeared, vanished or changed dimension : nothing to match on
+			status = "new" if old_values is None else ("dropped" if new_values is None else "reshaped")
+			stats["blocks"][name] = {"status": status}
+			continue
+		changes, block_stats = _diff_block(
+			name, old_values, new_values, tol,
+			old_labels=old.get("labels", {}).get(name), new_labels=new.get("labels", {}).get(name)
+		)
+		block_stats["status"] = "matched"
+		stats["blocks"][name] = block_stats
+		frames.append(changes[columns])
+
+	changes = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+	return changes, stats
+
+def format_diff(changes, stats, max_rows=50):
+	"""
+	Render a solution diff as a compact text table followed by aggregate statistics, for logs and the report stage.
+	"""
+	lines = ["=== Solution diff ==="]
+	obj = stats["objective"]
+	if obj["delta"] is not None:
+		line = f"Objective value : {obj['old']} -> {obj['new']} (delta {obj['delta']:+g}"
+		if obj["relative"] is not None:
+			line += f", {100*obj['relative']:+.2f}%"
+		lines.append(line + ")")
+	for name, block in stats["blocks"].items():
+		if block["status"] != "matched":
+			lines.append(f"Variable block {name} : {block['status']}")
+			continue
+		line = (
+			f"Variable block {name} : {block['changed']} changed entries "
+			f"({block['added']} added, {block['removed']} removed, {block['modified']} modified), "
+			f"total absolute change {block['abs_delta']:g}"
+		)
+		if block["moved"]:
+			line += f", moved rows {block['moved']}"
+		lines.append(line)
+	lines.append("")
+	if len(changes) == 0:
+		lines.append("No change in decision variable values.")
+	else:
+		lines.append(changes.head(max_rows).to_string(index=False))
+		if len(changes) > max_rows:
+			lines.append(f"... {len(changes) - max_rows} more changed entries")
+	return "\n".join(lines) + "\n"
+
+def archive_run(problem_path):
+	"""
+	Move the solution written by the last execution of solution.py into a new per-run directory.
+
+	Returns the run directory, or None if no solution was written.
+	"""
+	solution_path = os.path.join(problem_path, SOLUTION_FILE)
+	if not os.path.exists(solution_path):
+		return None
+	run_dir = os.path.join(problem_path, RUNS_DIR, time.strftime("%Y%m%d-%H%M%S"))
+	k = 1
+	while os.path.exists(run_dir):
+		run_dir = os.path.join(problem_path, RUNS_DIR, time.strftime("%Y%m%d-%H%M%S") + f"-{k}")
+		k += 1
+	os.makedirs(run_dir)
+	shutil.move(solution_path, os.path.join(run_dir, SOLUTION_FILE))
+	return run_dir
+
+def previous_run(problem_path, run_dir):
+	"""
+	Get the run directory preceding run_dir for the provided problem, or None if run_dir is the first run.
+	"""
+	runs_path = os.path.join(problem_path, RUNS_DIR)
+	runs = sorted(
+		d for d in os.listdir(runs_path)
+		if os.path.exists(os.path.join(runs_path, d, SOLUTION_FILE))
+	)
+	name = os.path.basename(run_dir)
+	previous = [d for d in runs if d < name]
+	if not previous:
+		return None
+	return os.path.join(runs_path, previous[-1])
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description="Compare the solutions of two runs.")
+	parser.add_argument("old", type=str, help="Previous run directory or solution archive.")
+	parser.add_argument("new", type=str, help="Current run directory or solution archive.")
+	parser.add_argument("--tol", type=float, default=1e-6, help="Tolerance under which values are considered equal.")
+	parser.add_argument("--max-rows", type=int, default=50, help="Maximum number of changed entries to print.")
+	args = parser.parse_args()
+
+	changes, stats = diff_solutions(load_solution(args.old), load_solution(args.new), tol=args.tol)
+	print(format_diff(changes, stats, max_rows=args.max_rows))
@@ -1,5 +1,8 @@
+import asyncio
+import client_utils
 import os
 import llm_utils
+import prompt_utils
 import json
 
 response_format_csv = {
@@ -71,17 +74,26 @@ response_format_scope = {
     }
 }
 
+# Answers to the refinement questions that leave the problem unchanged
+NO_PREFERENCE_ANSWERS = {
+	"", "no preference", "none", "n a", "na", "skip", "idk", "i don t know", "don t know", "not sure", "no idea",
+	"whatever", "any", "doesn t matter", "does not matter", "default", "no opinion",
+}
+
+def answer_matters(answer):
+	"""
+	Whether an answer to a refinement question can change the problem formalization.
+	"""
+	normalized = " ".join("".join(c if c.isalnum() else " " for c in answer.lower()).split())
+	return normalized not in NO_PREFERENCE_ANSWERS
 
 def refine_problem_description(prompt_path, context):
-	with open(prompt_path, "r") as f:
-		prompt = f.read()
-	
 	messages = [
-		{"role": "system", "content": prompt}, 
+		{"role": "system", "content": prompt_utils.get_registry().prompt(prompt_path)}, 
 		{"role": "user", "content": context},
 	]
 	# Query the LLM
-	response = llm_utils.openai_ask_requests(messages, response_format=response_format_scope)
+	response = llm_utils.openai_ask_requests(messages, response_format=response_format_scope, stage="refinement")
 	return json.loads(response)
 
 def _get_basic_csv_summary(file_path):
@@ -105,25 +117,32 @@ def _get_basic_csv_summary(file_path):
 	return summary
 
 def get_csv_files_summary(directory):
-	files = os.listdir(directory)
-	response = "# INPUT FILES DESCRIPTION\n\n"
-	has_csv_file = False
-	for file in files:
-		if file.endswith(".csv"):
-			file_path = os.path.join(directory, file)
-			response += _get_basic_csv_summary(file_path)
-			has_csv_file = True
-	return response, has_csv_file
+	return client_utils.run_sync(get_csv_files_summary_async(directory))
+
+async def get_csv_files_summary_async(directory):
+	"""
+	Profile the CSV files of the directory concurrently.
+	"""
+	files = [file for file in os.listdir(directory) if file.endswith(".csv")]
+	summaries = await asyncio.gather(*(
+		asyncio.to_thread(_get_basic_csv_summary, os.path.join(directory, file)) for file in files
+	))
+	response = "# INPUT FILES DESCRIPTION\n\n" + "".join(summaries)
+	return response, len(files) > 0
 
 def convert_file_to_json(directory, complete_description):
 	"""
 	Convert a CSV file to JSON format.
 	"""
-	with open("prompts/system_prompt_json.txt", "r") as f:
-		p = f.read()
+	return client_utils.run_sync(convert_file_to_json_async(directory, complete_description))
+
+async def convert_file_to_json_async(directory, complete_description):
+	"""
+	Convert the CSV files to JSON format, with one concurrent LLM call per file.
+	"""
+	p = prompt_utils.get_registry().prompt(os.path.join(prompt_utils.PROMPT_DIR, "system_prompt_json.txt"))
 	files = os.listdir(directory)
-	response = "# INPUT FILES DESCRIPTION\n\n"
-	has_csv_file = False
+	queries = []
 	for file in files:
 		# TODO : add some other file types
 
@@ -137,8 +156,11 @@ def convert_file_to_json(directory, complete_description):
 				{"role": "user", "content": f"# File {file_path} : \n\n{csv_summary}"}
 			]
 			# Query the LLM
-			response += llm_utils.openai_ask_requests(messages, response_format=response_format_csv)
-			response += "\n\n"
-			has_csv_file = True
-	
-	return response, has_csv_file
\ No newline at end of file
+			queries.append(llm_utils.openai_ask_async(messages, response_format=response_format_csv, stage="csv_descriptor"))
+
+	# Responses are gathered in the order of the files
+	response = "# INPUT FILES DESCRIPTION\n\n"
+	for file_response in await asyncio.gather(*queries):
+		response += file_response
+		response += "\n\n"
+	return response, len(queries) > 0
@@ -1,57 +1,231 @@
+import asyncio
+import contextlib
+import contextvars
+import budget_utils
+import cache_utils
+import client_utils
 import code_utils
+import context_utils
 import os
-import requests
+import prompt_utils
+import replay_utils
+import retrieval_utils
+import routing_utils
+import telemetry_utils
+import time
 import utils
+from UI.utils import set_spinner_progress
 
-def openai_ask_requests(messages, model="gpt-5", response_format=None):
+# Stream the code generation completions, stopping as soon as the code block is complete
+_stream = os.environ.get("LLOCO_STREAM", "0") == "1"
 
-	url = f"https://cld.akkodis.com/api/openai/deployments/models-{model}/chat/completions?api-version=2024-12-01-preview"
-	headers = {
-		"Content-Type": "application/json",
-		"Cache-Control": "no-cache",
-		"api-key": open(os.path.join(os.getcwd(), ".api_key.txt"), 'r').read().strip()
-	}
+def set_streaming(active):
+	global _stream
+	_stream = active
+
+# Compact the code and API documentation sent to the code generation stages to fit their token budget
+_compact_context = os.environ.get("LLOCO_COMPACT_CONTEXT", "0") == "1"
+
+def set_context_compaction(active):
+	global _compact_context
+	_compact_context = active
+
+# Generate the objective and the constraints concurrently, both from the variables-only code base
+_parallel_stages = os.environ.get("LLOCO_PARALLEL_STAGES", "0") == "1"
+
+def set_parallel_stages(active):
+	global _parallel_stages
+	_parallel_stages = active
+
+# Number of similar solved formulations retrieved from the datasets for the variables and constraints stages (0 : none)
+_few_shot = int(os.environ.get("LLOCO_FEW_SHOT", "0"))
+
+# Original description of the problem being solved : its own formulation is never retrieved
+_few_shot_exclude = None
+
+def set_few_shot(k, exclude=None):
+	global _few_shot, _few_shot_exclude
+	_few_shot = k
+	_few_shot_exclude = exclude
+
+def _few_shot_examples(context):
+	if _few_shot <= 0:
+		return ""
+	return retrieval_utils.get_index().examples(context, k=_few_shot, exclude=_few_shot_exclude)
+
+# Ask the code generation stages for structured JSON answers (see code_utils.response_format_code) instead of code blocks
+_structured_code = os.environ.get("LLOCO_STRUCTURED_CODE", "0") == "1"
+
+def set_structured_code(active):
+	global _structured_code
+	_structured_code = active
+
+# Requests again of a code answer that can not be parsed, before giving up
+MAX_CODE_REPAIRS = 2
+
+# Event cancelling the LLM calls of the current context, e.g. of the candidates abandoned after an early selection
+_cancel_event = contextvars.ContextVar("cancel_event", default=None)
+
+class LLMCallCancelled(Exception):
+	pass
+
+@contextlib.contextmanager
+def cancellable(event):
+	"""
+	Raise LLMCallCancelled instead of sending the LLM calls made within the block (including those of the asyncio client)
+	once event is set. A call already sent is not interrupted.
+	"""
+	token = _cancel_event.set(event)
+	try:
+		yield
+	finally:
+		_cancel_event.reset(token)
+
+def _stage_context(stage, code, api_doc):
+	if not _compact_context:
+		return code, api_doc
+	return context_utils.build_context(stage, code, api_doc)
+
+def _code_block_closed(contents):
+	return code_utils.complete_code_block(contents) is not None
+
+def openai_ask_requests(messages, model=None, response_format=None, stream=False, stop=None, stage=None, sample=0):
+
+	cancel_event = _cancel_event.get()
+	if cancel_event is not None and cancel_event.is_set():
+		raise LLMCallCancelled(f"Cancelled {stage} call")
+
+	# The model and reasoning effort are picked from the routing table of the stage, the output budget from past completions
+	router = routing_utils.get_router()
+	route = router.route(stage)
+	if model is None:
+		model = route["model"]
+	budgets = budget_utils.get_budgets()
 
 	data = {
-		"max_tokens": 10000,
+		"max_tokens": budgets.max_tokens(stage),
 		"messages": messages
 	}
 
 	if response_format is not None:
 		data["response_format"] = response_format
-	response = requests.post(url, headers=headers, json=data).json()
+
+	if route.get("reasoning_effort"):
+		data["reasoning_effort"] = route["reasoning_effort"]
+
+	# Independent samples of the same request (e.g. candidate models) get their own seed
+	if sample:
+		data["seed"] = sample
+
+	key = cache_utils.request_key(model, messages, response_format, sample)
+	recorder = replay_utils.get_recorder()
+	start = time.perf_counter()
+	if recorder.mode == "replay":
+		# Offline run : serve the recorded exchange
+		response = recorder.load(key)
+		telemetry_utils.record_call(stage, model, response, time.perf_counter() - start, "replay")
+		return response['choices'][0]['message']['content']
+
+	# Identical requests are served from the on-disk cache
+	cache = cache_utils.get_cache()
+	response = cache.get(key)
+	cache_status = "hit" if response is not None else ("miss" if cache.mode in ("readwrite", "readonly") else cache.mode)
+	call_info = {}
+	answered_by = model
+	truncated_retries = 0
+	if response is None:
+		# Shared client : the key is loaded once and connections are kept alive between calls
+		client = client_utils.get_client()
+		def send(routed_model, cancelled):
+			if stream:
+				received = [0]
+				def on_delta(delta):
+					# The losing stream of a hedged call is abandoned
+					if cancelled.is_set():
+						raise LLMCallCancelled(f"Discarded {stage} call to {routed_model}")
+					received[0] += 1
+					set_spinner_progress(f"({received[0]} tokens received)")
+				response = client.stream(routed_model, data, on_delta=on_delta, stop=stop)
+			else:
+				response = client.post(routed_model, data)
+			return response, client.last_call_info()
+		def discarded(routed_model, result):
+			# The losing request of a hedged call completed anyway : its tokens were spent
+			telemetry_utils.record_call(stage, routed_model, result[0], time.perf_counter() - start, "discarded", **result[1])
+		# Falls back to the alternate model of the stage on failure or when the latency SLO is exceeded
+		answered_by, (response, call_info) = router.call(stage, send, model=model, on_discarded=discarded)
+		# A completion cut by its output budget is requested again with a larger one
+		while budget_utils.truncated(response) and data["max_tokens"] < budget_utils.MAX_TOKENS_LIMIT:
+			data = dict(data, max_tokens=budgets.escalate(data["max_tokens"]))
+			answered_by, (response, call_info) = router.call(stage, send, model=model, on_discarded=discarded)
+			truncated_retries += 1
+		# A completion still truncated at the largest budget is not cached, so that later runs request it again.
+		# Fallback answers are cached under the model that gave them and do not shape the budget of the primary model.
+		if not budget_utils.truncated(response):
+			if answered_by == model:
+				budgets.record(stage, (response.get("usage") or {}).get("completion_tokens"))
+			cache.put(key if answered_by == model else cache_utils.request_key(answered_by, messages, response_format, sample), response)
+	latency = time.perf_counter() - start
+	recorder.save(key, model, data, response, latency)
+	telemetry_utils.record_call(stage, answered_by, response, latency, cache_status, truncated_retries=truncated_retries, **call_info)
 	return response['choices'][0]['message']['content']
 
+async def openai_ask_async(messages, model=None, response_format=None, stage=None):
+	"""
+	Awaitable version of openai_ask_requests, bounded by the concurrency limit of the asyncio client.
+	"""
+	return await client_utils.get_async_client().call(openai_ask_requests, messages, model, response_format, stage=stage)
+
+def _ask_code(messages, stage, model=None, sample=0):
+	"""
+	Query the LLM for a python code block, or a structured answer in structured mode, and parse it. When streaming is on,
+	a code block completion is consumed incrementally and abandoned as soon as the code block is closed and syntactically
+	valid. sample indexes independent completions of the same request.
+	An answer that can not be parsed is sent back with the parsing error, and only this stage is requested again.
+	"""
+	if _structured_code:
+		messages = messages[:-1] + [dict(messages[-1], content=messages[-1]["content"] + code_utils.STRUCTURED_CODE_INSTRUCTIONS)]
+		response_format, stop = code_utils.response_format_code, None
+		expected = "as a JSON object with the code, imports and notes fields"
+	else:
+		response_format, stop = None, _code_block_closed
+		expected = "in a single ```python code block"
+	raw_response = openai_ask_requests(messages, model=model, response_format=response_format, stream=_stream, stop=stop, stage=stage, sample=sample)
+	for repair in range(MAX_CODE_REPAIRS + 1):
+		try:
+			return code_utils.parse_code_response(raw_response)
+		except ValueError as error:
+			if repair == MAX_CODE_REPAIRS:
+				raise ValueError(f"Unparsable {stage} answer after {MAX_CODE_REPAIRS} repair requests : {error} !")
+			messages = messages + [
+				{"role": "assistant", "content": raw_response},
+				{"role": "user", "content": code_utils.REPAIR_TEMPLATE.format(error=error, expected=expected)},
+			]
+			raw_response = openai_ask_requests(messages, model=model, response_format=response_format, stage=stage, sample=sample)
+
 def ask_baseline(prompt_path, hl_desc):
-	with open(prompt_path, "r") as f:
-		sys_prompt = f.read()
 	messages = [
-		{"role": "system", "content": sys_prompt}, 
+		{"role": "system", "content": prompt_utils.get_registry().prompt(prompt_path)}, 
 		{"role": "user", "content": hl_desc},
 	]
-	raw_response = openai_ask_requests(messages)
-	source_code = code_utils.outer_code_parse(raw_response)
+	source_code = _ask_code(messages, stage="baseline")
 	return source_code
 
 def summarize_problem_description(prompt_path, context):
-	with open(prompt_path, "r") as f:
-		prompt = f.read()
 	messages = [
-        {"role": "system", "content": prompt}, 
+        {"role": "system", "content": prompt_utils.get_registry().prompt(prompt_path)}, 
         {"role": "user", "content": context}
     ]
 	# Query the LLM
-	return openai_ask_requests(messages, model="o4-mini")
+	return openai_ask_requests(messages, stage="summary")
 
 def formalize_problem_description(prompt_path, hl_desc):
-	with open(prompt_path, "r") as f:
-		prompt = f.read()
 	messages = [
-        {"role": "system", "content": prompt}, 
+        {"role": "system", "content": prompt_utils.get_registry().prompt(prompt_path)}, 
         {"role": "user", "content": f"# High-level problem description:\n{hl_desc}"}
     ]
 	# Query the LLM
-	return openai_ask_requests(messages)
+	return openai_ask_requests(messages, stage="formalization")
 
 
 def _define_solver(prompt, ctx):
@@ -59,175 +233,103 @@ def _define_solver(prompt, ctx):
 	code = """solver = define_solver("SCIP")"""
 	return "\n\n" + code
 
-def print_solution(sys_prompt, context, code, api_doc):
-	func_code = code_utils.get_function_code("log_utils.py", ["get_solution_values"])
-	code_hint = f"""The user has already implemented the optimization model. The code so far is as follows:
-
-```python
-{code}.
-```
-
-You also have acces to an API documentation for the DataLoader class which loads and processes the input data. Use it when relevant:
-
-```python
-{api_doc}
-```
-
-Your task is only to implement the solution visualization. To do so, you **MUST** use the function provided below:
-
-```python
-{func_code}
-```
-""" 
-	messages = [
-		{"role": "system", "content": sys_prompt+code_hint}, 
-		{"role": "user", "content": context},
-	]
-	raw_response = openai_ask_requests(messages)
-	source_code = code_utils.outer_code_parse(raw_response)
+def print_solution(prompt_path, context, code, api_doc, sample=0):
+	code, api_doc = _stage_context("printing", code, api_doc)
+	messages = prompt_utils.get_registry().code_messages(prompt_path, "printing", context, code, api_doc)
+	source_code = _ask_code(messages, stage="printing", sample=sample)
 	return source_code
 
-def _define_variables(sys_prompt, context, code, api_doc):
-	func_code = code_utils.get_function_code("optimization_utils.py", ["define_variables"])
-	code_hint = f"""The user has already implemented part of the optimization model. The code so far is as follows:
-
-```python
-{code}.
-```
-
-You also have acces to an API documentation for the DataLoader class which loads and processes the input data. Use it when relevant:
-
-```python
-{api_doc}
-```
-
-Your task is only to implement the decision variable definitions. To do so, you **MUST** use the functions provided below:
-
-```python
-{func_code}
-```
-
-Choose the most appropriate parameters based on the nature of the problem (e.g., binary decisions, integer allocations, indexed variables, etc.).
-
-**Your task:**  
-- Only provide the Python code necessary to define the decision variables.  
-- Follow the conventions and structure used in the existing implementation.
-- Do **not** include objective functions, constraints, or any other parts of the solution in this step.
-""" 
-	messages = [
-		{"role": "system", "content": sys_prompt+code_hint}, 
-		{"role": "user", "content": context},
-	]
-	raw_response = openai_ask_requests(messages)
-	source_code = code_utils.outer_code_parse(raw_response)
+def _define_variables(prompt_path, context, code, api_doc, sample=0, examples=""):
+	code, api_doc = _stage_context("variables", code, api_doc)
+	messages = prompt_utils.get_registry().code_messages(prompt_path, "variables", context, code, api_doc, examples)
+	source_code = _ask_code(messages, stage="variables", sample=sample)
 	source_code = utils.add_type_comments(source_code)
 	return source_code
 
-def _define_objective(sys_prompt, context, code, api_doc):
-	func_code = code_utils.get_function_code("optimization_utils.py", ["define_linear_expr", "add_objective"])
-
-	code_hint = f"""The user has already implemented part of the optimization model. The code so far is as follows:
-
-```python
-{code}.
-```
-
-You also have acces to an API documentation for the DataLoader class which loads and processes the input data. Use it when relevant:
-
-```python
-{api_doc}
-```
-
-Your task is only to implement the objective function definitions. To do so, you **MUST** use the functions provided below:
-
-```python
-{func_code}
-```
-
-**Your task:**  
-- Only provide the Python code necessary to define the objective function.  
-- Follow the conventions and structure used in the existing implementation.
-- Do **not** include constraints, or any other parts of the solution in this step.
-""" 
-	messages = [
-		{"role": "system", "content": sys_prompt+code_hint}, 
-		{"role": "user", "content": context},
-	]
-	raw_response = openai_ask_requests(messages)
-	source_code = code_utils.outer_code_parse(raw_response)
+def _define_objective(prompt_path, context, code, api_doc, sample=0):
+	code, api_doc = _stage_context("objective", code, api_doc)
+	messages = prompt_utils.get_registry().code_messages(prompt_path, "objective", context, code, api_doc)
+	source_code = _ask_code(messages, stage="objective", sample=sample)
 	return source_code
 
-def _define_constraints(sys_prompt, context, code, api_doc):
-	func_code = code_utils.get_function_code("optimization_utils.py", ["define_linear_expr", "add_constraint"])
-
-	code_hint = f"""The user has already implemented part of the optimization model. The code so far is as follows:
-
-```python
-{code}.
-```
-
-You also have acces to an API documentation for the DataLoader class which loads and processes the input data. Use it when relevant:
-
-```python
-{api_doc}
-```
-
-Your task is only to implement the constraints definitions. To do so, you **MUST** use the functions provided below:
-
-```python
-{func_code}
-```
-
-**Your task:**  
-- Only provide the Python code necessary to define the constraints.  
-- Follow the conventions and structure used in the existing implementation.
-- Do **not** include any other parts of the solution in this step.
-"""
-	messages = [
-		{"role": "system", "content": sys_prompt+code_hint}, 
-		{"role": "user", "content": context},
-	]
-	raw_response = openai_ask_requests(messages)
-	source_code = code_utils.outer_code_parse(raw_response)
+def _define_constraints(prompt_path, context, code, api_doc, sample=0, examples=""):
+	code, api_doc = _stage_context("constraints", code, api_doc)
+	messages = prompt_utils.get_registry().code_messages(prompt_path, "constraints", context, code, api_doc, examples)
+	source_code = _ask_code(messages, stage="constraints", sample=sample)
 	return source_code
 
-def implement_optimization(prompt_path, context, code_base, api_doc):
-	with open(prompt_path, "r") as f:
-		sys_prompt = f.read()
-
+async def _define_objective_and_constraints_async(prompt_path, context, code, api_doc, sample=0, examples=""):
+	"""
+	Generate the objective and the constraints concurrently. Both only depend on the variable definitions.
+	"""
+	client = client_utils.get_async_client()
+	return await asyncio.gather(
+		client.call(_define_objective, prompt_path, context, code, api_doc, sample),
+		client.call(_define_constraints, prompt_path, context, code, api_doc, sample, examples)
+	)
+
+def implement_optimization(prompt_path, context, code_base, api_doc, sample=0):
 	# Add the solver to the context
 	code_base += _define_solver("", None)
 
+	# Formulations of similar solved problems guide the variables and constraints stages
+	examples = _few_shot_examples(context)
+
 	# Add variables to the context
-	code_base += _define_variables(sys_prompt, context, code_base, api_doc)
+	code_base += _define_variables(prompt_path, context, code_base, api_doc, sample, examples)
+
+	if _parallel_stages:
+		objective_code, constraints_code = client_utils.run_sync(
+			_define_objective_and_constraints_async(prompt_path, context, code_base, api_doc, sample, examples)
+		)
+		code_base, _ = code_utils.merge_model_code(code_base, objective_code, constraints_code)
+		return code_base
 	
 	# Add objective to the context
-	code_base += _define_objective(sys_prompt, context, code_base, api_doc)
+	code_base += _define_objective(prompt_path, context, code_base, api_doc, sample)
 
 	# Add constraints to the context
-	code_base += _define_constraints(sys_prompt, context, code_base, api_doc)
+	code_base += _define_constraints(prompt_path, context, code_base, api_doc, sample, examples)
 
 	return code_base
 	
 def data_processing(prompt_path, context):
-	with open(prompt_path, "r") as f:
-		sys_prompt = f.read()
 	messages = [
-		{"role": "system", "content": sys_prompt}, 
+		{"role": "system", "content": prompt_utils.get_registry().prompt(prompt_path)}, 
 		{"role": "user", "content": context},
 	]
 
-	raw_response = openai_ask_requests(messages)
-	source_code = code_utils.outer_code_parse(raw_response)
+	source_code = _ask_code(messages, stage="data_extraction")
 	return source_code
 
+async def _summarize_report_chunks(prompt_path, context, chunks):
+	"""
+	Notes of each chunk of a large solution summary, queried concurrently.
+	"""
+	system_prompt = prompt_utils.get_registry().prompt(prompt_path)
+	return await asyncio.gather(*(
+		openai_ask_async([
+			{"role": "system", "content": system_prompt},
+			{"role": "user", "content": context},
+			{"role": "user", "content": f"# RESULT SUMMARY, PART {i + 1} OF {len(chunks)}\n\n{chunk}"},
+		], stage="report_chunk")
+		for i, chunk in enumerate(chunks)
+	))
+
 def write_report(prompt_path, context, summary):
-	with open(prompt_path, "r") as f:
-		sys_prompt = f.read()
+	# Large summaries are split by section and variable block, and their notes are merged into the report (map-reduce)
+	if context_utils.estimate_tokens(summary) > context_utils.REPORT_SINGLE_CALL_TOKENS:
+		chunks = context_utils.split_summary(summary)
+		chunk_prompt_path = os.path.join(os.path.dirname(prompt_path), "system_prompt_report_chunk.txt")
+		notes = client_utils.run_sync(_summarize_report_chunks(chunk_prompt_path, context, chunks))
+		summary = "\n\n# RESULT SUMMARY (notes on each part of the full summary)\n\n" + "\n\n".join(
+			f"## Part {i + 1}\n\n{note}" for i, note in enumerate(notes)
+		)
+
 	messages = [
-		{"role": "system", "content": sys_prompt}, 
+		{"role": "system", "content": prompt_utils.get_registry().prompt(prompt_path)}, 
 		{"role": "user", "content": context+summary},
 	]
 	
-	raw_response = openai_ask_requests(messages)
+	raw_response = openai_ask_requests(messages, stage="report")
 	return raw_response
@@ -1,5 +1,5 @@
 from ortools.linear_solver import pywraplp
-import utils
+import optimization_utils
 import numpy as np
 
 def _extract_constraint_value(solver, constraint):
@@ -40,7 +40,7 @@ def print_solution_summary(solver):
 	"""
 	print("=== Solution summary ===")
 	for var in solver.variables():
-		name = var.name()
+		name = optimization_utils.variable_name(solver, var)
 		val = var.solution_value()
 		if val > 0.01:
 			print(f"Variable {name} : value {val}")
@@ -83,7 +83,7 @@ def print_constraints_summary(solver):
 
 	print("=== Constraints satisfaction summary ===")
 	for constraint in solver.constraints():
-		name = constraint.name()
+		name = optimization_utils.constraint_name(solver, constraint)
 		val = _extract_constraint_value(solver, constraint)
 		print(f"constraint {name} : {constraint.Lb()} <= {val} <= {constraint.Ub()}")
 	print()
@@ -121,7 +121,7 @@ def get_solution_values(vars, print_threshold=0.01):
 	"""
     Extracts numeric solution values from a NumPy array of OR-Tools decision variables.
 
-    The function iterates through all elements of a NumPy array containing OR-Tools variables,
+    The function iterates through all elements of a flattened NumPy array containing OR-Tools variables,
     calls `.solution_value()` on each, and returns a numeric array of the same shape.
     Only variable values greater than the given threshold are retained, which helps filter
     out near-zero numerical artifacts in solver outputs.
@@ -130,6 +130,8 @@ def get_solution_values(vars, print_threshold=0.01):
     ----------
     vars : np.ndarray
         NumPy array of OR-Tools variable objects (e.g., IntVar, NumVar), of arbitrary shape.
+        LabeledVariables are also accepted (see `LabeledVariables.solution` for a labeled result), as well as
+        SparseVariables, whose solution is scattered into an array of the full shape (zeros for invalid indices).
     print_threshold : float, optional
         Minimum value threshold for recording a variable’s solution. Variables with values
         less than or equal to this threshold are set to zero. Default is 0.01.
@@ -140,18 +142,44 @@ def get_solution_values(vars, print_threshold=0.01):
         NumPy array of floats with the same shape as `vars`, containing the numerical
         solution values extracted from the solver.
     """
-	solution = np.zeros_like(vars, dtype=float)
+	if isinstance(vars, optimization_utils.LabeledVariables):
+		vars = vars.values
+	if isinstance(vars, optimization_utils.SparseVariables):
+		return vars.to_dense(get_solution_values(vars.values, print_threshold))
+	flat = vars.reshape(-1)
+	solution = np.fromiter((v.solution_value() for v in flat), dtype=float, count=flat.size)
+	solution[solution <= print_threshold] = 0.0
+	return solution.reshape(vars.shape)
+
+def save_solution(solver, path="solution.npz", status=None):
+	"""
+	Persists the solution values of every decision variable block, along with the objective value, to a numpy archive.
 
-	# List of iterables
-	variables_indices = []
+	Blocks are the arrays returned by `define_variables`, stored under their suffix so that two runs can be matched
+	by variable name and index (see `diff_utils`). The axis names and labels of labeled blocks are stored as well.
 
-	# Add iterables 
-	for i in range(len(vars.shape)):
-		variables_indices.append(range(vars.shape[i])) 
+	Parameters
+	----------
+	solver : pywraplp.Solver
+		The solver instance that has solved the optimization problem.
+	path : str, optional
+		Path of the .npz archive to write. Default is "solution.npz".
+	status : int, optional
+		Solver status code returned by `solver.Solve()`.
 
-	# Recursive looping through indices
-	for idxs in utils.nested_loops(variables_indices):
-		val = vars[idxs].solution_value()
-		if val > print_threshold:
-			solution[idxs]=val
-	return solution
+	Returns
+	-------
+	None
+		The archive is written to disk.
+	"""
+	arrays = {}
+	for name, x in optimization_utils.get_variable_blocks(solver).items():
+		arrays["var__" + name] = get_solution_values(x, print_threshold=-np.inf)
+		if isinstance(x, optimization_utils.LabeledVariables):
+			arrays["dims__" + name] = np.array(x.dims, dtype=str)
+			for k, labels in enumerate(x.coords):
+				arrays[f"coords__{name}__{k}"] = np.array(labels.astype(str), dtype=str)
+	arrays["objective"] = np.array(solver.Objective().Value())
+	if status is not None:
+		arrays["status"] = np.array(status)
+	np.savez_compressed(path, **arrays)
@@ -1,11 +1,23 @@
 import argparse
 import os
 import llm_utils
+import candidate_utils
+import prompt_utils
 import code_utils
 import io_utils
+import diff_utils
+import budget_utils
+import cache_utils
+import client_utils
+import replay_utils
+import routing_utils
+import similarity_utils
+import telemetry_utils
 import subprocess
 from UI.utils import show_logo, SpinnerManager
 import sys
+import threading
+from concurrent.futures import Future
 
 PROBLEM_BASE_DIR = "problems"
 PROMPT_DIR = "prompts"
@@ -42,7 +54,8 @@ def run_solution(problem_path, code):
 	shutil.copy('optimization_utils.py', os.path.join(problem_path,"optimization_utils.py"))
 	shutil.copy('utils.py', os.path.join(problem_path,"utils.py"))
 	shutil.copy('log_utils.py', os.path.join(problem_path,"log_utils.py"))
-	shutil.move('data.py', os.path.join(problem_path,"data.py"))
+	if os.path.exists('data.py'):
+		shutil.move('data.py', os.path.join(problem_path,"data.py"))
 
 	# Run the solution
 	results = subprocess.run(
@@ -64,6 +77,37 @@ def run_baseline(problem_path, high_level_description):
 	print(results)
 	return
 
+def formalize_problem(problem_path, high_level_description, csv_files_summary, refinement, has_csv_file, cancel_event=None):
+	"""
+	Summarize the problem, then describe its CSV input files from the summary. Return None if cancel_event is set
+	before the CSV descriptor calls.
+	"""
+	sys_prompt_path = os.path.join(PROMPT_DIR, "system_prompt_problem_summary.txt")
+	complete_description = llm_utils.summarize_problem_description(
+		sys_prompt_path,
+		high_level_description+ "\n\n" + csv_files_summary + "\n\n" + refinement
+	)
+	if cancel_event is not None and cancel_event.is_set():
+		return None
+	input_files_description = ""
+	if has_csv_file:
+		input_files_description, has_csv_file = io_utils.convert_file_to_json(problem_path, complete_description)
+	return complete_description, input_files_description, has_csv_file
+
+def run_in_background(func, *args):
+	"""
+	Run func(*args) in a daemon thread, which does not delay the exit of the interpreter. Return its future.
+	"""
+	future = Future()
+	def run():
+		future.set_running_or_notify_cancel()
+		try:
+			future.set_result(func(*args))
+		except BaseException as e:
+			future.set_exception(e)
+	threading.Thread(target=run, daemon=True, name="speculation").start()
+	return future
+
 def get_high_level_description(problem_path):
 	# Read problem description from the file
 	if not os.path.exists(problem_path):
@@ -80,20 +124,44 @@ def main(args):
 	problem_dir = args.fname
 	problem_path = os.path.join(PROBLEM_BASE_DIR, problem_dir)
 
+	# Naming mode of the generated model, read by optimization_utils in the solution subprocess
+	os.environ["LLOCO_NAMING"] = args.naming
+
+	prompt_utils.configure_registry(PROMPT_DIR)
+	routing_utils.configure_router(args.routes)
+	cache_utils.configure_cache(mode=args.cache)
+	llm_utils.set_streaming(args.stream)
+	llm_utils.set_context_compaction(args.compact_context)
+	llm_utils.set_parallel_stages(args.parallel_stages)
+	llm_utils.set_structured_code(args.structured_code)
+	replay_utils.configure_recorder(
+		mode=args.replay,
+		fixtures_dir=os.path.join(problem_path, replay_utils.FIXTURES_DIR),
+		latency=args.replay_latency if args.replay_latency == "recorded" else float(args.replay_latency)
+	)
+
 	#--------------- UI ------------------
 	if args.verbosity > 0:
 		show_logo()
 
 	#--------------- READ THE PROBLEM ------------------
 	high_level_description = get_high_level_description(problem_path)
+	# Retrieved examples never include the formulation of the problem itself (e.g. a ComplexOR problem)
+	llm_utils.set_few_shot(args.few_shot, exclude=high_level_description)
 
 	if args.baseline:
 		run_baseline(problem_path, high_level_description)
 
 	#--------------- PROBLEM REFINEMENT ------------------
+	speculation = None
 	with SpinnerManager("Analyzing the user inputs ...", active=args.verbosity > 0):
 		csv_files_summary, has_csv_file = io_utils.get_csv_files_summary(problem_path)
 		if args.interactive:
+			# Speculative formalization of the unrefined problem, while the questions are asked and answered
+			speculation_cancelled = threading.Event()
+			speculation = run_in_background(
+				formalize_problem, problem_path, high_level_description, csv_files_summary, "", has_csv_file, speculation_cancelled
+			)
 			refinement_questions = io_utils.refine_problem_description(
 				os.path.join(PROMPT_DIR, "system_prompt_problem_framing.txt"),
 				high_level_description + "\n\n" + csv_files_summary
@@ -104,23 +172,63 @@ def main(args):
 		for q in refinement_questions["questions"]:
 			answer = input(f"🤖 {q['question']} : ")
 			refinement += f"Q: {q['question']}\nA: {answer}\n"
+			if speculation is not None and io_utils.answer_matters(answer):
+				# The unrefined formalization is stale : a call in flight finishes in the background and is discarded, the
+				# CSV descriptors are not requested
+				speculation_cancelled.set()
+				speculation = None
+		if speculation is not None:
+			# No answer changes the problem : the speculative formalization is kept
+			refinement = ""
 	else:
 		refinement = ""
 
+	#--------------- WARM START ------------------
+	# Reuse the stages of a past run of a near-duplicate problem whose inputs did not change
+	headers = similarity_utils.csv_signature(problem_path)
+	similarity_index = similarity_utils.SimilarityIndex(threshold=args.similarity_threshold)
+	warm = similarity_index.lookup(high_level_description, headers, refinement, csv_files_summary) if args.warm_start else None
+	if warm is not None and args.verbosity > 0:
+		print(warm.describe())
+
 	#--------------- PROBLEM FORMALIZATION ------------------
-	with SpinnerManager("Refining and formalizing the problem ...", active=args.verbosity > 0):
-		sys_prompt_path = os.path.join(PROMPT_DIR, "system_prompt_problem_summary.txt")
-		complete_description = llm_utils.summarize_problem_description(
-			sys_prompt_path,
-			high_level_description+ "\n\n" + csv_files_summary + "\n\n" + refinement
-		)
+	if warm is not None and warm.reuse_summary:
+		complete_description = warm.artifact("complete_description.txt")
+		speculation = None
+	elif speculation is not None:
+		with SpinnerManager("Refining and formalizing the problem ...", active=args.verbosity > 0):
+			complete_description, speculative_files_description, has_csv_file = speculation.result()
+	else:
+		with SpinnerManager("Refining and formalizing the problem ...", active=args.verbosity > 0):
+			sys_prompt_path = os.path.join(PROMPT_DIR, "system_prompt_problem_summary.txt")
+			complete_description = llm_utils.summarize_problem_description(
+				sys_prompt_path,
+				high_level_description+ "\n\n" + csv_files_summary + "\n\n" + refinement
+			)
 
 	#--------------- DATA EXTRACTION ------------------
 	# Process the input data
-	if has_csv_file:
+	if has_csv_file and warm is not None and warm.reuse_data:
+		# data.py reads the CSV files at runtime : the new data is loaded by the reused loader. The description of the
+		# input files gives row counts and excerpts, it is generated again when the data changed
+		if warm.reuse_input_description:
+			input_files_description = warm.artifact("input_files_description.txt") or ""
+		elif speculation is not None:
+			input_files_description = speculative_files_description
+		else:
+			with SpinnerManager("Describing the new input files ...", active=args.verbosity > 0):
+				input_files_description, has_csv_file = io_utils.convert_file_to_json(problem_path, complete_description)
+		code_data = warm.artifact("data.py")
+		with open("data.py", "w", encoding="utf-8") as f:
+			f.write(code_data)
+		api_doc = build_api_doc()
+	elif has_csv_file:
 		with SpinnerManager("Now I need to extract and prepare the data...", active=args.verbosity > 0):
 			sys_prompt_path = os.path.join(PROMPT_DIR, "system_prompt_dataloader.txt")
-			input_files_description, has_csv_file = io_utils.convert_file_to_json(problem_path, complete_description)
+			if speculation is not None:
+				input_files_description = speculative_files_description
+			else:
+				input_files_description, has_csv_file = io_utils.convert_file_to_json(problem_path, complete_description)
 			context = complete_description+ "\n\n" + csv_files_summary + "\n\n" + input_files_description
 
 			# Create data.py
@@ -132,30 +240,49 @@ def main(args):
 			api_doc = build_api_doc()
 	else:
 		code_data = ""
+		input_files_description = ""
+		api_doc = ""
 
 	#--------------- MODEL IMPLEMENTATION ------------------
 	# Build system prompt for formalization
 	# Initialize context with necessary basic imports
 	# TODO : make the system write imports
-	code_base = code_utils.define_imports()
-
-	with SpinnerManager("Ok time to code the model !", active=args.verbosity > 0):
-		sys_prompt_path = os.path.join(PROMPT_DIR, "system_prompt_code_.txt")
-		context = complete_description 
-		if has_csv_file:
-			context += "\n\n" + csv_files_summary
-			context += "\n\n" + input_files_description
-
-		code_optimization = llm_utils.implement_optimization(sys_prompt_path, context, code_base, api_doc)
-
-	#--------------- SOLUTION RENDERING ------------------
-	with SpinnerManager("Almost there ! Just missing the final touch now ...", active=args.verbosity > 0):
-		sys_prompt_path = os.path.join(PROMPT_DIR, "system_prompt_sol_print.txt")
-		code_summary = code_utils.add_print_summary()
-		solution_code = code_optimization + code_summary
-		code_print = llm_utils.print_solution(sys_prompt_path, complete_description+"\n\n" + csv_files_summary, solution_code, api_doc)
-		solution_code += "\n\n" + code_print
-	optim_summary = run_solution(problem_path, solution_code)
+	code_base = code_utils.define_imports(with_data=has_csv_file)
+	reused_model = warm.artifact("solution.py") if warm is not None and warm.reuse_model else None
+
+	if reused_model is not None:
+		optim_summary = run_solution(problem_path, reused_model)
+	else:
+		with SpinnerManager("Ok time to code the model !", active=args.verbosity > 0):
+			sys_prompt_path = os.path.join(PROMPT_DIR, "system_prompt_code_.txt")
+			context = complete_description 
+			if has_csv_file:
+				context += "\n\n" + csv_files_summary
+				context += "\n\n" + input_files_description
+
+			if args.candidates > 1:
+				# Independent candidate models run concurrently, the selected one is kept
+				optim_summary, candidates_report = candidate_utils.generate_and_select(
+					problem_path, args.candidates,
+					sys_prompt_path, context,
+					os.path.join(PROMPT_DIR, "system_prompt_sol_print.txt"), complete_description+"\n\n" + csv_files_summary,
+					code_base, api_doc, selection=args.candidate_selection
+				)
+			else:
+				code_optimization = llm_utils.implement_optimization(sys_prompt_path, context, code_base, api_doc)
+
+		if args.candidates > 1:
+			if args.verbosity > 0:
+				print(candidate_utils.format_report(candidates_report))
+		else:
+			#--------------- SOLUTION RENDERING ------------------
+			with SpinnerManager("Almost there ! Just missing the final touch now ...", active=args.verbosity > 0):
+				sys_prompt_path = os.path.join(PROMPT_DIR, "system_prompt_sol_print.txt")
+				code_summary = code_utils.add_print_summary()
+				solution_code = code_optimization + code_summary
+				code_print = llm_utils.print_solution(sys_prompt_path, complete_description+"\n\n" + csv_files_summary, solution_code, api_doc)
+				solution_code += "\n\n" + code_print
+			optim_summary = run_solution(problem_path, solution_code)
 	optim_summary_path = os.path.join(problem_path, "optim_summary.txt")
 	with open(optim_summary_path, "w", encoding="utf-8") as f:
 		f.write(optim_summary.stdout)
@@ -166,17 +293,74 @@ def main(args):
 	if args.verbosity > 0:
 		print(optim_summary)
 
+	# Index the problem and the artifacts of the run, to warm start its near-duplicates
+	if optim_summary.returncode == 0:
+		def read_artifact(fname):
+			path = os.path.join(problem_path, fname)
+			if not os.path.exists(path):
+				return None
+			with open(path, "r", encoding="utf-8") as f:
+				return f.read()
+		similarity_index.add(problem_dir, high_level_description, headers, {
+			"complete_description.txt": complete_description,
+			"input_files_description.txt": input_files_description if has_csv_file else None,
+			"data.py": read_artifact("data.py") if has_csv_file else None,
+			"solution.py": read_artifact("solution.py"),
+		}, csv_files_summary)
+
+	#--------------- SOLUTION DIFF ------------------
+	# Compare with the previous run of the same problem, if any
+	solution_diff = ""
+	solution_diff_path = os.path.join(problem_path, "solution_diff.txt")
+	run_dir = diff_utils.archive_run(problem_path)
+	previous_run_dir = diff_utils.previous_run(problem_path, run_dir) if run_dir is not None else None
+	if previous_run_dir is not None:
+		changes, stats = diff_utils.diff_solutions(
+			diff_utils.load_solution(previous_run_dir),
+			diff_utils.load_solution(run_dir)
+		)
+		solution_diff = diff_utils.format_diff(changes, stats)
+		with open(solution_diff_path, "w", encoding="utf-8") as f:
+			f.write(solution_diff)
+		if args.verbosity > 0:
+			print(solution_diff)
+	elif os.path.exists(solution_diff_path):
+		# Left by an earlier run, it does not describe this solution
+		os.remove(solution_diff_path)
+
 	# if not optim_summary.stderr=="":
 	# 	raise ValueError(optim_summary.stderr)
 
 	if args.verbosity > 1:
 		sys_prompt_path = os.path.join(PROMPT_DIR, "system_prompt_write_report.txt")
-		report = llm_utils.write_report(sys_prompt_path, complete_description, optim_summary.stdout)
+		summary = optim_summary.stdout
+		if solution_diff:
+			summary += "\n\n# CHANGES SINCE THE PREVIOUS RUN\n\n" + solution_diff
+		report = llm_utils.write_report(sys_prompt_path, complete_description, summary)
 		report_path = os.path.join(problem_path, "report.txt")
 		with open(report_path, "w", encoding="utf-8") as f:
 			f.write(report)
 		print("\n🤖 Lets see what we got : \n\n")
 		print(report)
+
+	# Output budgets of the next runs are learned from the completions of this one
+	budget_utils.get_budgets().save()
+
+	# Tokens and latency of the LLM calls, per pipeline stage
+	telemetry_table = telemetry_utils.write_report(
+		os.path.join(problem_path, "telemetry.json"),
+		os.path.join(problem_path, "telemetry.txt")
+	)
+	router = routing_utils.get_router()
+	router.write_report(os.path.join(problem_path, "routing.json"))
+	if args.verbosity > 0:
+		print(telemetry_table)
+		print(router.format_table())
+
+	if args.verbosity > 0 and args.replay != "replay":
+		print(cache_utils.get_cache().summary())
+		if client_utils.client_summary() is not None:
+			print(client_utils.client_summary())
 		
 	
 
@@ -195,6 +379,48 @@ if __name__ == "__main__":
 	parser.add_argument(
 		"-b", "--baseline", action="store_true", help="Run baseline."
 	)
+	parser.add_argument(
+		"--naming", type=str, default=os.environ.get("LLOCO_NAMING", "eager"), choices=["eager", "lazy"], help="Naming of variables and constraints in the solver : one name each (eager) or one name per block, derived on demand (lazy). Lazy naming creates the variables of large models about 30%% faster, with a small memory saving."
+	)
+	parser.add_argument(
+		"--cache", type=str, default=os.environ.get("LLOCO_CACHE", "readwrite"), choices=list(cache_utils.CACHE_MODES), help="LLM response cache mode : serve and store responses (readwrite), only serve them (readonly), only store them (refresh) or bypass the cache (disabled)."
+	)
+	parser.add_argument(
+		"--stream", action="store_true", default=os.environ.get("LLOCO_STREAM", "0") == "1", help="Stream the code generation completions and stop them as soon as the code block is complete."
+	)
+	parser.add_argument(
+		"--compact-context", action="store_true", default=os.environ.get("LLOCO_COMPACT_CONTEXT", "0") == "1", help="Compact the code and API documentation sent to the code generation stages to fit a token budget per stage."
+	)
+	parser.add_argument(
+		"--parallel-stages", action="store_true", default=os.environ.get("LLOCO_PARALLEL_STAGES", "0") == "1", help="Generate the objective and the constraints concurrently from the variable definitions, saving one LLM round-trip."
+	)
+	parser.add_argument(
+		"-n", "--candidates", type=int, default=1, help="Number of candidate models generated and run concurrently. The one reaching an optimal or feasible status is kept."
+	)
+	parser.add_argument(
+		"--candidate-selection", type=str, default="majority", choices=list(candidate_utils.SELECTION_MODES), help="Keep the first valid candidate (first), or the first of the largest group of valid candidates agreeing on the objective value (majority)."
+	)
+	parser.add_argument(
+		"--routes", type=str, default=os.environ.get("LLOCO_ROUTES"), help="JSON file of the model, fallback model and latency SLO (in seconds) of each pipeline stage, merged over the default routing table of routing_utils.py."
+	)
+	parser.add_argument(
+		"--structured-code", action="store_true", default=os.environ.get("LLOCO_STRUCTURED_CODE", "0") == "1", help="Ask the code generation stages for JSON answers (code, imports, notes) with a json_schema response format instead of markdown code blocks."
+	)
+	parser.add_argument(
+		"--few-shot", type=int, default=int(os.environ.get("LLOCO_FEW_SHOT", "0")), help="Number of similar solved formulations of the datasets (ComplexOR) added to the context of the variables and constraints stages, within a token budget."
+	)
+	parser.add_argument(
+		"--warm-start", action="store_true", help="Reuse the summary, data loader and model of a past run of a near-duplicate problem (similar description, same CSV headers) when their inputs did not change."
+	)
+	parser.add_argument(
+		"--similarity-threshold", type=float, default=0.9, help="Minimum estimated Jaccard similarity of the descriptions of near-duplicate problems."
+	)
+	parser.add_argument(
+		"--replay", type=str, default="off", choices=list(replay_utils.REPLAY_MODES), help="Save every LLM exchange to problem_name/fixtures (record), or run offline from the saved exchanges (replay)."
+	)
+	parser.add_argument(
+		"--replay-latency", type=str, default="0", help="Simulated latency of replayed LLM calls : a number of seconds, or 'recorded' to use the recorded latencies."
+	)
 	args = parser.parse_args()
 
 	main(args)
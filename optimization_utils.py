@@ -1,10 +1,94 @@
 import numpy as np
+import pandas as pd
 import utils
 from ortools.linear_solver import pywraplp
 import operator
+import os
+import weakref
 
 # TODO : perhaps better to define linear expression directly with solver.Sum
 
+# Decision variable blocks created by define_variables, grouped by solver.
+# Used to persist and compare solutions without relying on variable names.
+_variable_blocks = weakref.WeakKeyDictionary()
+
+def _register_block(solver, suffix, x):
+	"""
+		Record a block of decision variables for the provided solver under the name suffix. Duplicated names get a numbered postfix.
+	"""
+	blocks = _variable_blocks.setdefault(solver, {})
+	name = suffix if suffix else "x"
+	if name in blocks:
+		k = 1
+		while f"{name}_{k}" in blocks:
+			k += 1
+		name = f"{name}_{k}"
+	blocks[name] = x
+	return name
+
+# Naming mode of variables and constraints, read from LLOCO_NAMING (set by main.py --naming for the solution subprocess) :
+# "eager" gives every variable and constraint its own name, "lazy" stores a single name per block and derives the
+# individual names on demand (see variable_name and constraint_name). OR-Tools still gives unnamed variables an
+# auto_v_ name, so lazy naming mostly saves the formatting and passing of the names : about 30% of the variable
+# creation time, but only a few percent of memory (500k variables : 2.0 s -> 1.4 s, 316 MB -> 312 MB).
+NAMING_MODES = ("eager", "lazy")
+_naming_mode = os.environ.get("LLOCO_NAMING", "eager")
+
+# Blocks of lazily named variables and constraints, grouped by solver.
+# Each entry is (first solver index, number of items, base name, shape, flat positions or keys).
+_lazy_variable_names = weakref.WeakKeyDictionary()
+_lazy_constraint_names = weakref.WeakKeyDictionary()
+
+def _lazy_lookup(blocks, index):
+	"""
+		Find the lazily named block containing the solver index, and the position of the item inside the block.
+	"""
+	starts = [b[0] for b in blocks]
+	k = np.searchsorted(starts, index, side="right") - 1
+	if k < 0 or index >= blocks[k][0] + blocks[k][1]:
+		return None, None
+	return blocks[k], index - blocks[k][0]
+
+def variable_name(solver, var):
+	"""
+		Human-readable name of a decision variable, the same in both naming modes (e.g. "x_assign_(2, 1)").
+	"""
+	block, pos = _lazy_lookup(_lazy_variable_names.get(solver, []), var.index())
+	if block is None:
+		return var.name()
+	_, _, prefix, shape, flat = block
+	if flat is not None:
+		pos = flat[pos]
+	return prefix + f"_{tuple(int(i) for i in np.unravel_index(pos, shape))}"
+
+def constraint_name(solver, constraint):
+	"""
+		Human-readable name of a constraint. Unnamed constraints are called after their index (e.g. "c_12").
+	"""
+	block, pos = _lazy_lookup(_lazy_constraint_names.get(solver, []), constraint.index())
+	if block is not None:
+		return f"{block[2]}_{block[4][pos]}"
+	if constraint.name().startswith("auto_c_"):
+		return f"c_{constraint.index()}"
+	return constraint.name()
+
+def get_variable_blocks(solver):
+	"""
+		Get the decision variable blocks defined for the provided solver.
+
+		Parameters
+    	----------
+		solver : pywraplp.Solver
+			The solver instance which contains the decision variables.
+
+		Returns
+    	-------
+		blocks : dict
+			Mapping from block name (the suffix used in define_variables) to the numpy array of decision variables
+			(or LabeledVariables / SparseVariables for define_labeled_variables / define_sparse_variables), in creation order.
+	"""
+	return dict(_variable_blocks.get(solver, {}))
+
 def _get_value(value, neg=False):
 	"""
 		Check if the value is None. If it is, return np.inf, otherwise return the value as a float.
@@ -17,6 +101,14 @@ def _get_value(value, neg=False):
 	else:
 		return float(value)
 
+def _get_values(values, shape, neg=False):
+	"""
+		Vectorized version of _get_value : broadcast the values to the provided shape and replace None by -np.inf or np.inf.
+	"""
+	values = np.array(values, dtype=object)
+	values = np.where(np.equal(values, None), -np.inf if neg else np.inf, values).astype(float)
+	return np.broadcast_to(values, shape)
+
 def define_linear_expr(x, weights):
 	"""
         Define a linear expression used for constraints definition and/or objective function definition. It is a linear combination of the decision variables x and the weights. The decision variables x and weights are both numpy arrays that MUST have only one dimension.
@@ -27,6 +119,8 @@ def define_linear_expr(x, weights):
 				1-D Numpy array of decision variables. The dtype of the array is object to allow for or-tools variable objects.
 			weights : ndarray.
 				1-D Numpy array of weights, with the same shape as x. The dtype of the array is float.
+			If x is a LabeledVariables (see define_labeled_variables), weights can also be a pd.Series or pd.DataFrame aligned on the labels of x.
+			If x is a SparseVariables (see define_sparse_variables), weights can be given for the full index space (they are gathered on the valid indices).
 		Return : ndarray
 		-------
 			Numpy array of linear terms, i.e a linear combination of the decision variables x and the weights.
@@ -43,6 +137,9 @@ def define_linear_expr(x, weights):
 			# decision_variables and weights are both 1-D numpy arrays of the same shape
 			expr = define_linear_expr(decision_variables, weights)
     """
+	if isinstance(x, (LabeledVariables, SparseVariables)):
+		return x.linear_terms(weights)
+
 	# Remove potential extra axes of length one
 	if x.ndim != 1:
 		x = x.squeeze()
@@ -121,6 +218,33 @@ def add_objective(solver, expr, maximize=True):
 	else:
 		solver.Minimize(o_expr)
 	
+def _create_variables(solver, shape, subset, lbs, ubs, integer, suffix):
+	"""
+		Create the decision variables of the index space shape (restricted to subset, see utils.index_space) in C order.
+		Return them as a 1-D numpy array, followed by their flat positions and their indices.
+	"""
+	if suffix is not None:
+		suffix = "_"+ suffix
+	else:
+		suffix = ""
+
+	flat, indices = utils.index_space(shape, subset)
+	ubs = _get_values(ubs, shape).reshape(-1)[flat].tolist()
+	lbs = _get_values(lbs, shape, neg=True).reshape(-1)[flat].tolist()
+	x = np.empty(len(flat), dtype=object)
+	if _naming_mode == "lazy":
+		# Store the name once for the whole block
+		start = solver.NumVariables()
+		for k in range(len(flat)):
+			x[k] = solver.Var(ub=ubs[k], lb=lbs[k], integer=integer, name="")
+		_lazy_variable_names.setdefault(solver, []).append(
+			(start, len(flat), "x"+suffix, tuple(shape), None if subset is None else flat)
+		)
+		return x, flat, indices
+	for k, i in enumerate(zip(*(a.tolist() for a in indices))):
+		x[k] = solver.Var(ub=ubs[k], lb=lbs[k], integer=integer, name="x"+suffix+f"_{i}")
+	return x, flat, indices
+
 def define_variables(solver, shape, lbs, ubs, integer, suffix):
 	"""
 		Define the decision variables. If the integer boolean parameter is set to True,
@@ -157,14 +281,6 @@ def define_variables(solver, shape, lbs, ubs, integer, suffix):
 			If shape is empty.
 	"""
 
-	# Make sure the bounds are numpy arrays
-	# to allow for tuple indexing
-	if isinstance(lbs, list):
-		lbs = np.array(lbs)
-	
-	if isinstance(ubs, list):
-		ubs = np.array(ubs)
-
 	if isinstance(shape, int):
 		# If shape is an integer, convert it to a tuple
 		shape = (shape,)
@@ -172,36 +288,14 @@ def define_variables(solver, shape, lbs, ubs, integer, suffix):
 	if shape == ():
 		raise ValueError("shape cannot be empty ! Please provide a valid shape for the decision variables.")
 
-    # Pre-allocate Numpy array of variables object
+	# Pre-allocate Numpy array of variables object
 	x = np.empty(shape, dtype=object)
-
-	# List of iterables
-	variables_indices = []
-
-	# Add iterables 
-	for i in range(len(shape)):
-		variables_indices.append(range(shape[i])) 
-
-	if suffix is not None:
-		suffix = "_"+ suffix
-	else:
-		suffix = ""
-	
-	# Recursive looping through indices to assign Decision Variables
-	for i in utils.nested_loops(variables_indices):
-		if isinstance(ubs, (list, np.ndarray)):
-			ub = _get_value(ubs[i])
-		else:
-			ub = _get_value(ubs)
-		if isinstance(lbs, (list, np.ndarray)):
-			lb = _get_value(lbs[i], neg=True)
-		else:
-			lb = _get_value(lbs, neg=True)
-		x[i] = solver.Var(ub=ub, lb=lb, integer=integer, name="x"+suffix+f"_{i}")
+	x.reshape(-1)[:] = _create_variables(solver, shape, None, lbs, ubs, integer, suffix)[0]
+	_register_block(solver, suffix, x)
 	return x
 
 
-def add_constraint(solver, expr, c_val, c_operator, c_name, eps_relax=0.0):
+def add_constraint(solver, expr, c_val, c_operator, c_name=None, eps_relax=0.0):
 	# TODO : specify direction of the operator comparison
 	"""
         Add constraint to the provided solver in-place.
@@ -217,7 +311,7 @@ def add_constraint(solver, expr, c_val, c_operator, c_name, eps_relax=0.0):
 		c_operator : python operator
 			Constraint comparison operator. Can be either : operator.le, operator.ge or operator.eq. If set to operator.lt or operator.gt (i.e strit inequality), the eps_relax value needs to be set accordingly;
 		c_name : str
-			Name of the constraint. Used for debugging and logging purposes.
+			Name of the constraint. Used for debugging and logging purposes. If None, the constraint is left unnamed.
 		eps_relax : positive float
 			If set to a non-zero float value, will apply epsilon relaxation to a strict constraint inequality to approximate it and be compatible with the MILP solver. If not None, eps_relax must be positive. The sign is handled according the inequality direction in the code. For e.g, if a and b are two decision variables a < b <=> a-b < 0 which is (approximately) a-b <= -eps_relax. For integer values, eps_relax=1. For continuous values, eps_relax must be set according to the scale and units of the decision variables. For time in seconds, 0.0001 might be safe. For distances in kilometers, that same value might be too small.
 		
@@ -260,4 +354,439 @@ def add_constraint(solver, expr, c_val, c_operator, c_name, eps_relax=0.0):
 	
 	# Define the constraint (in)-equality 
 	constraint = c_operator(c_expr,c_val)
-	solver.Add(constraint, name=c_name)
\ No newline at end of file
+	solver.Add(constraint, name=c_name if c_name is not None else "")
+
+class LabeledVariables(object):
+	"""
+		Numpy array of decision variables whose axes carry a name and a pandas Index of labels (e.g. employee names, project names).
+		Created with define_labeled_variables.
+
+		Attributes
+		----------
+		values : ndarray
+			Numpy array of decision variables (dtype object), in the positional order of the labels.
+		dims : tuple of str
+			Name of each axis.
+		coords : tuple of pd.Index
+			Labels of each axis.
+	"""
+
+	def __init__(self, values, dims, coords):
+		self.values = values
+		self.dims = tuple(dims)
+		self.coords = tuple(pd.Index(c) for c in coords)
+
+	@property
+	def shape(self):
+		return self.values.shape
+
+	@property
+	def ndim(self):
+		return self.values.ndim
+
+	def __array__(self, dtype=None, copy=None):
+		return self.values
+
+	def __len__(self):
+		return len(self.values)
+
+	def _positions(self, dim, labels):
+		"""
+			Positions of the provided label(s) along axis dim. A scalar label returns an int, a list of labels an array of ints.
+		"""
+		axis = self.dims.index(dim)
+		index = self.coords[axis]
+		if np.ndim(labels) == 0:
+			return index.get_loc(labels)
+		positions = index.get_indexer(labels)
+		if (positions < 0).any():
+			missing = [l for l, p in zip(labels, positions) if p < 0]
+			raise KeyError(f"Labels {missing} not found along axis {dim}")
+		return positions
+
+	def sel(self, **labels):
+		"""
+			Select decision variables by label. A scalar label removes the axis, a list of labels keeps it.
+
+			Examples
+			--------
+				# All the assignment variables of employee "Alice"
+				x_alice = x.sel(employee="Alice")
+				# A single decision variable
+				x_alice_p1 = x.sel(employee="Alice", project="P1")
+		"""
+		for dim in labels:
+			if dim not in self.dims:
+				raise KeyError(f"Unknown axis {dim}, axes are {self.dims}")
+		key = []
+		dims = []
+		coords = []
+		for axis, dim in enumerate(self.dims):
+			if dim not in labels:
+				key.append(slice(None))
+				dims.append(dim)
+				coords.append(self.coords[axis])
+				continue
+			positions = self._positions(dim, labels[dim])
+			key.append(positions)
+			if np.ndim(positions) > 0:
+				dims.append(dim)
+				coords.append(self.coords[axis][positions])
+		# Use one integer array per axis separately to avoid numpy fancy indexing broadcasting
+		values = self.values
+		for axis in reversed(range(len(key))):
+			values = values[(slice(None),)*axis + (key[axis],)]
+		if not dims:
+			return values
+		return LabeledVariables(values, dims, coords)
+
+	def align(self, coeffs, fill_value=0.0):
+		"""
+			Align coefficients on the labels of the decision variables and broadcast them to their shape.
+
+			Parameters
+			----------
+			coeffs : float, ndarray, pd.Series or pd.DataFrame
+				Coefficients. A Series is aligned on the axis whose name matches its index name or, for an unnamed index, on the
+				only axis whose labels contain its index (name the index when several axes do, e.g. two range(n) axes).
+				A DataFrame is aligned on its index and columns the same way. A Series with a MultiIndex is aligned on its levels.
+				Scalars and numpy arrays are broadcast positionally.
+			fill_value : float
+				Value used for labels missing from coeffs.
+
+			Returns
+			-------
+			ndarray
+				Numpy array of floats with the same shape as the decision variables.
+		"""
+		if isinstance(coeffs, pd.DataFrame):
+			coeffs = coeffs.stack()
+		if not isinstance(coeffs, pd.Series):
+			return np.broadcast_to(np.asarray(coeffs, dtype=float), self.shape)
+
+		levels = coeffs.index.names if isinstance(coeffs.index, pd.MultiIndex) else [coeffs.index.name]
+		axes = []
+		for k, level in enumerate(levels):
+			if level in self.dims:
+				axes.append(self.dims.index(level))
+				continue
+			labels = coeffs.index.get_level_values(k)
+			candidates = [
+				a for a in range(self.ndim)
+				if a not in axes and labels.isin(self.coords[a]).all()
+			]
+			if not candidates:
+				raise ValueError(f"Could not align coefficient labels {list(labels[:5])} with any axis of {self.dims}")
+			if len(candidates) > 1:
+				raise ValueError(
+					f"Coefficient labels {list(labels[:5])} match several axes {[self.dims[a] for a in candidates]} ! "
+					f"Name the index level after one of the axes {self.dims}, e.g. with coeffs.rename_axis(...)."
+				)
+			axes.append(candidates[0])
+
+		# Reindex on the product of the matched axes labels, then broadcast along the other axes
+		target = [self.coords[a] for a in axes]
+		if len(target) == 1:
+			aligned = coeffs.reindex(target[0], fill_value=fill_value)
+		else:
+			aligned = coeffs.reindex(pd.MultiIndex.from_product(target), fill_value=fill_value)
+		aligned = aligned.to_numpy(dtype=float).reshape([len(t) for t in target])
+		order = np.argsort(axes)
+		aligned = aligned.transpose(order)
+		shape = [1] * self.ndim
+		for a in axes:
+			shape[a] = self.shape[a]
+		return np.broadcast_to(aligned.reshape(shape), self.shape)
+
+	def linear_terms(self, coeffs=1.0):
+		"""
+			1-D numpy array of linear terms, i.e the decision variables multiplied by the aligned coefficients (see align).
+		"""
+		return define_linear_expr(self.values.ravel(), self.align(coeffs).ravel())
+
+	def group_terms(self, dim, coeffs=1.0):
+		"""
+			Linear terms grouped by the labels of axis dim, e.g. to add one constraint per employee.
+
+			Returns
+			-------
+			dict
+				Mapping from each label of axis dim to the 1-D numpy array of linear terms of that label.
+		"""
+		axis = self.dims.index(dim)
+		terms = np.moveaxis(self.values * self.align(coeffs), axis, 0)
+		terms = terms.reshape(self.shape[axis], -1)
+		return {label: terms[k] for k, label in enumerate(self.coords[axis])}
+
+	def solution(self, print_threshold=0.01):
+		"""
+			Solution values indexed by labels. Values lower than or equal to print_threshold are set to zero.
+
+			Returns
+			-------
+			pd.DataFrame
+				For 2 axes, a DataFrame indexed by the labels of the first axis with the labels of the second axis as columns.
+				Otherwise, a DataFrame with a single "value" column, indexed by the labels (MultiIndex for more than 2 axes).
+		"""
+		flat = self.values.ravel()
+		values = np.fromiter((v.solution_value() for v in flat), dtype=float, count=flat.size)
+		values[values <= print_threshold] = 0.0
+		values = values.reshape(self.shape)
+		if self.ndim == 2:
+			return pd.DataFrame(values, index=self.coords[0].rename(self.dims[0]), columns=self.coords[1].rename(self.dims[1]))
+		if self.ndim == 1:
+			index = self.coords[0].rename(self.dims[0])
+		else:
+			index = pd.MultiIndex.from_product(self.coords, names=self.dims)
+		return pd.DataFrame({"value": values.ravel()}, index=index)
+
+
+def define_labeled_variables(solver, coords, lbs, ubs, integer, suffix):
+	"""
+		Define decision variables indexed by labels instead of positions. Each axis is named and carries the labels of a DataLoader column
+		(e.g. employee names, project names), so that coefficients stored in pandas Series/DataFrames can be used directly.
+
+		Parameters
+    	----------
+		solver : pywraplp.Solver
+			The solver instance which will contain the decision variables and solution.
+		coords : dict
+			Mapping from axis name to the labels of that axis (list, pd.Index or pd.Series). The order of the keys defines the order of the axes.
+		lbs : float, None, pd.Series or pd.DataFrame
+			Lower bounds for the decision variables, aligned on the labels. If set to None, no lower bounds (-inf).
+		ubs : float, None, pd.Series or pd.DataFrame
+			Upper bounds for the decision variables, aligned on the labels. If set to None, no upper bounds (+inf).
+		integer : bool
+			Boolean indicating whether the decision variables are integer or continuous.
+		suffix : str
+			Name suffix for the decision variables. If None, no suffix is added.
+
+		Returns
+    	-------
+		x : LabeledVariables
+			Labeled decision variables. Useful members:
+				- x.sel(employee="Alice") : label-based selection.
+				- x.linear_terms(cost_df) : 1-D array of linear terms, with coefficients aligned on the labels (can be passed to add_objective / add_constraint).
+				- x.group_terms("employee", coeffs) : dict mapping each employee to its 1-D array of linear terms.
+				- x.solution() : solution values as a DataFrame indexed by labels.
+				- x.values : underlying numpy array of decision variables.
+
+		Examples
+    	--------
+			x = define_labeled_variables(solver, coords={"employee": data.employees(), "project": data.projects()}, lbs=0, ubs=1, integer=True, suffix="assign")
+			# skills_df is indexed by employee with one column per project
+			add_objective(solver, define_linear_expr(x, skills_df), maximize=True)
+			for employee, terms in x.group_terms("employee").items():
+				add_constraint(solver, terms, c_val=1, c_operator=operator.le, c_name=f"one_project_{employee}")
+	"""
+	dims = list(coords.keys())
+	labels = [pd.Index(coords[d]) for d in dims]
+	shape = tuple(len(l) for l in labels)
+	template = LabeledVariables(np.empty(shape, dtype=object), dims, labels)
+
+	def _bounds(bounds):
+		if not isinstance(bounds, (pd.Series, pd.DataFrame)):
+			return bounds
+		aligned = template.align(bounds, fill_value=np.nan)
+		# Missing labels are left unbounded
+		return np.where(np.isnan(aligned), None, aligned)
+
+	x = define_variables(solver, shape, _bounds(lbs), _bounds(ubs), integer, suffix)
+	labeled = LabeledVariables(x, dims, labels)
+	blocks = _variable_blocks.get(solver, {})
+	for name, block in blocks.items():
+		if block is x:
+			blocks[name] = labeled
+	return labeled
+
+
+class SparseVariables(object):
+	"""
+		Decision variables defined only on a subset of the indices of an N-D index space (e.g. the (employee, project) pairs
+		where the employee has the required skills). Created with define_sparse_variables.
+
+		Attributes
+		----------
+		values : ndarray
+			1-D numpy array of decision variables (dtype object), one per valid index, in C order.
+		shape : tuple of ints
+			Shape of the full index space.
+		indices : tuple of ndarray
+			Index of each decision variable, as one 1-D numpy array of ints per axis.
+	"""
+
+	def __init__(self, values, shape, flat, indices):
+		self.values = values
+		self.shape = tuple(shape)
+		self.flat = flat
+		self.indices = tuple(indices)
+
+	@property
+	def ndim(self):
+		return len(self.shape)
+
+	def __array__(self, dtype=None, copy=None):
+		return self.values
+
+	def __len__(self):
+		return len(self.values)
+
+	def gather(self, weights, aligned=False):
+		"""
+			Weights of the valid indices, as a 1-D numpy array aligned with values. weights is defined on the full index space
+			(any shape broadcastable to shape, e.g. per-project weights of shape (n_projects,)), or, if aligned is True, given
+			as one weight per decision variable in the order of values.
+		"""
+		weights = np.asarray(weights, dtype=float)
+		if aligned:
+			if weights.shape != (len(self.values),):
+				raise ValueError(f"Aligned weights should have shape ({len(self.values)},), got {weights.shape} !")
+			return weights
+		return np.broadcast_to(weights, self.shape).reshape(-1)[self.flat]
+
+	def linear_terms(self, weights=1.0, aligned=False):
+		"""
+			1-D numpy array of linear terms, i.e the decision variables multiplied by the gathered weights (see gather).
+		"""
+		return define_linear_expr(self.values, self.gather(weights, aligned))
+
+	def select(self, axis, index):
+		"""
+			1-D numpy array of the decision variables whose index along axis is index.
+		"""
+		return self.values[self.indices[axis] == index]
+
+	def group_terms(self, axis, weights=1.0, aligned=False):
+		"""
+			Linear terms grouped by their index along axis, e.g. to add one constraint per employee.
+			Indices without any valid decision variable are not part of the result.
+
+			Returns
+			-------
+			dict
+				Mapping from each index along axis to the 1-D numpy array of linear terms sharing that index.
+		"""
+		terms = self.linear_terms(weights, aligned)
+		order = np.argsort(self.indices[axis], kind="stable")
+		keys, starts = np.unique(self.indices[axis][order], return_index=True)
+		groups = np.split(terms[order], starts[1:])
+		return dict(zip(keys.tolist(), groups))
+
+	def to_dense(self, values=None, fill_value=0.0):
+		"""
+			Scatter values aligned with the decision variables (by default the decision variables themselves) into a numpy array of the full shape.
+		"""
+		if values is None:
+			dense = np.full(self.shape, None, dtype=object)
+			values = self.values
+		else:
+			dense = np.full(self.shape, fill_value, dtype=float)
+		dense.reshape(-1)[self.flat] = values
+		return dense
+
+
+def define_sparse_variables(solver, shape, index, lbs, ubs, integer, suffix):
+	"""
+		Define decision variables only for the valid indices of an N-D index space, instead of the full Cartesian product. Use it when most
+		combinations are not allowed (e.g. an employee can only be assigned to a project matching their skills) : the model size then scales
+		with the number of valid combinations.
+
+		Parameters
+    	----------
+		solver : pywraplp.Solver
+			The solver instance which will contain the decision variables and solution.
+		shape : tuple of ints
+			The shape of the full index space.
+		index : array_like
+			Either a boolean numpy array of the given shape (True for valid indices), or a list of distinct index tuples.
+			Duplicated tuples raise a ValueError, since their variables would share the same index.
+		lbs : array_like
+			Lower bounds, either a scalar or an array of the full shape. If set to None, no lower bounds (-inf).
+		ubs : array_like
+			Upper bounds, either a scalar or an array of the full shape. If set to None, no upper bounds (+inf).
+		integer : bool
+			Boolean indicating whether the decision variables are integer or continuous.
+		suffix : str
+			Name suffix for the decision variables. If None, no suffix is added.
+
+		Returns
+    	-------
+		x : SparseVariables
+			Sparse decision variables. Useful members:
+				- x.values : 1-D numpy array of the decision variables.
+				- x.indices : tuple of 1-D numpy arrays, the index of each decision variable along each axis.
+				- x.linear_terms(weights) : 1-D array of linear terms, weights being defined on (or broadcast to) the full shape (can be passed to add_objective / add_constraint).
+				  x.linear_terms(w, aligned=True) takes one weight per decision variable instead, in the order of x.values.
+				- x.group_terms(axis, weights) : dict mapping each index along axis to its 1-D array of linear terms.
+				- x.select(axis, i) : 1-D numpy array of the decision variables with index i along axis.
+
+		Examples
+    	--------
+			# Only create the assignments where the employee skill level fits the project requirement
+			valid = skills[:, None] >= required[None, :]
+			x = define_sparse_variables(solver, shape=valid.shape, index=valid, lbs=0, ubs=1, integer=True, suffix="assign")
+			add_objective(solver, define_linear_expr(x, preference), maximize=True)
+			add_grouped_constraints(solver, x, weights=1, axis=0, c_val=1, c_operator=operator.le, c_name="one_project")
+	"""
+	if isinstance(shape, int):
+		shape = (shape,)
+
+	if shape == ():
+		raise ValueError("shape cannot be empty ! Please provide a valid shape for the decision variables.")
+
+	values, flat, indices = _create_variables(solver, shape, index, lbs, ubs, integer, suffix)
+	x = SparseVariables(values, shape, flat, indices)
+	_register_block(solver, suffix, x)
+	return x
+
+
+def add_grouped_constraints(solver, x, weights, axis, c_val, c_operator, c_name, eps_relax=0.0):
+	"""
+        Add one constraint per index along an axis of the decision variables, in-place. The left hand side of each constraint is the
+		weighted sum of the decision variables sharing that index (e.g. "each employee works on at most one project").
+
+		Parameters
+    	----------
+        solver : pywraplp.Solver
+			The solver instance which will contain the decision variables and solution.
+		x : ndarray, SparseVariables or LabeledVariables
+			Decision variables.
+		weights : array_like
+			Weights of the decision variables (scalar, array of the shape of x, or pd.Series/pd.DataFrame for LabeledVariables).
+		axis : int or str
+			Axis along which constraints are created. Name of the axis for LabeledVariables.
+		c_val : float or array_like
+			Right hand side. Either a scalar, or one value per index along axis (array indexed by position, or pd.Series/dict indexed by label).
+		c_operator : python operator
+			Constraint comparison operator (see add_constraint).
+		c_name : str
+			Base name of the constraints. The index along axis is appended.
+		eps_relax : positive float
+			Epsilon relaxation of strict inequalities (see add_constraint).
+
+		Returns
+    	-------
+		None. The constraints are added to the solver in-place. For SparseVariables, indices without any valid decision variable are skipped.
+
+		Examples
+    	--------
+			# Each employee (axis 0) is assigned to exactly one project
+			add_grouped_constraints(solver, x, weights=1, axis=0, c_val=1, c_operator=operator.eq, c_name="one_project")
+	"""
+	if isinstance(x, (SparseVariables, LabeledVariables)):
+		groups = x.group_terms(axis, weights)
+	else:
+		x = np.asarray(x)
+		terms = np.moveaxis(x * np.broadcast_to(weights, x.shape), axis, 0)
+		groups = dict(enumerate(terms.reshape(x.shape[axis], -1)))
+
+	lazy = _naming_mode == "lazy"
+	if lazy:
+		# Store the name once for the whole block
+		_lazy_constraint_names.setdefault(solver, []).append(
+			(solver.NumConstraints(), len(groups), c_name, None, list(groups.keys()))
+		)
+	for key, terms in groups.items():
+		val = c_val if np.ndim(c_val) == 0 and not isinstance(c_val, dict) else c_val[key]
+		name = None if lazy else f"{c_name}_{key}"
+		add_constraint(solver, terms, c_val=val, c_operator=c_operator, c_name=name, eps_relax=eps_relax)
@@ -0,0 +1,153 @@
+import code_utils
+import os
+import threading
+
+PROMPT_DIR = "prompts"
+
+# Functions of the modeling API shown to the code generation stages. Every stage of a group gets the same reference,
+# so that the system message is identical across stages and problems and forms a prefix the provider can cache
+CODE_REFERENCE = {
+	"model": ("optimization_utils.py", [
+		"define_variables", "define_labeled_variables", "define_sparse_variables",
+		"define_linear_expr", "add_objective", "add_constraint", "add_grouped_constraints"
+	]),
+	"printing": ("log_utils.py", ["get_solution_values"]),
+}
+
+REFERENCE_TEMPLATE = """
+
+# API REFERENCE
+
+The functions below are the only ones you may use to build the optimization model and render its solution:
+
+```python
+{func_code}
+```
+"""
+
+API_DOC_TEMPLATE = """
+
+You also have acces to an API documentation for the DataLoader class which loads and processes the input data. Use it when relevant:
+
+```python
+{api_doc}
+```
+"""
+
+CODE_TEMPLATE = """The user has already implemented {part}the optimization model. The code so far is as follows:
+
+```python
+{code}.
+```
+
+"""
+
+STAGE_TASKS = {
+	"variables": """Your task is only to implement the decision variable definitions. To do so, you **MUST** use `define_variables`, `define_labeled_variables` or `define_sparse_variables` from the API reference.
+
+Choose the most appropriate parameters based on the nature of the problem (e.g., binary decisions, integer allocations, indexed variables, etc.).
+When the decision variables are indexed by entities of the input data (e.g., employees, projects), prefer `define_labeled_variables` so that the DataLoader labels can be used directly instead of integer positions.
+When only some index combinations are allowed (e.g., compatibility conditions), use `define_sparse_variables` instead of fixing the invalid variables to 0.
+
+**Your task:**
+- Only provide the Python code necessary to define the decision variables.
+- Follow the conventions and structure used in the existing implementation.
+- Do **not** include objective functions, constraints, or any other parts of the solution in this step.
+""",
+	"objective": """Your task is only to implement the objective function definitions. To do so, you **MUST** use `define_linear_expr` and `add_objective` from the API reference.
+
+**Your task:**
+- Only provide the Python code necessary to define the objective function.
+- Follow the conventions and structure used in the existing implementation.
+- Do **not** include constraints, or any other parts of the solution in this step.
+""",
+	"constraints": """Your task is only to implement the constraints definitions. To do so, you **MUST** use `define_linear_expr`, `add_constraint` and `add_grouped_constraints` from the API reference.
+
+**Your task:**
+- Only provide the Python code necessary to define the constraints.
+- Follow the conventions and structure used in the existing implementation.
+- Do **not** include any other parts of the solution in this step.
+""",
+	"printing": """Your task is only to implement the solution visualization. To do so, you **MUST** use `get_solution_values` from the API reference.
+""",
+}
+
+class PromptRegistry(object):
+	"""
+	Prompts of the pipeline, read from disk and templated once per process.
+
+	The messages of the code generation stages are laid out from the most to the least shared content, since providers
+	only reuse a cached prompt prefix when its leading bytes are identical :
+		1. system : system prompt and API reference, identical across stages and problems
+		2. user : problem description and DataLoader documentation, identical across the stages of a problem
+		3. user : examples of similar solved problems if any, code so far and task of the stage
+
+	Parameters
+	----------
+	prompt_dir : str
+		Directory of the prompt files.
+	"""
+
+	def __init__(self, prompt_dir=PROMPT_DIR):
+		self.prompt_dir = prompt_dir
+		self._prompts = {}
+		self._system_messages = {}
+		self._lock = threading.Lock()
+
+	def load_all(self):
+		"""
+		Read every prompt file of the prompt directory.
+		"""
+		for fname in sorted(os.listdir(self.prompt_dir)):
+			if fname.endswith(".txt"):
+				self.prompt(os.path.join(self.prompt_dir, fname))
+
+	def prompt(self, prompt_path):
+		"""
+		Content of a prompt file, read on first use.
+		"""
+		with self._lock:
+			if prompt_path not in self._prompts:
+				with open(prompt_path, "r") as f:
+					self._prompts[prompt_path] = f.read()
+			return self._prompts[prompt_path]
+
+	def system_message(self, prompt_path, reference):
+		"""
+		System prompt followed by the code of the API functions of the reference group (see CODE_REFERENCE), built on first use.
+		"""
+		key = (prompt_path, reference)
+		if key not in self._system_messages:
+			target_file, function_names = CODE_REFERENCE[reference]
+			func_code = code_utils.get_function_code(target_file, function_names)
+			content = self.prompt(prompt_path) + REFERENCE_TEMPLATE.format(func_code=func_code)
+			with self._lock:
+				self._system_messages[key] = content
+		return self._system_messages[key]
+
+	def code_messages(self, prompt_path, stage, context, code, api_doc, examples=""):
+		"""
+		Messages of a code generation stage ("variables", "objective", "constraints" or "printing"), with optional
+		formulations of similar problems (see retrieval_utils).
+		"""
+		reference = "printing" if stage == "printing" else "model"
+		part = "" if stage == "printing" else "part of "
+		problem = context + (API_DOC_TEMPLATE.format(api_doc=api_doc) if api_doc else "")
+		return [
+			{"role": "system", "content": self.system_message(prompt_path, reference)},
+			{"role": "user", "content": problem},
+			{"role": "user", "content": examples + CODE_TEMPLATE.format(part=part, code=code) + STAGE_TASKS[stage]},
+		]
+
+_registry = PromptRegistry()
+
+def configure_registry(prompt_dir=PROMPT_DIR):
+	"""
+	Set the prompt registry shared by the LLM calls of the process and load all its prompts.
+	"""
+	global _registry
+	_registry = PromptRegistry(prompt_dir)
+	_registry.load_all()
+
+def get_registry():
+	return _registry
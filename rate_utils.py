@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+	import fcntl
+except ImportError:
+	# No file lock (e.g. Windows) : the buckets are only shared by the threads of the process
+	fcntl = None
+
+class TokenBucketLimiter(object):
+	"""
+	Client-side rate limiter with two token buckets : requests per minute and tokens per minute.
+
+	The buckets are shared by all the threads of the process and, when state_path is set, by all the processes
+	using the same state file (its access is serialized with a file lock), e.g. the workers of a batch run. Where file
+	locks are not available (no fcntl module), the state file is ignored and the buckets are local to the process.
+
+	Parameters
+	----------
+	requests_per_minute : float or None
+		Maximum number of requests per minute. None for no limit.
+	tokens_per_minute : float or None
+		Maximum number of tokens per minute. None for no limit.
+	state_path : str, optional
+		Path of the JSON file holding the buckets state, to share them across processes.
+	"""
+
+	def __init__(self, requests_per_minute=None, tokens_per_minute=None, state_path=None):
+		self.requests_per_minute = requests_per_minute
+		self.tokens_per_minute = tokens_per_minute
+		self.state_path = state_path
+		self._lock = threading.Lock()
+		self._state = None
+		if state_path is not None and os.path.dirname(state_path):
+			os.makedirs(os.path.dirname(state_path), exist_ok=True)
+
+	@contextmanager
+	def _locked_state(self):
+		"""
+		Yield the buckets state, locked for the threads of the process and for the other processes. Changes are saved on exit.
+		"""
+		with self._lock:
+			if self.state_path is None or fcntl is None:
+				if self._state is None:
+					self._state = self._full_state()
+				yield self._state
+				return
+			with open(self.state_path, "a+") as f:
+				fcntl.flock(f, fcntl.LOCK_EX)
+				try:
+					f.seek(0)
+					content = f.read()
+					state = json.loads(content) if content else self._full_state()
+					yield state
+					f.seek(0)
+					f.truncate()
+					json.dump(state, f)
+					f.flush()
+				finally:
+					fcntl.flock(f, fcntl.LOCK_UN)
+
+	def _full_state(self):
+		return {
+			"requests": self.requests_per_minute or 0.0,
+			"tokens": self.tokens_per_minute or 0.0,
+			"time": time.time()
+		}
+
+	def acquire(self, tokens=0):
+		"""
+		Block until one request of the given number of tokens is allowed, and consume it.
+
+		Returns
+		-------
+		float
+			Time spent waiting, in seconds.
+		"""
+		if self.requests_per_minute is None and self.tokens_per_minute is None:
+			return 0.0
+		waited = 0.0
+		while True:
+			with self._locked_state() as state:
+				now = time.time()
+				elapsed = max(0.0, now - state["time"])
+				state["time"] = now
+				delay = 0.0
+				if self.requests_per_minute is not None:
+					rate = self.requests_per_minute / 60
+					state["requests"] = min(self.requests_per_minute, state["requests"] + elapsed * rate)
+					delay = max(delay, (1 - state["requests"]) / rate)
+				if self.tokens_per_minute is not None:
+					rate = self.tokens_per_minute / 60
+					# A request larger than the bucket only waits for a full bucket
+					needed = min(tokens, self.tokens_per_minute)
+					state["tokens"] = min(self.tokens_per_minute, state["tokens"] + elapsed * rate)
+					delay = max(delay, (needed - state["tokens"]) / rate)
+				if delay <= 0:
+					if self.requests_per_minute is not None:
+						state["requests"] -= 1
+					if self.tokens_per_minute is not None:
+						state["tokens"] -= min(tokens, self.tokens_per_minute)
+					return waited
+			time.sleep(delay)
+			waited += delay
+
+def estimate_tokens(data):
+	"""
+	Rough number of tokens reserved by a chat request : about 4 characters per prompt token, plus the output budget.
+	"""
+	prompt = sum(len(str(m.get("content", ""))) for m in data.get("messages", []))
+	return prompt // 4 + data.get("max_tokens", 0)
@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+import time
+
+REPLAY_MODES = ("off", "record", "replay")
+FIXTURES_DIR = "fixtures"
+
+class Recorder(object):
+	"""
+	Record LLM exchanges to fixture files, or replay them without any network access.
+
+	Each exchange is stored as {fixtures_dir}/{request key}.json, holding the request, the response and the observed latency.
+	Keys are content addresses (see cache_utils.request_key), so a replayed run gets the response recorded for the exact same request.
+
+	Parameters
+	----------
+	mode : str
+		"off" does nothing, "record" saves every exchange and "replay" serves the saved exchanges.
+	fixtures_dir : str
+		Directory of the fixture files (usually {problem_path}/fixtures).
+	latency : float or str
+		Simulated latency in replay mode : a fixed number of seconds, or "recorded" to wait as long as the recorded exchange.
+	"""
+
+	def __init__(self, mode="off", fixtures_dir=FIXTURES_DIR, latency=0.0):
+		if mode not in REPLAY_MODES:
+			raise ValueError(f"Unknown replay mode {mode} ! Available modes are {REPLAY_MODES}.")
+		self.mode = mode
+		self.fixtures_dir = fixtures_dir
+		self.latency = latency
+		if mode == "record":
+			os.makedirs(fixtures_dir, exist_ok=True)
+
+	def _path(self, key):
+		return os.path.join(self.fixtures_dir, f"{key}.json")
+
+	def save(self, key, model, data, response, latency):
+		"""
+		Save an exchange to its fixture file (record mode only).
+		"""
+		if self.mode != "record":
+			return
+		fixture = {"model": model, "request": data, "response": response, "latency": latency}
+		tmp_path = self._path(key) + f".{threading.get_ident()}.tmp"
+		with open(tmp_path, "w", encoding="utf-8") as f:
+			json.dump(fixture, f, ensure_ascii=False, indent=1)
+		os.replace(tmp_path, self._path(key))
+
+	def load(self, key):
+		"""
+		Serve the recorded response of the request key, after the simulated latency.
+
+		Raises
+		------
+		KeyError
+			If the request was not recorded.
+		"""
+		path = self._path(key)
+		if not os.path.exists(path):
+			raise KeyError(f"No recorded response for request {key} in {self.fixtures_dir}. Record the run first with --replay record.")
+		with open(path, "r", encoding="utf-8") as f:
+			fixture = json.load(f)
+		delay = fixture.get("latency", 0.0) if self.latency == "recorded" else float(self.latency)
+		if delay > 0:
+			time.sleep(delay)
+		return fixture["response"]
+
+_recorder = Recorder()
+
+def configure_recorder(mode="off", fixtures_dir=FIXTURES_DIR, latency=0.0):
+	"""
+	Set the mode of the recorder shared by all the LLM calls of the process (see Recorder).
+	"""
+	global _recorder
+	_recorder = Recorder(mode=mode, fixtures_dir=fixtures_dir, latency=latency)
+
+def get_recorder():
+	return _recorder
@@ -0,0 +1,272 @@
+import argparse
+import context_utils
+import json
+import os
+import re
+import threading
+import numpy as np
+
+DATASET_DIR = "datasets"
+RETRIEVAL_DIR = os.path.join(".lloco_cache", "retrieval")
+
+# Token budget of the similar formulations added to the context of the variables and constraints stages
+EXAMPLES_BUDGET = 3000
+
+# Jaccard similarity of the word sets of two descriptions above which they describe the same problem
+DUPLICATE_JACCARD = 0.8
+
+# BM25 parameters : term frequency saturation and document length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOP_WORDS = frozenset(
+	"a an and are as at be by can each for from has have how in is it its of on or such that the their there these this "
+	"to which with will".split()
+)
+
+EXAMPLES_HEADER = """# SIMILAR SOLVED PROBLEMS
+
+The formulations below solve problems similar to the user's one. Use them as guidance for the modeling choices (sets, \
+variables, constraints), not as the formulation of the user's problem.
+
+"""
+
+def tokenize(text):
+	return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOP_WORDS and len(word) > 1]
+
+def _jaccard(a, b):
+	a, b = set(tokenize(a)), set(tokenize(b))
+	return len(a & b) / len(a | b) if a | b else 0.0
+
+def _problem_key(name):
+	# ComplexOR/diet_problem and ComplexOR_raw/seeds_model/DietProblem_parsed.json are the same problem
+	key = re.sub(r"[^a-z0-9]", "", name.lower())
+	for suffix in ("parsed", "problem"):
+		key = key[:-len(suffix)] if key.endswith(suffix) else key
+	return key
+
+def _format_seed_model(model):
+	lines = []
+	if model.get("set"):
+		lines += ["Sets:"] + [f"{s['name']}: {s['description']}" for s in model["set"]]
+	if model.get("parameter"):
+		lines += ["", "Parameters:"] + [f"{p['name']}: {p['description']} {p.get('domain', '')}".rstrip() for p in model["parameter"]]
+	if model.get("variable"):
+		lines += ["", "Decision variables:"] + [
+			f"{v['name']} ({v.get('type', 'continuous')}): {v['description']} {v.get('domain', '')}".rstrip() for v in model["variable"]
+		]
+	for objective in model.get("objective", []):
+		lines += ["", "Objective:", objective["description"], f"{objective['sense']}: {objective['function']}"]
+	if model.get("constraint"):
+		lines += ["", "Constraints:"]
+		for i, constraint in enumerate(model["constraint"]):
+			lines += [f"{i + 1}. {constraint['description']} {constraint.get('domain', '')}".rstrip(), constraint["function"]]
+	return "\n".join(lines)
+
+def load_corpus(dataset_dir=DATASET_DIR):
+	"""
+	Solved formulations of the datasets : the ground truth models of ComplexOR (gt_model.txt) and the parsed models of
+	ComplexOR_raw/seeds_model not already in ComplexOR. LPWP only ships descriptions and code stubs, without formulation.
+
+	Returns
+	-------
+	list
+		One dict per problem, with its source, title, description and formulation.
+	"""
+	corpus = []
+	keys = set()
+	complexor_dir = os.path.join(dataset_dir, "ComplexOR")
+	if os.path.isdir(complexor_dir):
+		for name in sorted(os.listdir(complexor_dir)):
+			model_path = os.path.join(complexor_dir, name, "gt_model.txt")
+			description_path = os.path.join(complexor_dir, name, "description.txt")
+			if not (os.path.exists(model_path) and os.path.exists(description_path)):
+				continue
+			with open(description_path, "r", encoding="utf-8") as f:
+				description = f.read().strip()
+			with open(model_path, "r", encoding="utf-8") as f:
+				formulation = f.read().strip()
+			corpus.append({"source": f"ComplexOR/{name}", "title": name.replace("_", " "), "description": description, "formulation": formulation})
+			keys.add(_problem_key(name))
+
+	seeds_dir = os.path.join(dataset_dir, "ComplexOR_raw", "seeds_model")
+	if os.path.isdir(seeds_dir):
+		for fname in sorted(os.listdir(seeds_dir)):
+			if not fname.endswith(".json") or _problem_key(fname[:-len(".json")]) in keys:
+				continue
+			with open(os.path.join(seeds_dir, fname), "r", encoding="utf-8") as f:
+				seed = json.load(f)
+			if not isinstance(seed.get("model"), dict):
+				continue
+			corpus.append({
+				"source": f"ComplexOR_raw/seeds_model/{fname}", "title": seed.get("title", fname[:-len(".json")]),
+				"description": seed["description"].strip(), "formulation": _format_seed_model(seed["model"])
+			})
+			keys.add(_problem_key(fname[:-len(".json")]))
+	return corpus
+
+class RetrievalIndex(object):
+	"""
+	BM25 index of the descriptions of solved problems, to add the formulations of similar problems to the code
+	generation context.
+
+	The index is stored as compact arrays : the vocabulary, the inverse document frequency of each term, and the
+	postings of each term (documents and term frequencies, contiguous per term), so that scoring a query only reads
+	the postings of its terms.
+
+	Parameters
+	----------
+	docs : list
+		Indexed problems (see load_corpus).
+	vocabulary : dict
+		Position of each term.
+	idf : np.ndarray
+		Inverse document frequency of each term.
+	indptr, doc_ids, tf : np.ndarray
+		Postings of term i : doc_ids[indptr[i]:indptr[i + 1]] with frequencies tf[indptr[i]:indptr[i + 1]].
+	doc_len : np.ndarray
+		Number of terms of each document.
+	"""
+
+	def __init__(self, docs, vocabulary, idf, indptr, doc_ids, tf, doc_len):
+		self.docs = docs
+		self.vocabulary = vocabulary
+		self.idf = idf
+		self.indptr = indptr
+		self.doc_ids = doc_ids
+		self.tf = tf
+		self.doc_len = doc_len
+		avg_len = max(1.0, float(doc_len.mean())) if len(doc_len) else 1.0
+		self._norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avg_len)
+
+	@classmethod
+	def build(cls, docs):
+		postings = {}
+		doc_len = np.zeros(len(docs), dtype=np.int32)
+		for doc_id, doc in enumerate(docs):
+			terms = tokenize(doc["title"] + " " + doc["description"])
+			doc_len[doc_id] = len(terms)
+			counts = {}
+			for term in terms:
+				counts[term] = counts.get(term, 0) + 1
+			for term, count in counts.items():
+				postings.setdefault(term, []).append((doc_id, count))
+		terms = sorted(postings)
+		indptr = np.zeros(len(terms) + 1, dtype=np.int32)
+		indptr[1:] = np.cumsum([len(postings[term]) for term in terms])
+		doc_ids = np.array([doc_id for term in terms for doc_id, _ in postings[term]], dtype=np.int32)
+		tf = np.array([count for term in terms for _, count in postings[term]], dtype=np.uint16)
+		df = np.diff(indptr).astype(np.float32)
+		idf = np.log(1 + (len(docs) - df + 0.5) / (df + 0.5)).astype(np.float32)
+		return cls(docs, {term: i for i, term in enumerate(terms)}, idf, indptr, doc_ids, tf, doc_len)
+
+	def save(self, path=RETRIEVAL_DIR):
+		os.makedirs(path, exist_ok=True)
+		terms = sorted(self.vocabulary, key=self.vocabulary.get)
+		np.savez_compressed(
+			os.path.join(path, "index.npz"),
+			vocabulary=np.array(terms), idf=self.idf, indptr=self.indptr, doc_ids=self.doc_ids, tf=self.tf, doc_len=self.doc_len
+		)
+		with open(os.path.join(path, "docs.json"), "w", encoding="utf-8") as f:
+			json.dump(self.docs, f, ensure_ascii=False)
+
+	@classmethod
+	def load(cls, path=RETRIEVAL_DIR):
+		with open(os.path.join(path, "docs.json"), "r", encoding="utf-8") as f:
+			docs = json.load(f)
+		with np.load(os.path.join(path, "index.npz")) as arrays:
+			vocabulary = {term: i for i, term in enumerate(arrays["vocabulary"].tolist())}
+			return cls(docs, vocabulary, arrays["idf"], arrays["indptr"], arrays["doc_ids"], arrays["tf"], arrays["doc_len"])
+
+	def search(self, query, k=3, exclude=None):
+		"""
+		Top k problems by BM25 score of their description against the query.
+
+		Parameters
+		----------
+		query : str
+			Description of the problem to solve.
+		k : int
+			Number of problems.
+		exclude : str, optional
+			Original description of the problem to solve. Indexed problems with the same description as the query or as
+			exclude (see DUPLICATE_JACCARD) are left out, so that a dataset problem never retrieves its own formulation.
+
+		Returns
+		-------
+		list
+			(score, doc) pairs, best first. Documents sharing no term with the query are left out.
+		"""
+		scores = np.zeros(len(self.docs), dtype=np.float32)
+		for term in set(tokenize(query)):
+			i = self.vocabulary.get(term)
+			if i is None:
+				continue
+			docs = self.doc_ids[self.indptr[i]:self.indptr[i + 1]]
+			tf = self.tf[self.indptr[i]:self.indptr[i + 1]].astype(np.float32)
+			scores[docs] += self.idf[i] * tf * (BM25_K1 + 1) / (tf + self._norm[docs])
+		results = []
+		for i in np.argsort(-scores, kind="stable"):
+			if len(results) == k or scores[i] <= 0:
+				break
+			description = self.docs[i]["description"]
+			if any(text and _jaccard(description, text) >= DUPLICATE_JACCARD for text in (query, exclude)):
+				continue
+			results.append((float(scores[i]), self.docs[i]))
+		return results
+
+	def examples(self, query, k=3, budget=EXAMPLES_BUDGET, exclude=None):
+		"""
+		Formulations of the top k problems similar to the query (see search), as a context section of at most budget tokens.
+		A formulation that does not fit is skipped. Empty if none fits.
+		"""
+		sections = []
+		used = context_utils.estimate_tokens(EXAMPLES_HEADER)
+		for _, doc in self.search(query, k, exclude):
+			section = f"## {doc['title']}\n\n{doc['description']}\n\n```text\n{doc['formulation']}\n```\n\n"
+			tokens = context_utils.estimate_tokens(section)
+			if used + tokens <= budget:
+				sections.append(section)
+				used += tokens
+		return EXAMPLES_HEADER + "".join(sections) if sections else ""
+
+def build_index(dataset_dir=DATASET_DIR, path=RETRIEVAL_DIR):
+	"""
+	Index the solved formulations of the datasets and save the index.
+	"""
+	index = RetrievalIndex.build(load_corpus(dataset_dir))
+	index.save(path)
+	return index
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+	"""
+	Get the retrieval index shared by the LLM calls of the process, built from the datasets on first use if it was not
+	saved yet. The index directory is read from the LLOCO_RETRIEVAL_DIR environment variable, if set.
+	"""
+	global _index
+	with _index_lock:
+		if _index is None:
+			path = os.environ.get("LLOCO_RETRIEVAL_DIR", RETRIEVAL_DIR)
+			if os.path.exists(os.path.join(path, "index.npz")):
+				_index = RetrievalIndex.load(path)
+			else:
+				_index = build_index(path=path)
+		return _index
+
+if __name__ == "__main__":
+
+	parser = argparse.ArgumentParser(description="Build or query the index of the solved formulations of the datasets.")
+	parser.add_argument("query", type=str, nargs="?", default=None, help="Problem description to search for. Without query, the index is rebuilt.")
+	parser.add_argument("-k", type=int, default=3, help="Number of similar problems.")
+	args = parser.parse_args()
+
+	if args.query is None:
+		path = os.environ.get("LLOCO_RETRIEVAL_DIR", RETRIEVAL_DIR)
+		index = build_index(path=path)
+		print(f"Indexed {len(index.docs)} formulations ({len(index.vocabulary)} terms, {index.doc_ids.size} postings) in {path}")
+	else:
+		for score, doc in get_index().search(args.query, args.k):
+			print(f"{score:7.2f}  {doc['source']}")
@@ -0,0 +1,213 @@
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Model of each pipeline stage, with the alternate model used when the call fails or exceeds its latency SLO (in seconds),
+# and optionally the reasoning effort of the request. Fast models handle the descriptive stages, the strongest model the
+# constraints. Unlisted stages use "default"
+DEFAULT_ROUTES = {
+	"default": {"model": "gpt-5", "fallback": "o3", "slo": 300.0},
+	"summary": {"model": "o4-mini", "fallback": "gpt-5", "slo": 120.0},
+	"csv_descriptor": {"model": "o4-mini", "fallback": "gpt-5", "slo": 60.0, "reasoning_effort": "low"},
+	"printing": {"model": "o4-mini", "fallback": "gpt-5", "slo": 120.0, "reasoning_effort": "low"},
+	"report": {"model": "o4-mini", "fallback": "gpt-5", "slo": 180.0},
+	"report_chunk": {"model": "o4-mini", "fallback": "gpt-5", "slo": 120.0, "reasoning_effort": "low"},
+	"constraints": {"model": "gpt-5", "fallback": "o3", "slo": 600.0},
+}
+
+def load_routes(path):
+	"""
+	Read a routing table from a JSON file mapping stages to {"model", "fallback", "slo", "reasoning_effort"}, and merge it
+	over the default table.
+	A stage may only override some of its fields; "fallback" or "slo" set to null disable the fallback.
+	"""
+	with open(path, "r", encoding="utf-8") as f:
+		overrides = json.load(f)
+	routes = {stage: dict(route) for stage, route in DEFAULT_ROUTES.items()}
+	for stage, route in overrides.items():
+		if not isinstance(route, dict):
+			raise ValueError(f"Route of stage {stage} should be an object with model, fallback and slo fields, got {route} !")
+		routes.setdefault(stage, {}).update(route)
+	return routes
+
+def _discarded(on_discarded, model, future):
+	if future.exception() is None:
+		on_discarded(model, future.result())
+
+def _percentile(values, q):
+	values = sorted(values)
+	return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+class ModelRouter(object):
+	"""
+	Pick the model of each LLM call from its pipeline stage, and fall back to an alternate model.
+
+	When the primary model fails, the call is sent again to the fallback model. When it exceeds the latency SLO of the
+	stage, the fallback model is queried concurrently (hedged request) and the first successful answer is kept : the
+	other request is asked to stop, and its answer, if it still comes, is handed to on_discarded.
+	Latencies, failures and SLO misses are tracked per model to tune the routing table.
+
+	Parameters
+	----------
+	routes : dict, optional
+		Routing table (see DEFAULT_ROUTES).
+	max_workers : int
+		Threads running the hedged calls, two per concurrent call.
+	"""
+
+	def __init__(self, routes=None, max_workers=32):
+		self.routes = routes if routes is not None else DEFAULT_ROUTES
+		self.stats = {}
+		self._lock = threading.Lock()
+		self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="route")
+
+	def route(self, stage):
+		"""
+		Model, fallback, SLO and reasoning effort of a stage.
+		"""
+		route = dict(self.routes.get("default", {}))
+		route.update(self.routes.get(stage, {}))
+		if "model" not in route:
+			raise ValueError(f"No model routed for stage {stage} and no default route !")
+		return route
+
+	def _model_stats(self, model):
+		return self.stats.setdefault(model, {"calls": 0, "failures": 0, "slo_exceeded": 0, "fallbacks": 0, "latencies": []})
+
+	def _timed(self, model, send, cancelled, fallback=False):
+		start = time.perf_counter()
+		try:
+			result = send(model, cancelled)
+		except Exception:
+			with self._lock:
+				stats = self._model_stats(model)
+				stats["calls"] += 1
+				# A hedged request stopped by the router did not fail
+				stats["failures"] += not cancelled.is_set()
+			raise
+		with self._lock:
+			stats = self._model_stats(model)
+			stats["calls"] += 1
+			stats["fallbacks"] += fallback
+			stats["latencies"].append(time.perf_counter() - start)
+		return result
+
+	def call(self, stage, send, model=None, on_discarded=None):
+		"""
+		Send a call with the model routed for the stage, falling back to the alternate model if needed.
+
+		Parameters
+		----------
+		stage : str
+			Pipeline stage of the call.
+		send : callable
+			Function sending the call to the model given as first argument and returning its result. The second argument is
+			a threading.Event set when the answer is no longer needed (the other request of a hedged call won) : send
+			should then stop as soon as it can, e.g. by abandoning a stream.
+		model : str, optional
+			Primary model, overriding the routing table. The fallback of the stage still applies.
+		on_discarded : callable, optional
+			Called with the model and the result of the losing request of a hedged call if it completes anyway, so that the
+			tokens it used can be recorded.
+
+		Returns
+		-------
+		tuple
+			The model that answered and the result of send.
+		"""
+		route = self.route(stage)
+		primary = model or route["model"]
+		fallback = route.get("fallback")
+		if not fallback or fallback == primary:
+			return primary, self._timed(primary, send, threading.Event())
+
+		cancelled = {primary: threading.Event(), fallback: threading.Event()}
+		future = self._executor.submit(self._timed, primary, send, cancelled[primary])
+		done, _ = wait([future], timeout=route.get("slo"))
+		if done:
+			if future.exception() is None:
+				return primary, future.result()
+			# The primary model failed within its SLO
+			return fallback, self._timed(fallback, send, cancelled[fallback], fallback=True)
+
+		# Hedged request : the first successful answer wins, the other one is stopped
+		with self._lock:
+			self._model_stats(primary)["slo_exceeded"] += 1
+		backup = self._executor.submit(self._timed, fallback, send, cancelled[fallback], True)
+		pending = {future: primary, backup: fallback}
+		while pending:
+			done, _ = wait(pending, return_when=FIRST_COMPLETED)
+			for f in done:
+				answered = pending.pop(f)
+				if f.exception() is None:
+					for loser, loser_model in pending.items():
+						cancelled[loser_model].set()
+						if on_discarded is not None:
+							loser.add_done_callback(functools.partial(_discarded, on_discarded, loser_model))
+					return answered, f.result()
+				error = f.exception()
+		raise error
+
+	def model_summary(self):
+		"""
+		Per model statistics : number of calls, failures, SLO misses, answers given as fallback, and latency percentiles.
+		"""
+		with self._lock:
+			return {
+				model: {
+					"calls": stats["calls"],
+					"failures": stats["failures"],
+					"slo_exceeded": stats["slo_exceeded"],
+					"fallbacks": stats["fallbacks"],
+					"latency_mean": sum(stats["latencies"]) / len(stats["latencies"]) if stats["latencies"] else 0.0,
+					"latency_p50": _percentile(stats["latencies"], 0.5),
+					"latency_p95": _percentile(stats["latencies"], 0.95),
+				}
+				for model, stats in self.stats.items()
+			}
+
+	def format_table(self):
+		"""
+		Render the per model statistics as a text table.
+		"""
+		header = f"{'model':<18}{'calls':>6}{'failures':>10}{'slo miss':>10}{'fallbacks':>11}{'mean (s)':>10}{'p50 (s)':>9}{'p95 (s)':>9}"
+		lines = ["=== LLM latency per model ===", header, "-" * len(header)]
+		for model, stats in self.model_summary().items():
+			lines.append(
+				f"{model:<18}{stats['calls']:>6}{stats['failures']:>10}{stats['slo_exceeded']:>10}{stats['fallbacks']:>11}"
+				f"{stats['latency_mean']:>10.2f}{stats['latency_p50']:>9.2f}{stats['latency_p95']:>9.2f}"
+			)
+		return "\n".join(lines) + "\n"
+
+	def write_report(self, json_path):
+		"""
+		Write the routing table and the per model statistics to a JSON file.
+		"""
+		with open(json_path, "w", encoding="utf-8") as f:
+			json.dump({"routes": self.routes, "models": self.model_summary()}, f, indent=1)
+
+_router = None
+_router_lock = threading.Lock()
+
+def configure_router(routes_path=None):
+	"""
+	Set the router shared by the LLM calls of the process, from a routing table file (see load_routes) or the default table.
+	"""
+	global _router
+	with _router_lock:
+		_router = ModelRouter(load_routes(routes_path) if routes_path else None)
+
+def get_router():
+	"""
+	Get the router shared by all the LLM calls of the process. The routing table is read from the file given by the
+	LLOCO_ROUTES environment variable, if set.
+	"""
+	global _router
+	with _router_lock:
+		if _router is None:
+			routes_path = os.environ.get("LLOCO_ROUTES")
+			_router = ModelRouter(load_routes(routes_path) if routes_path else None)
+		return _router
@@ -0,0 +1,161 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+
+SIMILARITY_DIR = os.path.join(".lloco_cache", "similarity")
+
+# MinHash parameters : number of hash functions and words per shingle
+NUM_PERMUTATIONS = 128
+SHINGLE_SIZE = 3
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(2024)
+# Coefficients below 2^31 and 32 bit shingle hashes : the products fit in 64 bits
+_A = _rng.randint(1, 1 << 31, NUM_PERMUTATIONS).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, NUM_PERMUTATIONS).astype(np.uint64)
+
+def _shingles(text):
+	words = re.findall(r"\w+", text.lower())
+	if len(words) < SHINGLE_SIZE:
+		return {" ".join(words)} if words else set()
+	return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash(text):
+	"""
+	MinHash signature of the word shingles of a text. The fraction of equal entries of two signatures estimates the
+	Jaccard similarity of their shingle sets.
+	"""
+	shingles = _shingles(text)
+	if not shingles:
+		return np.full(NUM_PERMUTATIONS, _PRIME, dtype=np.uint64)
+	hashes = np.fromiter(
+		(int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+		dtype=np.uint64, count=len(shingles)
+	)
+	return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+def csv_signature(problem_path):
+	"""
+	Sorted "file:column" entries of the headers of the CSV files of a problem.
+	"""
+	signature = []
+	for fname in sorted(os.listdir(problem_path)):
+		if fname.endswith(".csv"):
+			with open(os.path.join(problem_path, fname), "r", encoding="utf-8", newline="") as f:
+				header = next(csv.reader(f), [])
+			signature.extend(f"{fname}:{column.strip()}" for column in header)
+	return sorted(signature)
+
+def description_hash(text):
+	"""
+	Hash of a description (or of the summary of the CSV files) with normalized whitespace : any other change of the text
+	changes the hash.
+	"""
+	return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+class WarmStart(object):
+	"""
+	Artifacts of a past run of a near-duplicate problem (same CSV headers), and the stages whose inputs are unchanged :
+		- summary (complete_description) : identical description and CSV files summary (up to whitespace), and no
+		  refinement answers. The summary is generated from both
+		- data (data.py) : CSV input files and no refinement answers. The DataLoader reads the CSV files when the solution
+		  runs, so new data with the same headers is taken into account
+		- input files description : reused data and identical CSV files summary (it gives row counts and excerpts)
+		- model (solution.py) : reused summary and data (or no CSV input file)
+	"""
+
+	def __init__(self, entry, similarity, artifacts_dir, description, refinement="", data_summary=""):
+		self.entry = entry
+		self.similarity = similarity
+		self.artifacts_dir = artifacts_dir
+		answered = bool(refinement.strip())
+		same_data = entry.get("data_hash") == description_hash(data_summary)
+		self.reuse_summary = not answered and same_data and entry.get("description_hash") == description_hash(description)
+		self.reuse_data = not answered and bool(entry["headers"]) and self.artifact("data.py") is not None
+		self.reuse_input_description = self.reuse_data and same_data
+		self.reuse_model = self.reuse_summary and (self.reuse_data or not entry["headers"])
+
+	def artifact(self, name):
+		"""
+		Content of an artifact of the past run, or None if it was not saved.
+		"""
+		path = os.path.join(self.artifacts_dir, name)
+		if not os.path.exists(path):
+			return None
+		with open(path, "r", encoding="utf-8") as f:
+			return f.read()
+
+	def describe(self):
+		stages = [name for name, reused in (("summary", self.reuse_summary), ("data", self.reuse_data), ("model", self.reuse_model)) if reused]
+		return (
+			f"Near-duplicate of {self.entry['problem']} (similarity {self.similarity:.2f}) : "
+			f"reusing {', '.join(stages) if stages else 'nothing'}"
+		)
+
+class SimilarityIndex(object):
+	"""
+	Local index of past problems, to warm start the pipeline on near-duplicate submissions (e.g. the same problem every
+	week with new CSV files). Problems are compared on the MinHash signature of their description and the headers of
+	their CSV files.
+
+	Parameters
+	----------
+	path : str
+		Directory of the index and of the saved artifacts.
+	threshold : float
+		Minimum estimated Jaccard similarity of two descriptions to reuse a past run.
+	"""
+
+	def __init__(self, path=SIMILARITY_DIR, threshold=0.9):
+		self.path = path
+		self.threshold = threshold
+		self.index_path = os.path.join(path, "index.json")
+		self._lock = threading.Lock()
+		self.entries = []
+		if os.path.exists(self.index_path):
+			with open(self.index_path, "r", encoding="utf-8") as f:
+				self.entries = json.load(f)
+
+	def lookup(self, description, headers, refinement="", data_summary=""):
+		"""
+		Warm start from the most similar past problem with the same CSV headers, or None if none reaches the threshold.
+		data_summary is the summary of the CSV files (see io_utils.get_csv_files_summary) given to the past run.
+		"""
+		candidates = [entry for entry in self.entries if entry["headers"] == headers]
+		if not candidates:
+			return None
+		signatures = np.array([entry["signature"] for entry in candidates], dtype=np.uint64)
+		similarities = (signatures == minhash(description)[None, :]).mean(axis=1)
+		best = int(np.argmax(similarities))
+		if similarities[best] < self.threshold:
+			return None
+		entry = candidates[best]
+		return WarmStart(entry, float(similarities[best]), os.path.join(self.path, entry["id"]), description, refinement, data_summary)
+
+	def add(self, problem, description, headers, artifacts, data_summary=""):
+		"""
+		Save the artifacts of a successful run (dict from artifact name to content) and index its problem, with the hash
+		of the summary of its CSV files.
+		"""
+		entry_id = hashlib.sha256(json.dumps([description, headers]).encode("utf-8")).hexdigest()[:16]
+		artifacts_dir = os.path.join(self.path, entry_id)
+		os.makedirs(artifacts_dir, exist_ok=True)
+		for name, content in artifacts.items():
+			if content is not None:
+				with open(os.path.join(artifacts_dir, name), "w", encoding="utf-8") as f:
+					f.write(content)
+		entry = {
+			"id": entry_id, "problem": problem, "headers": headers, "time": time.time(),
+			"description_hash": description_hash(description), "data_hash": description_hash(data_summary),
+			"signature": minhash(description).tolist(),
+		}
+		with self._lock:
+			self.entries = [e for e in self.entries if e["id"] != entry_id] + [entry]
+			tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+			with open(tmp_path, "w", encoding="utf-8") as f:
+				json.dump(self.entries, f)
+			os.replace(tmp_path, self.index_path)
@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+
+# One record per LLM call of the run
+_calls = []
+_lock = threading.Lock()
+
+def record_call(stage, model, response, latency, cache_status, retries=0, retry_wait=0.0, rate_limit_wait=0.0, truncated_retries=0):
+	"""
+	Record an LLM call of the run.
+
+	Parameters
+	----------
+	stage : str
+		Pipeline stage that made the call (e.g. "summary", "constraints").
+	model : str
+		Model deployment name.
+	response : dict
+		Decoded response, whose "usage" field gives the prompt and completion tokens, and the prompt tokens served
+		from the provider prefix cache (usage.prompt_tokens_details.cached_tokens).
+	latency : float
+		Duration of the call in seconds.
+	cache_status : str
+		"hit", "miss", "refresh", "disabled", "replay", or "discarded" for the losing request of a hedged call.
+	retries, retry_wait, rate_limit_wait : int, float, float
+		Retries of the request, and seconds spent in backoff and waiting for the rate limiter.
+	truncated_retries : int
+		Requests sent again with a larger output budget because the completion was truncated.
+	"""
+	usage = response.get("usage") or {}
+	prompt_details = usage.get("prompt_tokens_details") or {}
+	call = {
+		"stage": stage or "unknown",
+		"model": model,
+		"prompt_tokens": usage.get("prompt_tokens", 0),
+		"completion_tokens": usage.get("completion_tokens", 0),
+		"cached_tokens": prompt_details.get("cached_tokens", 0),
+		"latency": latency,
+		"cache": cache_status,
+		"retries": retries,
+		"retry_wait": retry_wait,
+		"rate_limit_wait": rate_limit_wait,
+		"truncated_retries": truncated_retries,
+		"time": time.time(),
+	}
+	with _lock:
+		_calls.append(call)
+
+def get_calls():
+	with _lock:
+		return list(_calls)
+
+def reset():
+	with _lock:
+		_calls.clear()
+
+def stage_summary():
+	"""
+	Aggregate the recorded calls by stage, in order of first call.
+
+	Returns
+	-------
+	dict
+		Mapping from stage to its number of calls, tokens (excluding cache hits) including the prompt tokens served from the
+		provider prefix cache, total latency, cache hits and retries.
+	"""
+	stages = {}
+	for call in get_calls():
+		stage = stages.setdefault(call["stage"], {
+			"calls": 0, "models": [], "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+			"latency": 0.0, "cache_hits": 0, "retries": 0, "wait": 0.0
+		})
+		stage["calls"] += 1
+		if call["model"] not in stage["models"]:
+			stage["models"].append(call["model"])
+		if call["cache"] != "hit":
+			# Cached responses cost no token
+			stage["prompt_tokens"] += call["prompt_tokens"]
+			stage["completion_tokens"] += call["completion_tokens"]
+			stage["cached_tokens"] += call.get("cached_tokens", 0)
+		stage["latency"] += call["latency"]
+		stage["cache_hits"] += call["cache"] == "hit"
+		stage["retries"] += call["retries"]
+		stage["wait"] += call["retry_wait"] + call["rate_limit_wait"]
+	return stages
+
+def format_table(stages):
+	"""
+	Render the per stage summary as a text table, with a total row.
+	"""
+	header = f"{'stage':<18}{'calls':>6}{'prompt tok':>12}{'cached tok':>12}{'compl. tok':>12}{'latency (s)':>13}{'cache hits':>12}{'retries':>9}  models"
+	lines = ["=== LLM usage per stage ===", header, "-" * len(header)]
+	total = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "latency": 0.0, "cache_hits": 0, "retries": 0}
+	for name, stage in stages.items():
+		lines.append(
+			f"{name:<18}{stage['calls']:>6}{stage['prompt_tokens']:>12}{stage['cached_tokens']:>12}{stage['completion_tokens']:>12}"
+			f"{stage['latency']:>13.2f}{stage['cache_hits']:>12}{stage['retries']:>9}  {', '.join(stage['models'])}"
+		)
+		for key in total:
+			total[key] += stage[key]
+	lines.append("-" * len(header))
+	lines.append(
+		f"{'total':<18}{total['calls']:>6}{total['prompt_tokens']:>12}{total['cached_tokens']:>12}{total['completion_tokens']:>12}"
+		f"{total['latency']:>13.2f}{total['cache_hits']:>12}{total['retries']:>9}"
+	)
+	if total["prompt_tokens"]:
+		lines.append(f"Prompt tokens served from the provider prefix cache : {total['cached_tokens'] / total['prompt_tokens']:.1%}")
+	return "\n".join(lines) + "\n"
+
+def write_report(json_path, table_path=None):
+	"""
+	Write the recorded calls and the per stage summary to a JSON file and, optionally, the table to a text file.
+	Return the table.
+	"""
+	stages = stage_summary()
+	table = format_table(stages)
+	with open(json_path, "w", encoding="utf-8") as f:
+		json.dump({"stages": stages, "calls": get_calls()}, f, indent=1)
+	if table_path is not None:
+		with open(table_path, "w", encoding="utf-8") as f:
+			f.write(table)
+	return table
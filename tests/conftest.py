@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The modules of the repository are flat files at its root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import budget_utils
+import cache_utils
+import telemetry_utils
+
+@pytest.fixture
+def isolated_llm_state(monkeypatch):
+	"""
+	Shared LLM state of the process without side effect : cache disabled, token budgets kept in memory, empty telemetry.
+	"""
+	monkeypatch.chdir(ROOT)
+	cache_utils.configure_cache(mode="disabled")
+	budget_utils.configure_budgets(path=None)
+	telemetry_utils.reset()
+	yield
+	cache_utils.configure_cache(mode=os.environ.get("LLOCO_CACHE", "readwrite"))
+	budget_utils.configure_budgets(path=os.environ.get("LLOCO_BUDGETS", budget_utils.BUDGETS_PATH))
+	telemetry_utils.reset()
@@ -0,0 +1,150 @@
+import json
+
+import budget_utils
+import pytest
+from batch_utils import BATCH_STAGES, BatchRunner, LocalBatchBackend
+
+CODE_ANSWER = "```python\nx = 1\n```"
+
+def completion(content, finish_reason="stop", completion_tokens=10):
+	return {
+		"choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+		"usage": {"prompt_tokens": 100, "completion_tokens": completion_tokens},
+	}
+
+def stage_of(body):
+	# The summary request is the only one whose last message is the raw description
+	return "summary" if body["messages"][-1]["content"].startswith("Problem") else "code"
+
+def answer(body):
+	return completion("Summary of the problem" if stage_of(body) == "summary" else CODE_ANSWER)
+
+def make_runner(tmp_path, responder, problems=None, max_attempts=3):
+	problems = problems or {"p1": {"description": "Problem one", "expected": 1.0}, "p2": {"description": "Problem two", "expected": None}}
+	return BatchRunner(str(tmp_path / "batch"), problems, LocalBatchBackend(responder, max_concurrency=2), max_attempts=max_attempts)
+
+def run_round(runner, tmp_path, name="round"):
+	requests_path, results_path = str(tmp_path / f"{name}.jsonl"), str(tmp_path / f"{name}_results.jsonl")
+	count = runner.build_requests(requests_path)
+	runner.backend.run(requests_path, results_path)
+	runner.ingest(requests_path, results_path)
+	return count, requests_path, results_path
+
+def test_round_advances_every_problem(isolated_llm_state, tmp_path):
+	runner = make_runner(tmp_path, answer)
+	count, requests_path, results_path = run_round(runner, tmp_path)
+	assert count == 2
+	with open(requests_path, "r", encoding="utf-8") as f:
+		lines = [json.loads(line) for line in f]
+	assert sorted(line["custom_id"] for line in lines) == ["p1|summary", "p2|summary"]
+	assert all(line["url"] == "/chat/completions" and line["body"]["max_tokens"] > 0 for line in lines)
+	with open(results_path, "r", encoding="utf-8") as f:
+		assert all(json.loads(line)["response"]["status_code"] == 200 for line in f)
+	for problem in runner.state["problems"].values():
+		assert problem["stage"] == "variables"
+		assert problem["complete_description"] == "Summary of the problem"
+		assert problem["first_attempts"] == {"summary": True}
+
+def test_run_generates_the_code_of_every_stage(isolated_llm_state, tmp_path):
+	runner = make_runner(tmp_path, answer)
+	runner.run()
+	assert runner.state["round"] == len(BATCH_STAGES)
+	for problem in runner.state["problems"].values():
+		assert problem["status"] == "generated"
+		assert problem["code"].count("x = 1") == len(BATCH_STAGES) - 1
+		assert all(problem["first_attempts"][stage] for stage in BATCH_STAGES)
+
+def test_failed_answer_is_retried_in_the_next_round(isolated_llm_state, tmp_path):
+	calls = {"n": 0}
+
+	def flaky(body):
+		calls["n"] += 1
+		if calls["n"] == 1:
+			raise RuntimeError("Service unavailable")
+		return answer(body)
+
+	runner = make_runner(tmp_path, flaky, problems={"p1": {"description": "Problem one", "expected": None}})
+	run_round(runner, tmp_path, "round_1")
+	problem = runner.state["problems"]["p1"]
+	assert problem["stage"] == "summary" and problem["status"] == "pending"
+	assert problem["attempts"] == 1 and problem["retries"] == 1
+	assert "Service unavailable" in problem["error"]["message"]
+
+	run_round(runner, tmp_path, "round_2")
+	assert problem["stage"] == "variables"
+	assert problem["attempts"] == 0 and problem["error"] is None and problem["retries"] == 1
+	# The first answer of the stage failed, even though the retry succeeded
+	assert problem["first_attempts"] == {"summary": False}
+
+def test_problem_fails_after_max_attempts(isolated_llm_state, tmp_path):
+	def unparsable(body):
+		return answer(body) if stage_of(body) == "summary" else completion("No code block here")
+
+	runner = make_runner(tmp_path, unparsable, problems={"p1": {"description": "Problem one", "expected": None}}, max_attempts=2)
+	runner.run()
+	problem = runner.state["problems"]["p1"]
+	assert problem["status"] == "failed"
+	assert problem["stage"] == "variables"
+	assert problem["attempts"] == 2 and problem["retries"] == 2
+	assert problem["error"].startswith("Unparsable variables answer")
+	assert runner.pending() == []
+
+def test_missing_answer_counts_as_failed_attempt(isolated_llm_state, tmp_path):
+	runner = make_runner(tmp_path, answer, problems={"p1": {"description": "Problem one", "expected": None}})
+	requests_path, results_path = str(tmp_path / "round.jsonl"), str(tmp_path / "round_results.jsonl")
+	runner.build_requests(requests_path)
+	open(results_path, "w").close()
+	runner.ingest(requests_path, results_path)
+	problem = runner.state["problems"]["p1"]
+	assert problem["attempts"] == 1 and problem["error"] == "No answer"
+
+def test_truncated_answers_are_resubmitted_with_a_larger_budget(isolated_llm_state, tmp_path):
+	budgets = []
+
+	def truncating(body):
+		budgets.append(body["max_tokens"])
+		if len(budgets) < 3:
+			return completion("Summary cut", finish_reason="length", completion_tokens=body["max_tokens"])
+		return answer(body)
+
+	runner = make_runner(tmp_path, truncating, problems={"p1": {"description": "Problem one", "expected": None}})
+	for k in range(3):
+		run_round(runner, tmp_path, f"round_{k}")
+	problem = runner.state["problems"]["p1"]
+	assert budgets[0] < budgets[1] < budgets[2]
+	assert problem["truncated_retries"] == 2
+	# Truncations are not failed attempts until the largest budget is reached
+	assert problem["attempts"] == 0 and problem.get("retries", 0) == 0
+	assert problem["stage"] == "variables" and problem["max_tokens"] is None
+	assert problem["first_attempts"] == {"summary": False}
+
+def test_truncated_answer_at_the_largest_budget_fails(isolated_llm_state, tmp_path):
+	def truncating(body):
+		return completion("Summary cut", finish_reason="length", completion_tokens=body["max_tokens"])
+
+	runner = make_runner(tmp_path, truncating, problems={"p1": {"description": "Problem one", "expected": None}}, max_attempts=1)
+	runner.run()
+	problem = runner.state["problems"]["p1"]
+	assert problem["status"] == "failed"
+	assert problem["max_tokens"] >= budget_utils.MAX_TOKENS_LIMIT
+	assert problem["attempts"] == 1 and problem["truncated_retries"] >= 1
+
+def test_state_is_resumed(isolated_llm_state, tmp_path):
+	runner = make_runner(tmp_path, answer)
+	run_round(runner, tmp_path)
+	runner.save()
+	resumed = make_runner(tmp_path, answer)
+	assert resumed.state == runner.state
+
+def test_execute_runs_the_solutions_and_reports_first_attempts(isolated_llm_state, tmp_path):
+	runner = make_runner(tmp_path, answer, problems={"p1": {"description": "Problem one", "expected": 0.0}})
+	runner.run()
+	report = runner.execute(timeout=120, max_workers=1)
+	assert report["few_shot"] == 0
+	assert report["generated"] == 1
+	assert report["first_attempts"] == {stage: {"answers": 1, "failed": 0} for stage in BATCH_STAGES}
+	with open(tmp_path / "batch" / "results.json", "r", encoding="utf-8") as f:
+		assert json.load(f)["first_attempts"] == report["first_attempts"]
+	outcome = report["outcomes"]["p1"]
+	assert outcome["error"] is None and outcome["objective"] == 0.0
+	assert outcome["correct"] and report["correct"] == 1
@@ -0,0 +1,57 @@
+import itertools
+
+import cache_utils
+import pytest
+from cache_utils import ResponseCache, request_key
+
+def response(content):
+	return {"choices": [{"message": {"content": content}}]}
+
+@pytest.fixture
+def clock(monkeypatch):
+	# Strictly increasing timestamps, so that access times never tie
+	ticks = itertools.count(1000)
+	monkeypatch.setattr(cache_utils.time, "time", lambda: float(next(ticks)))
+
+def test_request_key_depends_on_every_field():
+	messages = [{"role": "user", "content": "hi"}]
+	key = request_key("m", messages)
+	assert key == request_key("m", [dict(messages[0])])
+	assert len({key, request_key("n", messages), request_key("m", messages, {"type": "json_object"}), request_key("m", messages, sample=1)}) == 4
+	assert request_key("m", messages, sample=0) == key
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+	size = len(cache_utils.json.dumps(response("a" * 100)))
+	cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=3 * size)
+	for key in ("k1", "k2", "k3"):
+		cache.put(key, response(key[-1] * 100))
+	# k1 becomes the most recently used entry, k2 the least recently used one
+	assert cache.get("k1") == response("1" * 100)
+	cache.put("k4", response("4" * 100))
+	assert cache.get("k2") is None
+	assert [cache.get(key) is not None for key in ("k1", "k3", "k4")] == [True, True, True]
+	assert cache.stats["evictions"] == 1
+
+def test_expired_entries_are_misses_and_evicted(tmp_path, clock):
+	cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_age=10)
+	cache.put("old", response("x"))
+	for _ in range(20):
+		cache_utils.time.time()
+	assert cache.get("old") is None
+	cache.put("new", response("y"))
+	assert cache.stats["evictions"] == 1
+
+def test_modes(tmp_path):
+	path = str(tmp_path / "cache.sqlite")
+	ResponseCache(path).put("k", response("x"))
+	readonly = ResponseCache(path, mode="readonly")
+	readonly.put("other", response("y"))
+	assert readonly.get("k") == response("x") and readonly.get("other") is None
+	refresh = ResponseCache(path, mode="refresh")
+	assert refresh.get("k") is None
+	refresh.put("k", response("z"))
+	assert ResponseCache(path).get("k") == response("z")
+	disabled = ResponseCache(path, mode="disabled")
+	assert disabled.get("k") is None
+	with pytest.raises(ValueError):
+		ResponseCache(path, mode="unknown")
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+from code_utils import complete_code_block, merge_model_code, parse_code_response
+
+def test_plain_answer_returns_the_code_block():
+	assert parse_code_response("Here is the code :\n```python\nx = 1\n```\nDone.") == "\nx = 1\n"
+
+def test_structured_answer_puts_the_imports_first():
+	answer = json.dumps({"code": "y = np.zeros(3)", "imports": ["import numpy as np", " "], "notes": ""})
+	assert parse_code_response(answer) == "\nimport numpy as np\n\ny = np.zeros(3)\n"
+
+def test_structured_answer_without_imports():
+	assert parse_code_response(json.dumps({"code": "\nx = 1\n\n", "imports": [], "notes": "n"})) == "\nx = 1\n"
+
+def test_structured_answer_with_a_fenced_code_field():
+	answer = json.dumps({"code": "```python\nx = 1\n```", "imports": [], "notes": ""})
+	assert parse_code_response(answer) == "\nx = 1\n"
+
+@pytest.mark.parametrize("answer, error", [
+	("x = 1", "no ```python code block"),
+	("```python\nx = 1\n", "not closed"),
+	("```python\n\n```", "empty"),
+	(json.dumps({"code": "", "imports": [], "notes": ""}), "no code field"),
+	(json.dumps({"imports": [], "notes": ""}), "no code field"),
+	(json.dumps({"code": "```python\nx = 1", "imports": [], "notes": ""}), "not closed"),
+])
+def test_unparsable_answers_raise(answer, error):
+	with pytest.raises(ValueError, match=error):
+		parse_code_response(answer)
+
+def test_complete_code_block_waits_for_valid_code():
+	assert complete_code_block("```python\nx = (1,\n") is None
+	assert complete_code_block("```python\ns = '''\n```\n") is None
+	assert complete_code_block("```python\nx = 1\n```\ntrailing") == "\nx = 1\n"
+
+def test_merge_renames_names_bound_by_both_snippets():
+	code, mapping = merge_model_code("solver = 1\n", "total = 2\nobj = total\n", "total = 3\nsolver = 4\n")
+	assert mapping == {"total": "total_cons"}
+	assert code == "solver = 1\ntotal = 2\nobj = total\ntotal_cons = 3\nsolver = 4\n"
@@ -0,0 +1,48 @@
+import pytest
+from context_utils import _pack, estimate_tokens, split_summary
+
+def make_summary(n_x=60, n_y=500):
+	lines = ["=== Status ===", "Optimal", "=== Objective ===", "value 12.5", "=== Variables ==="]
+	lines += [f"Variable x_{i}_{j} : value {i * j}.0" for i in range(n_x) for j in range(n_x)]
+	lines += [f"Variable y_{i} : value {i}.0" for i in range(n_y)]
+	lines += ["=== Constraints ===", "c1 : slack 0"]
+	return "\n".join(lines) + "\n"
+
+def test_small_summary_is_a_single_chunk():
+	summary = "=== A ===\nshort\n=== B ===\nshort"
+	assert split_summary(summary, 6000) == ["=== A ===\nshort\n\n=== B ===\nshort"]
+
+@pytest.mark.parametrize("budget", [6000, 500, 100, 40])
+def test_chunks_fit_the_budget_and_keep_every_line(budget):
+	summary = make_summary()
+	chunks = split_summary(summary, budget)
+	assert max(estimate_tokens(chunk) for chunk in chunks) <= budget
+	joined = "\n".join(chunks)
+	assert all(line in joined for line in summary.split("\n") if line.strip())
+
+def test_split_parts_repeat_the_section_header():
+	chunks = split_summary(make_summary(), 500)
+	parts = [chunk for chunk in chunks if "Variable x_" in chunk or "Variable y_" in chunk]
+	assert len(parts) > 1
+	assert all("=== Variables ===" in part for part in parts)
+
+def test_small_sections_share_the_chunks_of_a_split_section():
+	chunks = split_summary(make_summary(), 500)
+	# The status and objective open the first part, the constraints close the last one
+	assert chunks[0].startswith("=== Status ===\nOptimal\n\n=== Objective ===\nvalue 12.5\n\n=== Variables ===")
+	assert chunks[-1].endswith("=== Constraints ===\nc1 : slack 0")
+
+def test_pack_splits_oversized_blocks_and_counts_the_header():
+	blocks = [["a" * 40] * 3, ["b" * 40]]
+	chunks = _pack(blocks, 25, header=["h" * 39])
+	assert [chunk[1:] for chunk in chunks] == [["a" * 40]] * 3 + [["b" * 40]]
+	assert all(chunk[0] == "h" * 39 for chunk in chunks)
+	assert all(estimate_tokens("\n".join(chunk)) <= 25 for chunk in chunks)
+
+def test_pack_starts_the_first_chunk_with_the_lead():
+	chunks = _pack([["x"], ["y"]], 100, header=["h"], lead=["intro", ""])
+	assert chunks == [["intro", "", "h", "x", "y"]]
+
+def test_pack_gives_an_oversized_line_its_own_chunk():
+	chunks = _pack([["a"], ["b" * 100], ["c"]], 10)
+	assert chunks == [["a"], ["b" * 100], ["c"]]
@@ -0,0 +1,113 @@
+import operator
+
+import numpy as np
+import pandas as pd
+import pytest
+from optimization_utils import (
+	LabeledVariables, SparseVariables, add_grouped_constraints, add_objective, define_labeled_variables, define_linear_expr,
+	define_solver, define_sparse_variables
+)
+
+@pytest.fixture
+def solver():
+	return define_solver("SCIP")
+
+@pytest.fixture
+def sparse(solver):
+	# Valid (employee, project) pairs of a 3 x 4 space, in C order
+	valid = np.array([[1, 1, 0, 0], [0, 1, 1, 0], [0, 0, 0, 1]], dtype=bool)
+	return define_sparse_variables(solver, shape=valid.shape, index=valid, lbs=0, ubs=1, integer=True, suffix="assign")
+
+def test_sparse_variables_are_created_on_valid_indices_only(sparse, solver):
+	assert isinstance(sparse, SparseVariables)
+	assert len(sparse) == solver.NumVariables() == 5
+	assert [i.tolist() for i in sparse.indices] == [[0, 0, 1, 1, 2], [0, 1, 1, 2, 3]]
+	assert sparse.flat.tolist() == [0, 1, 5, 6, 11]
+
+def test_sparse_variables_from_index_tuples_keep_their_order(solver):
+	x = define_sparse_variables(solver, shape=(3, 3), index=[(2, 2), (0, 1)], lbs=0, ubs=1, integer=True, suffix="t")
+	assert [i.tolist() for i in x.indices] == [[2, 0], [2, 1]]
+	assert len(define_sparse_variables(solver, shape=(3, 3), index=[], lbs=0, ubs=1, integer=True, suffix="e")) == 0
+
+def test_duplicated_index_tuples_are_rejected(solver):
+	with pytest.raises(ValueError, match="Duplicated"):
+		define_sparse_variables(solver, shape=(3, 3), index=[(0, 1), (2, 2), (0, 1)], lbs=0, ubs=1, integer=True, suffix="d")
+
+def test_gather_broadcasts_full_space_weights(sparse):
+	full = np.arange(12.0).reshape(3, 4)
+	assert sparse.gather(full).tolist() == [0.0, 1.0, 5.0, 6.0, 11.0]
+	# Per project weights of shape (4,)
+	assert sparse.gather([10.0, 20.0, 30.0, 40.0]).tolist() == [10.0, 20.0, 20.0, 30.0, 40.0]
+	assert sparse.gather(2.0).tolist() == [2.0] * 5
+
+def test_gather_of_aligned_weights(sparse):
+	assert sparse.gather([1, 2, 3, 4, 5], aligned=True).tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+	with pytest.raises(ValueError, match="Aligned weights"):
+		sparse.gather([1, 2, 3, 4], aligned=True)
+
+def test_gather_of_weights_as_long_as_an_axis_is_not_taken_as_aligned(solver):
+	# 3 valid indices on a (3, 3) space : per column weights of shape (3,) are broadcast, not taken one per variable
+	x = define_sparse_variables(solver, shape=(3, 3), index=[(0, 2), (1, 0), (2, 1)], lbs=0, ubs=1, integer=True, suffix="c")
+	assert x.gather([10.0, 20.0, 30.0]).tolist() == [30.0, 10.0, 20.0]
+
+def test_group_terms_skips_empty_groups(sparse):
+	groups = sparse.group_terms(axis=1)
+	assert list(groups) == [0, 1, 2, 3]
+	assert [len(terms) for terms in groups.values()] == [1, 2, 1, 1]
+	assert list(sparse.group_terms(axis=0)) == [0, 1, 2]
+	assert sparse.select(1, 1).tolist() == [sparse.values[1], sparse.values[2]]
+
+def test_to_dense(sparse):
+	dense = sparse.to_dense(np.arange(1.0, 6.0))
+	assert dense.tolist() == [[1, 2, 0, 0], [0, 3, 4, 0], [0, 0, 0, 5]]
+	assert sparse.to_dense()[0, 2] is None
+
+def test_sparse_model_solves(sparse, solver):
+	value = np.array([[5.0, 3.0, 0.0, 0.0], [0.0, 4.0, 6.0, 0.0], [0.0, 0.0, 0.0, 2.0]])
+	add_objective(solver, define_linear_expr(sparse, value), maximize=True)
+	add_grouped_constraints(solver, sparse, weights=1, axis=0, c_val=1, c_operator=operator.le, c_name="one_project")
+	add_grouped_constraints(solver, sparse, weights=1, axis=1, c_val=1, c_operator=operator.le, c_name="one_employee")
+	assert solver.Solve() == solver.OPTIMAL
+	assert solver.Objective().Value() == pytest.approx(13.0)
+
+@pytest.fixture
+def labeled(solver):
+	return define_labeled_variables(
+		solver, {"employee": ["alice", "bob"], "project": ["p1", "p2", "p3"]}, lbs=0, ubs=1, integer=True, suffix="x"
+	)
+
+def test_align_named_series_on_its_axis(labeled):
+	assert isinstance(labeled, LabeledVariables)
+	cost = pd.Series({"p3": 3.0, "p1": 1.0}).rename_axis("project")
+	assert labeled.align(cost).tolist() == [[1.0, 0.0, 3.0], [1.0, 0.0, 3.0]]
+	rate = pd.Series({"bob": 2.0, "alice": 1.0}).rename_axis("employee")
+	assert labeled.align(rate, fill_value=-1).tolist() == [[1.0, 1.0, 1.0], [2.0, 2.0, 2.0]]
+
+def test_align_unnamed_series_on_the_only_matching_axis(labeled):
+	assert labeled.align(pd.Series({"bob": 2.0})).tolist() == [[0.0, 0.0, 0.0], [2.0, 2.0, 2.0]]
+	with pytest.raises(ValueError, match="Could not align"):
+		labeled.align(pd.Series({"carol": 1.0}))
+
+def test_align_dataframe_on_index_and_columns(labeled):
+	df = pd.DataFrame([[4.0, 5.0, 6.0], [1.0, 2.0, 3.0]], index=["bob", "alice"], columns=["p1", "p2", "p3"])
+	assert labeled.align(df).tolist() == [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+	assert labeled.align(df.T).tolist() == [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+
+def test_align_scalars_and_arrays_positionally(labeled):
+	assert labeled.align(2.0).tolist() == [[2.0] * 3] * 2
+	assert labeled.align(np.array([1.0, 2.0, 3.0])).tolist() == [[1.0, 2.0, 3.0]] * 2
+
+def test_align_refuses_ambiguous_unnamed_labels(solver):
+	x = define_labeled_variables(solver, {"origin": range(3), "destination": range(3)}, lbs=0, ubs=None, integer=False, suffix="flow")
+	with pytest.raises(ValueError, match="match several axes"):
+		x.align(pd.Series([1.0, 2.0, 3.0]))
+	assert x.align(pd.Series([1.0, 2.0, 3.0]).rename_axis("destination")).tolist() == [[1.0, 2.0, 3.0]] * 3
+	assert x.align(pd.Series([1.0, 2.0, 3.0]).rename_axis("origin")).tolist() == [[1.0] * 3, [2.0] * 3, [3.0] * 3]
+
+def test_sel_and_group_terms(labeled):
+	assert labeled.sel(employee="bob", project="p2") is labeled.values[1, 1]
+	row = labeled.sel(employee="alice")
+	assert row.dims == ("project",) and row.values.tolist() == labeled.values[0].tolist()
+	assert list(labeled.group_terms("project")) == ["p1", "p2", "p3"]
+	with pytest.raises(KeyError):
+		labeled.sel(team="a")
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from retrieval_utils import EXAMPLES_HEADER, RetrievalIndex, tokenize
+
+DOCS = [
+	{"source": "a", "title": "diet problem", "description": "Choose the quantities of foods to buy to meet the nutrient requirements at minimum cost.", "formulation": "min sum c_f x_f"},
+	{"source": "b", "title": "knapsack", "description": "Select items with weights and values to put in a bag of limited capacity, maximizing the total value.", "formulation": "max sum v_i x_i"},
+	{"source": "c", "title": "nurse scheduling", "description": "Assign nurses to the shifts of a week so that every shift is covered, at minimum cost.", "formulation": "min sum c_ns x_ns"},
+]
+
+@pytest.fixture
+def index():
+	return RetrievalIndex.build(DOCS)
+
+def test_tokenize_drops_stop_words_and_short_words():
+	assert tokenize("The cost of a 2 x food-item, in $") == ["cost", "food", "item"]
+
+def test_index_arrays_are_consistent(index):
+	assert len(index.indptr) == len(index.vocabulary) + 1
+	assert index.indptr[-1] == len(index.doc_ids) == len(index.tf)
+	assert index.doc_len.tolist() == [len(tokenize(d["title"] + " " + d["description"])) for d in DOCS]
+	assert np.all(index.idf > 0)
+
+def test_search_ranks_by_bm25(index):
+	results = index.search("bag capacity with items of weights and values", k=3)
+	assert [doc["source"] for _, doc in results] == ["b"]
+	scores = [score for score, _ in index.search("minimum cost nurses shifts", k=3)]
+	assert scores == sorted(scores, reverse=True)
+	assert index.search("minimum cost nurses shifts", k=1)[0][1]["source"] == "c"
+
+def test_search_leaves_out_documents_without_common_term(index):
+	assert index.search("unrelated words only", k=3) == []
+
+def test_search_excludes_the_problem_being_solved(index):
+	query = DOCS[0]["description"]
+	assert "a" not in [doc["source"] for _, doc in index.search(query, k=3)]
+	# A rephrased summary of the problem still excludes its own formulation through its original description
+	summary = "Diet problem : buy foods covering the nutrient requirements, minimum cost, with cost per food."
+	assert "a" in [doc["source"] for _, doc in index.search(summary, k=3)]
+	assert "a" not in [doc["source"] for _, doc in index.search(summary, k=3, exclude=query)]
+
+def test_examples_fit_the_budget(index):
+	examples = index.examples("minimum cost nurses shifts foods", k=3)
+	assert examples.startswith(EXAMPLES_HEADER)
+	assert "## nurse scheduling" in examples and "```text\nmin sum c_ns x_ns\n```" in examples
+	assert index.examples("minimum cost nurses shifts foods", k=3, budget=10) == ""
+
+def test_save_and_load(index, tmp_path):
+	index.save(str(tmp_path))
+	loaded = RetrievalIndex.load(str(tmp_path))
+	assert loaded.vocabulary == index.vocabulary
+	query = "minimum cost nurses shifts"
+	assert [(round(s, 5), d["source"]) for s, d in loaded.search(query)] == [(round(s, 5), d["source"]) for s, d in index.search(query)]
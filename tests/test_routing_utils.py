@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+from routing_utils import ModelRouter, load_routes
+
+ROUTES = {"default": {"model": "primary", "fallback": "backup", "slo": 0.2}}
+
+def test_primary_answers_within_its_slo():
+	router = ModelRouter(ROUTES)
+	assert router.call("summary", lambda model, cancelled: f"answer of {model}") == ("primary", "answer of primary")
+	assert router.model_summary()["primary"]["calls"] == 1
+
+def test_failed_primary_falls_back():
+	def send(model, cancelled):
+		if model == "primary":
+			raise RuntimeError("primary is down")
+		return "answer of backup"
+
+	router = ModelRouter(ROUTES)
+	assert router.call("summary", send) == ("backup", "answer of backup")
+	stats = router.model_summary()
+	assert stats["primary"]["failures"] == 1
+	assert stats["backup"]["fallbacks"] == 1
+
+def test_both_models_failing_raises():
+	def send(model, cancelled):
+		raise RuntimeError(f"{model} is down")
+
+	with pytest.raises(RuntimeError, match="backup is down"):
+		ModelRouter(ROUTES).call("summary", send)
+
+def test_slow_primary_is_hedged_and_stopped():
+	stopped = threading.Event()
+
+	def send(model, cancelled):
+		if model == "backup":
+			return "answer of backup"
+		# A streamed request checking the event between tokens
+		for _ in range(200):
+			if cancelled.is_set():
+				stopped.set()
+				raise RuntimeError("abandoned")
+			time.sleep(0.01)
+		return "answer of primary"
+
+	router = ModelRouter(ROUTES)
+	discarded = []
+	assert router.call("summary", send, on_discarded=lambda model, result: discarded.append(model)) == ("backup", "answer of backup")
+	assert stopped.wait(2)
+	stats = router.model_summary()
+	assert stats["primary"]["slo_exceeded"] == 1
+	# A request stopped by the router is not a failure of its model, and gives no answer to record
+	time.sleep(0.05)
+	assert router.model_summary()["primary"]["failures"] == 0
+	assert discarded == []
+
+def test_losing_request_completing_anyway_is_discarded():
+	def send(model, cancelled):
+		time.sleep(0.4 if model == "primary" else 0.05)
+		return f"answer of {model}"
+
+	discarded = []
+	done = threading.Event()
+
+	def on_discarded(model, result):
+		discarded.append((model, result))
+		done.set()
+
+	assert ModelRouter(ROUTES).call("summary", send, on_discarded=on_discarded) == ("backup", "answer of backup")
+	assert done.wait(2)
+	assert discarded == [("primary", "answer of primary")]
+
+def test_model_override_and_disabled_fallback():
+	router = ModelRouter({"default": {"model": "primary", "fallback": None, "slo": None}})
+	calls = []
+
+	def send(model, cancelled):
+		calls.append(model)
+		raise RuntimeError("down")
+
+	with pytest.raises(RuntimeError):
+		router.call("summary", send, model="other")
+	assert calls == ["other"]
+
+def test_load_routes_merges_over_the_defaults(tmp_path):
+	path = tmp_path / "routes.json"
+	path.write_text('{"printing": {"model": "gpt-5"}, "custom": {"model": "m", "fallback": null}}')
+	routes = load_routes(str(path))
+	router = ModelRouter(routes)
+	assert router.route("printing")["model"] == "gpt-5"
+	assert router.route("printing")["reasoning_effort"] == "low"
+	assert router.route("custom")["fallback"] is None
+	path.write_text('{"printing": "gpt-5"}')
+	with pytest.raises(ValueError):
+		load_routes(str(path))
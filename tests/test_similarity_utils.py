@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from similarity_utils import NUM_PERMUTATIONS, SimilarityIndex, description_hash, minhash
+
+DESCRIPTION = (
+	"A furniture company produces chairs and tables. Each chair needs 2 units of wood and 3 hours of labor, each table 5 "
+	"units of wood and 4 hours of labor. The company has 200 units of wood and 150 hours of labor per week and wants to "
+	"maximize its profit."
+)
+HEADERS = ["products.csv:name", "products.csv:profit"]
+ARTIFACTS = {
+	"complete_description.txt": "summary", "input_files_description.txt": "files",
+	"data.py": "class DataLoader: pass", "solution.py": "print(1)",
+}
+
+def similarity(a, b):
+	return float((minhash(a) == minhash(b)).mean())
+
+def test_minhash_is_deterministic():
+	signature = minhash(DESCRIPTION)
+	assert signature.shape == (NUM_PERMUTATIONS,) and signature.dtype == np.uint64
+	assert np.array_equal(signature, minhash(DESCRIPTION))
+
+def test_minhash_estimates_the_similarity():
+	assert similarity(DESCRIPTION, DESCRIPTION.upper()) == 1.0
+	assert similarity(DESCRIPTION, DESCRIPTION.replace("per week", "per month")) > 0.7
+	assert similarity(DESCRIPTION, "Schedule the nurses of a hospital over the shifts of a month.") < 0.1
+
+def test_minhash_of_short_and_empty_texts():
+	assert similarity("two words", "two words") == 1.0
+	assert np.array_equal(minhash(""), minhash("  "))
+
+def test_description_hash_ignores_whitespace_only():
+	assert description_hash("a  b\nc") == description_hash(" a b c ")
+	assert description_hash("maximize the profit") != description_hash("minimize the profit")
+
+@pytest.fixture
+def index(tmp_path):
+	index = SimilarityIndex(str(tmp_path), threshold=0.9)
+	index.add("furniture", DESCRIPTION, HEADERS, ARTIFACTS, "products.csv : 2 rows")
+	return index
+
+def test_lookup_reuses_every_stage_of_an_identical_problem(index):
+	warm = index.lookup(DESCRIPTION, HEADERS, "", "products.csv : 2 rows")
+	assert warm.similarity == 1.0
+	assert (warm.reuse_summary, warm.reuse_data, warm.reuse_input_description, warm.reuse_model) == (True, True, True, True)
+	assert warm.artifact("solution.py") == "print(1)"
+	assert warm.artifact("missing.txt") is None
+
+def test_lookup_requires_the_same_headers_and_a_similar_description(index):
+	assert index.lookup(DESCRIPTION, HEADERS[:1], "", "products.csv : 2 rows") is None
+	assert index.lookup("Schedule the nurses of a hospital over the shifts of a month.", HEADERS) is None
+
+def test_new_csv_data_only_reuses_the_data_loader(index):
+	warm = index.lookup(DESCRIPTION, HEADERS, "", "products.csv : 3 rows")
+	assert warm.reuse_data
+	assert not (warm.reuse_summary or warm.reuse_input_description or warm.reuse_model)
+
+def test_edited_description_does_not_reuse_the_summary(index):
+	edited = DESCRIPTION.replace(". ", ".\n\n")
+	assert index.lookup(edited, HEADERS, "", "products.csv : 2 rows").reuse_model
+	edited = DESCRIPTION.replace("200 units of wood", "210 units of wood")
+	warm = index.lookup(edited, HEADERS, "", "products.csv : 2 rows")
+	assert warm is not None and not warm.reuse_summary and not warm.reuse_model and warm.reuse_data
+
+def test_refinement_answers_reuse_nothing(index):
+	warm = index.lookup(DESCRIPTION, HEADERS, "Q: ?\nA: only 100 units of wood", "products.csv : 2 rows")
+	assert not (warm.reuse_summary or warm.reuse_data or warm.reuse_model)
+
+def test_index_is_persisted(index):
+	reloaded = SimilarityIndex(index.path)
+	assert [entry["problem"] for entry in reloaded.entries] == ["furniture"]
+	assert reloaded.lookup(DESCRIPTION, HEADERS, "", "products.csv : 2 rows").reuse_model
@@ -1,4 +1,6 @@
+import itertools
 import libcst as cst
+import numpy as np
 
 class TypeCommentInserter(cst.CSTTransformer):
 
@@ -47,9 +49,47 @@ class TypeCommentInserter(cst.CSTTransformer):
                 new_body.append(stmt)
         return updated_node.with_changes(body=new_body)
 
+def index_space(shape, subset=None):
+    """
+        Enumerate an N-D index space as flat (raveled) positions and per-axis index arrays, in C order.
+            -  shape: Shape of the index space.
+            -  subset: Optional restriction of the index space. Either a boolean mask of the given shape
+               (only True positions are kept) or a sequence of distinct index tuples (kept in the provided order).
+
+            Ex: index_space((2,3), subset=[(0,1),(1,2)]) returns
+                (array([1, 5]), (array([0, 1]), array([1, 2])))
+
+        Return the flat positions and the tuple of index arrays (one per axis), as np.unravel_index
+    """
+    if isinstance(shape, int):
+        shape = (shape,)
+    shape = tuple(shape)
+    if subset is None:
+        flat = np.arange(int(np.prod(shape)), dtype=np.intp)
+    else:
+        subset = np.asarray(subset)
+        if subset.dtype == bool:
+            flat = np.flatnonzero(np.broadcast_to(subset, shape))
+        else:
+            # An empty list of tuples is a float array : cast to integer positions
+            subset = subset.astype(np.intp).reshape(-1, len(shape))
+            flat = np.ravel_multi_index(tuple(subset.T), shape)
+            if len(np.unique(flat)) != len(flat):
+                raise ValueError("Duplicated index tuples in subset ! Each index should appear once.")
+    return flat, np.unravel_index(flat, shape)
+
+def index_tuples(shape, subset=None):
+    """
+        Iterate over the index tuples of an N-D index space (see index_space), as tuples of python ints.
+
+            Ex: index_tuples((2,2)) yields (0,0), (0,1), (1,0), (1,1)
+    """
+    _, indices = index_space(shape, subset)
+    return zip(*(i.tolist() for i in indices))
+
 def nested_loops(loops_iterables):
     """
-        Define nested loops recursively to avoid if/else statements based on len(num_terms)
+        Define nested loops over the provided iterables, as a flat iterator
             -  loops_iterables: List of iterables to loop through.
 
             Ex: nested_loops([range(10),range(20)]) is equivalent to
@@ -57,17 +97,11 @@ def nested_loops(loops_iterables):
                     for j in range(20): 
                         yield i,j
 
-        Yield indices
+        Yield indices. Prefer index_space/index_tuples when looping over the indices of an array.
     """
-    return _nested_loops(loops_iterables=loops_iterables, depth=len(loops_iterables), indices=[])
-
-def _nested_loops(loops_iterables, depth, indices):
-    if depth == 0:
-        return
-    for i in loops_iterables[0]:
-        yield from _nested_loops(loops_iterables=loops_iterables[1:], indices=indices+[i], depth=depth-1)
-        if depth-1 == 0:
-            yield tuple(indices + [i])
+    if len(loops_iterables) == 0:
+        return iter(())
+    return itertools.product(*loops_iterables)
 
 def add_type_comments(code):
     #tree = cst.parse_module(code)
@@ -78,3 +112,27 @@ def add_type_comments(code):
 
 
 
+
+class NameRenamer(cst.CSTTransformer):
+    """
+    Rename variables, leaving attribute names and keyword arguments untouched.
+    """
+
+    def __init__(self, mapping):
+        super().__init__()
+        self.mapping = mapping
+
+    def leave_Name(self, original_node, updated_node):
+        if updated_node.value in self.mapping:
+            return updated_node.with_changes(value=self.mapping[updated_node.value])
+        return updated_node
+
+    def leave_Attribute(self, original_node, updated_node):
+        return updated_node.with_changes(attr=original_node.attr)
+
+    def leave_Arg(self, original_node, updated_node):
+        return updated_node.with_changes(keyword=original_node.keyword)
+
+def rename_names(code, mapping):
+    tree = cst.parse_module(code)
+    return tree.visit(NameRenamer(mapping)).code